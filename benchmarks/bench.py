@@ -0,0 +1,285 @@
+"""Benchmark del motore e dell'app, con confronto rispetto a una baseline.
+
+Misura:
+
+- il costo di ogni stadio del motore (coorti, ricavi, costi di struttura,
+  personale, conto economico, stato patrimoniale, rendiconto);
+- il tempo di esecuzione completa e di riesecuzione di ``streamlit_app.py``
+  con il test harness di Streamlit (``AppTest``), per ogni scheda;
+- il throughput di ``calcola_piano`` con 1, 1e3 e 1e6 scenari e orizzonti di
+  5, 20 e 40 anni.
+
+Uso (dalla cartella del repository)::
+
+    python benchmarks/bench.py                  # confronta con baseline.json
+    python benchmarks/bench.py --rapido         # senza il blocco da 1e6 scenari
+    python benchmarks/bench.py --aggiorna       # salva i tempi come nuova baseline
+
+Un tempo oltre la baseline di più della soglia (default 50%) viene segnalato
+come regressione e il comando termina con codice 1. Per attenuare le
+oscillazioni di velocità della macchina i tempi vengono riportati alla
+velocità della baseline con un carico di calibrazione fisso; le baseline
+vanno comunque rigenerate quando cambia l'ambiente.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+
+import numpy as np
+
+RADICE = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RADICE))
+
+from piano.motore import (  # noqa: E402
+    PARAMETRI_PERSONALE,
+    PARAMETRI_STRUTTURA,
+    ParametriPiano,
+    adatta_orizzonte,
+    bilancio_integrato,
+    calcola_costi_struttura,
+    calcola_personale,
+    calcola_piano,
+    calcola_ricavi,
+    calcola_studenti,
+    conto_economico,
+    docenti_automatici,
+    prepara_parametri,
+)
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+SOGLIA = 0.5
+ORIZZONTI = (5, 20, 40)
+SCENARI_STADI = (1, 1000)
+SCENARI_THROUGHPUT = (1, 1000, 1_000_000)
+SCENARI_PER_BLOCCO = 50_000
+# Gli stadi durano frazioni di millisecondo: si misurano in più giri distanziati
+# e si tiene il migliore, per non scambiare un disturbo momentaneo per una regressione
+GIRI_STADI = 3
+SCHEDE = (
+    "Ricavi preventivi",
+    "Costi preventivi del personale",
+    "Costi preventivi di struttura",
+    "Conto economico",
+    "Stato patrimoniale",
+    "Rendiconto finanziario",
+    "Indici di valutazione",
+    "Portafoglio campus",
+)
+
+
+def cronometra(funzione, ripetizioni=5, durata_minima=0.2):
+    """Tempo minimo (s) di ``funzione`` su almeno ``ripetizioni`` esecuzioni
+    e almeno ``durata_minima`` secondi complessivi."""
+    funzione()  # riscaldamento: allocazioni e cache della CPU
+    tempi = []
+    inizio = time.perf_counter()
+    while len(tempi) < ripetizioni or time.perf_counter() - inizio < durata_minima:
+        t0 = time.perf_counter()
+        funzione()
+        tempi.append(time.perf_counter() - t0)
+        if len(tempi) >= 1000:
+            break
+    return min(tempi)
+
+
+def calibrazione():
+    """Tempo di un carico fisso di piccole operazioni numpy, simile a quello del motore."""
+    a = np.linspace(0, 1, 5000).reshape(1000, 5)
+
+    def carico():
+        for _ in range(20):
+            np.cumsum(a * 1.01 + 1, axis=-1).max(axis=-1)
+
+    return cronometra(carico, ripetizioni=20, durata_minima=0.5)
+
+
+def parametri_benchmark(n_scenari, n_anni):
+    """Parametri di default su ``n_anni`` anni, con ``n_scenari`` rette diverse."""
+    p = adatta_orizzonte(ParametriPiano(), n_anni)
+    if n_scenari == 1:
+        return p
+    return replace(p, retta_unica=np.linspace(8000, 12000, n_scenari))
+
+
+# ================= STADI DEL MOTORE ================= #
+def bench_stadi():
+    tempi = {}
+    for _ in range(GIRI_STADI):
+        for nome, tempo in _giro_stadi().items():
+            tempi[nome] = min(tempo, tempi.get(nome, np.inf))
+    return tempi
+
+
+def _giro_stadi():
+    tempi = {}
+    for n_scenari in SCENARI_STADI:
+        for n_anni in ORIZZONTI:
+            p = parametri_benchmark(n_scenari, n_anni)
+            v, _ = prepara_parametri(p)
+            struttura = {nome: v[nome] for nome in PARAMETRI_STRUTTURA}
+            personale = {nome: v[nome] for nome in PARAMETRI_PERSONALE}
+
+            studenti = calcola_studenti(v["new_first_students"], len(p.classi))
+            studenti_totali = studenti.sum(axis=-1)
+            _, _, ricavi_totali = calcola_ricavi(studenti, v["retta_unica"], v["altri_contributi"])
+            costi_struttura, totale_struttura = calcola_costi_struttura(v["superfici"], struttura)
+            assunti, contratto = docenti_automatici(studenti_totali, v["studenti_per_docente"])
+            totale_personale = calcola_personale(assunti, contratto, personale)[-1]
+            risultato_netto = ricavi_totali - totale_struttura - totale_personale
+            patrimoniali = (risultato_netto, ricavi_totali, totale_personale,
+                            costi_struttura, v["fondo_progressivo"])
+
+            stadi = {
+                "coorti": lambda: calcola_studenti(v["new_first_students"], len(p.classi)),
+                "ricavi": lambda: calcola_ricavi(studenti, v["retta_unica"], v["altri_contributi"]),
+                "costi_struttura": lambda: calcola_costi_struttura(v["superfici"], struttura),
+                "personale": lambda: calcola_personale(
+                    *docenti_automatici(studenti_totali, v["studenti_per_docente"]), personale
+                ),
+                "conto_economico": lambda: conto_economico(
+                    ricavi_totali, v["altri_contributi"], totale_struttura,
+                    totale_personale, costi_struttura
+                ),
+                "bilancio_integrato": lambda: bilancio_integrato(*patrimoniali),
+            }
+            for nome, funzione in stadi.items():
+                tempi[f"stadio/{nome}[S={n_scenari},Y={n_anni}]"] = cronometra(
+                    funzione, durata_minima=0.1
+                )
+    return tempi
+
+
+# ================= THROUGHPUT ================= #
+def valuta_a_blocchi(n_scenari, n_anni):
+    base = adatta_orizzonte(ParametriPiano(), n_anni)
+    if n_scenari == 1:
+        calcola_piano(base, cache=None)
+        return
+    for inizio in range(0, n_scenari, SCENARI_PER_BLOCCO):
+        n = min(SCENARI_PER_BLOCCO, n_scenari - inizio)
+        calcola_piano(replace(base, retta_unica=np.linspace(8000, 12000, n)), cache=None)
+
+
+def bench_throughput(scenari=SCENARI_THROUGHPUT):
+    tempi = {}
+    for n_scenari in scenari:
+        for n_anni in ORIZZONTI:
+            ripetizioni = 1 if n_scenari >= 100_000 else 5
+            tempi[f"throughput/calcola_piano[S={n_scenari},Y={n_anni}]"] = cronometra(
+                lambda: valuta_a_blocchi(n_scenari, n_anni), ripetizioni=ripetizioni,
+                durata_minima=0 if ripetizioni == 1 else 0.2,
+            )
+    return tempi
+
+
+# ================= APP (AppTest) ================= #
+def bench_app():
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        print("streamlit non installato: benchmark dell'app saltato", file=sys.stderr)
+        return {}
+
+    tempi = {}
+    script = str(RADICE / "streamlit_app.py")
+
+    t0 = time.perf_counter()
+    at = AppTest.from_file(script, default_timeout=120).run()
+    tempi["app/prima_esecuzione"] = time.perf_counter() - t0
+    tempi["app/riesecuzione"] = cronometra(lambda: at.run(), ripetizioni=5, durata_minima=0)
+
+    for n_anni in ORIZZONTI:
+        at = AppTest.from_file(script, default_timeout=120).run()
+        at.number_input(key="n_anni").set_value(n_anni).run()
+        for scheda in SCHEDE:
+            at.session_state["scheda"] = scheda
+
+            def esegui():
+                at.run()
+                if at.exception:
+                    raise RuntimeError(at.exception[0].value)
+
+            tempi[f"app/{scheda}[Y={n_anni}]"] = cronometra(esegui, ripetizioni=3, durata_minima=0)
+    return tempi
+
+
+# ================= CONFRONTO CON LA BASELINE ================= #
+def confronta(tempi, baseline, soglia, fattore=1.0):
+    """Stampa i tempi con la variazione rispetto alla baseline; restituisce le regressioni.
+
+    ``fattore`` riporta i tempi misurati alla velocità della macchina della baseline.
+    """
+    regressioni = []
+    larghezza = max(len(nome) for nome in tempi)
+    for nome, tempo in tempi.items():
+        riferimento = baseline.get(nome)
+        if riferimento is None:
+            nota = "nuovo"
+        else:
+            variazione = tempo * fattore / riferimento - 1
+            nota = f"{variazione:+.0%}"
+            if variazione > soglia:
+                nota += "  REGRESSIONE"
+                regressioni.append(nome)
+        print(f"{nome:<{larghezza}}  {tempo * 1000:12.3f} ms  {nota}")
+    return regressioni
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--solo", choices=("stadi", "throughput", "app"), action="append",
+                        help="esegue solo i gruppi indicati (ripetibile)")
+    parser.add_argument("--rapido", action="store_true", help="salta il throughput con 1e6 scenari")
+    parser.add_argument("--soglia", type=float, default=SOGLIA,
+                        help="rallentamento tollerato rispetto alla baseline (default: %(default)s)")
+    parser.add_argument("--aggiorna", action="store_true", help="salva i tempi misurati come baseline")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    args = parser.parse_args(argv)
+
+    gruppi = args.solo or ["stadi", "throughput", "app"]
+    tempo_calibrazione = calibrazione()
+    tempi = {}
+    if "stadi" in gruppi:
+        tempi.update(bench_stadi())
+    if "throughput" in gruppi:
+        scenari = [s for s in SCENARI_THROUGHPUT if not (args.rapido and s >= 1_000_000)]
+        tempi.update(bench_throughput(scenari))
+    if "app" in gruppi:
+        tempi.update(bench_app())
+    tempo_calibrazione = min(tempo_calibrazione, calibrazione())
+
+    baseline = {}
+    calibrazione_baseline = tempo_calibrazione
+    if args.baseline.exists():
+        salvata = json.loads(args.baseline.read_text(encoding="utf-8"))
+        baseline = salvata["tempi"]
+        calibrazione_baseline = salvata["calibrazione"]
+    fattore = calibrazione_baseline / tempo_calibrazione
+    regressioni = confronta(tempi, baseline, args.soglia, fattore)
+
+    if args.aggiorna:
+        baseline.update({nome: tempo * fattore for nome, tempo in tempi.items()})
+        args.baseline.write_text(json.dumps({
+            "macchina": " ".join(filter(None, [
+                platform.machine(), platform.processor(), "python", platform.python_version()
+            ])),
+            "numpy": np.__version__,
+            "calibrazione": calibrazione_baseline,
+            "tempi": dict(sorted(baseline.items())),
+        }, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline aggiornata: {args.baseline}")
+        return 0
+
+    if regressioni:
+        print(f"\n{len(regressioni)} regressioni oltre il {args.soglia:.0%}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
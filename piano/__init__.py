@@ -0,0 +1,21 @@
+"""Modello di calcolo del business plan, utilizzabile anche senza Streamlit."""
+
+from .motore import (
+    CLASSI,
+    ORDINAMENTI,
+    ParametriPiano,
+    Piano,
+    adatta_orizzonte,
+    anno_break_even,
+    calcola_piano,
+)
+
+__all__ = [
+    "CLASSI",
+    "ORDINAMENTI",
+    "ParametriPiano",
+    "Piano",
+    "adatta_orizzonte",
+    "anno_break_even",
+    "calcola_piano",
+]
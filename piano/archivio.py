@@ -0,0 +1,277 @@
+"""Archivio locale degli scenari (SQLite).
+
+Ogni scenario salvato conserva i parametri (JSON), i prospetti già calcolati
+(array NumPy compressi) e alcuni indicatori di sintesi in colonne indicizzate,
+così l'elenco si filtra e si ordina senza leggere i prospetti e uno scenario
+si ricarica senza ricalcolarlo.
+
+Lo stesso nome può essere salvato più volte: ogni salvataggio è una versione
+distinta, con la propria data.
+
+I prospetti salvati portano la versione del formato (``VERSIONE_FORMATO``);
+quelli di un formato diverso non si leggono e, alla ricarica, il piano si
+ricalcola dai parametri.
+"""
+
+import io
+import json
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import asdict, fields
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .batch import parametri_da_dizionario
+from .cache import impronta
+from .motore import (
+    CACHE_STADI,
+    Piano,
+    anno_break_even,
+    calcola_piano,
+    parametri_canonici,
+    prepara_parametri,
+)
+
+ARCHIVIO_PREDEFINITO = Path("archivio") / "scenari.sqlite"
+
+# Da incrementare quando cambiano i campi di Piano o i prospetti salvati
+# (i salvataggi senza versione sono del formato 1)
+VERSIONE_FORMATO = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenari (
+    id INTEGER PRIMARY KEY,
+    nome TEXT NOT NULL,
+    creato REAL NOT NULL,
+    chiave TEXT NOT NULL,
+    n_anni INTEGER NOT NULL,
+    break_even INTEGER NOT NULL,
+    ricavi_ultimo REAL NOT NULL,
+    ebit_ultimo REAL NOT NULL,
+    ebit_cumulato REAL NOT NULL,
+    liquidita_minima REAL NOT NULL,
+    parametri TEXT NOT NULL,
+    piano BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scenari_nome ON scenari (nome);
+CREATE INDEX IF NOT EXISTS scenari_creato ON scenari (creato);
+CREATE INDEX IF NOT EXISTS scenari_chiave ON scenari (chiave);
+CREATE INDEX IF NOT EXISTS scenari_break_even ON scenari (break_even);
+CREATE INDEX IF NOT EXISTS scenari_ebit_ultimo ON scenari (ebit_ultimo);
+CREATE INDEX IF NOT EXISTS scenari_liquidita_minima ON scenari (liquidita_minima);
+"""
+
+# Colonne dell'elenco (i prospetti e i parametri restano fuori)
+COLONNE_ELENCO = (
+    "id",
+    "nome",
+    "creato",
+    "n_anni",
+    "break_even",
+    "ricavi_ultimo",
+    "ebit_ultimo",
+    "ebit_cumulato",
+    "liquidita_minima",
+)
+ORDINAMENTI_ELENCO = COLONNE_ELENCO[1:]
+
+
+# ================= CONVERSIONI ================= #
+def piano_in_byte(piano):
+    """Serializza un piano singolo in un archivio ``.npz`` compresso."""
+    array = {}
+    for f in fields(piano):
+        valore = getattr(piano, f.name)
+        if isinstance(valore, dict):
+            array.update({f"{f.name}/{voce}": a for voce, a in valore.items()})
+        else:
+            array[f.name] = np.asarray(valore)
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, versione=np.array(VERSIONE_FORMATO), **array)
+    return buffer.getvalue()
+
+
+def piano_da_byte(dati):
+    """Piano salvato con ``piano_in_byte``; ``ValueError`` se il formato è diverso."""
+    valori = {}
+    with np.load(io.BytesIO(dati), allow_pickle=False) as npz:
+        versione = int(npz["versione"]) if "versione" in npz.files else 1
+        if versione != VERSIONE_FORMATO:
+            raise ValueError(
+                f"piano salvato nel formato {versione}, atteso il formato {VERSIONE_FORMATO}"
+            )
+        for nome in npz.files:
+            if nome == "versione":
+                continue
+            prospetto, _, voce = nome.partition("/")
+            if voce:
+                valori.setdefault(prospetto, {})[voce] = npz[nome]
+            else:
+                valori[nome] = npz[nome]
+    valori["classi"] = tuple(str(c) for c in valori["classi"])
+    return Piano(**valori)
+
+
+def _json(valore):
+    if isinstance(valore, np.ndarray):
+        return valore.tolist()
+    if isinstance(valore, np.generic):
+        return valore.item()
+    raise TypeError(f"valore non serializzabile: {type(valore).__name__}")
+
+
+def indicatori(piano):
+    """Indicatori di sintesi salvati in colonne indicizzate."""
+    return {
+        "n_anni": len(piano.anni),
+        "break_even": int(anno_break_even(piano)),
+        "ricavi_ultimo": float(piano.ricavi_totali[-1]),
+        "ebit_ultimo": float(piano.risultato_netto[-1]),
+        "ebit_cumulato": float(piano.risultato_netto.sum()),
+        "liquidita_minima": float(piano.rf["liq_fine"].min()),
+    }
+
+
+# ================= ARCHIVIO ================= #
+class ArchivioScenari:
+    """Scenari salvati in un file SQLite (creato al primo utilizzo).
+
+    Ogni operazione apre una propria connessione: l'archivio può essere
+    condiviso fra le sessioni (thread) dell'app.
+    """
+
+    def __init__(self, percorso=ARCHIVIO_PREDEFINITO):
+        self.percorso = Path(percorso)
+        self.percorso.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connetti()) as db:
+            # WAL: le letture non attendono i salvataggi delle altre sessioni
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    def _connetti(self):
+        return sqlite3.connect(self.percorso, timeout=30)
+
+    def salva(self, nome, params, piano=None):
+        """Salva ``params`` (e il piano, calcolato se non fornito); restituisce l'id.
+
+        I parametri vengono controllati come nel motore (``ValueError`` se le
+        forme non sono valide), anche quando il piano è già calcolato: ogni
+        scenario salvato si può ricaricare. I tassi di turnover possono essere
+        per classe o per anno e classe.
+        """
+        _, a_scenari = prepara_parametri(params)
+        if a_scenari:
+            raise ValueError("si possono salvare solo piani singoli, senza asse di scenari")
+        if piano is None:
+            piano = calcola_piano(params)
+        riga = {
+            "nome": nome,
+            "creato": time.time(),
+            "chiave": impronta(*parametri_canonici(params)),
+            **indicatori(piano),
+            "parametri": json.dumps(asdict(params), default=_json),
+            "piano": piano_in_byte(piano),
+        }
+        with closing(self._connetti()) as db, db:
+            cursore = db.execute(
+                f"INSERT INTO scenari ({', '.join(riga)}) VALUES ({', '.join('?' * len(riga))})",
+                tuple(riga.values()),
+            )
+            return cursore.lastrowid
+
+    def elenco(self, nome=None, break_even_entro=None, ebit_minimo=None,
+               liquidita_minima=None, ordina="creato", decrescente=True, limite=None):
+        """Scenari salvati (senza prospetti) come DataFrame, con filtri facoltativi.
+
+        ``creato`` è in secondi dall'epoch (``time.time()``). ``nome`` cerca una
+        sottostringa del nome; ``break_even_entro`` esclude gli scenari senza
+        break-even o con break-even successivo.
+        """
+        if ordina not in ORDINAMENTI_ELENCO:
+            raise ValueError(f"ordinamento non valido: {ordina}")
+        condizioni, valori = [], []
+        if nome:
+            condizioni.append("nome LIKE ?")
+            valori.append(f"%{nome}%")
+        if break_even_entro is not None:
+            condizioni.append("break_even BETWEEN 1 AND ?")
+            valori.append(int(break_even_entro))
+        if ebit_minimo is not None:
+            condizioni.append("ebit_ultimo >= ?")
+            valori.append(float(ebit_minimo))
+        if liquidita_minima is not None:
+            condizioni.append("liquidita_minima >= ?")
+            valori.append(float(liquidita_minima))
+
+        query = f"SELECT {', '.join(COLONNE_ELENCO)} FROM scenari"
+        if condizioni:
+            query += " WHERE " + " AND ".join(condizioni)
+        query += f" ORDER BY {ordina} {'DESC' if decrescente else 'ASC'}, id DESC"
+        if limite is not None:
+            query += " LIMIT ?"
+            valori.append(int(limite))
+
+        with closing(self._connetti()) as db:
+            righe = db.execute(query, valori).fetchall()
+        return pd.DataFrame(righe, columns=list(COLONNE_ELENCO))
+
+    def trova(self, params):
+        """Id dell'ultimo salvataggio con gli stessi parametri (``None`` se assente)."""
+        with closing(self._connetti()) as db:
+            riga = db.execute(
+                "SELECT id FROM scenari WHERE chiave = ? ORDER BY creato DESC LIMIT 1",
+                (impronta(*parametri_canonici(params)),),
+            ).fetchone()
+        return None if riga is None else riga[0]
+
+    def parametri(self, id_scenari):
+        """Elenco di ``(nome, params)`` degli scenari indicati, nello stesso ordine
+        (senza leggere i prospetti)."""
+        id_scenari = [int(i) for i in id_scenari]
+        if not id_scenari:
+            return []
+        with closing(self._connetti()) as db:
+            righe = db.execute(
+                f"SELECT id, nome, parametri FROM scenari "
+                f"WHERE id IN ({', '.join('?' * len(id_scenari))})",
+                id_scenari,
+            ).fetchall()
+        trovati = {i: (nome, parametri_da_dizionario(json.loads(p))) for i, nome, p in righe}
+        mancanti = [i for i in id_scenari if i not in trovati]
+        if mancanti:
+            raise KeyError(f"scenari non presenti nell'archivio: {mancanti}")
+        return [trovati[i] for i in id_scenari]
+
+    def carica(self, id_scenario, cache=CACHE_STADI):
+        """Parametri e piano salvati, senza ricalcolo: ``(nome, params, piano)``.
+
+        Il piano viene anche inserito in ``cache``, così le successive chiamate
+        a ``calcola_piano`` con gli stessi parametri lo restituiscono subito. Un
+        piano salvato in un formato precedente si ricalcola dai parametri.
+        """
+        with closing(self._connetti()) as db:
+            riga = db.execute(
+                "SELECT nome, parametri, piano FROM scenari WHERE id = ?", (int(id_scenario),)
+            ).fetchone()
+        if riga is None:
+            raise KeyError(f"scenario {id_scenario} non presente nell'archivio")
+        nome, parametri, dati = riga
+        params = parametri_da_dizionario(json.loads(parametri))
+        try:
+            piano = piano_da_byte(dati)
+        except ValueError:
+            piano = calcola_piano(params, cache=cache)
+        if cache is not None:
+            cache.memorizza("piano", piano, *parametri_canonici(params))
+        return nome, params, piano
+
+    def elimina(self, id_scenario):
+        with closing(self._connetti()) as db, db:
+            db.execute("DELETE FROM scenari WHERE id = ?", (int(id_scenario),))
+
+    def __len__(self):
+        with closing(self._connetti()) as db:
+            return db.execute("SELECT COUNT(*) FROM scenari").fetchone()[0]
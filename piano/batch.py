@@ -0,0 +1,271 @@
+"""Esecuzione non interattiva di file di scenari.
+
+Legge gli scenari da JSON o CSV, li valuta con lo stesso motore dell'app
+(raggruppando in un unico blocco gli scenari con la stessa struttura) e
+scrive i prospetti in CSV o Parquet, una riga per scenario e anno::
+
+    python -m piano scenari.json --output risultati/ --formato parquet
+
+Importa solo numpy e pandas: niente Streamlit né Plotly, per un avvio rapido
+nei lavori notturni.
+"""
+
+import argparse
+import csv
+import json
+import sys
+from dataclasses import fields
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .indicizzazione import matrice_tassi
+from .motore import (
+    ORDINAMENTI,
+    PARAMETRI_ANNUALI,
+    PARAMETRI_PER_CLASSE,
+    PARAMETRI_PER_DRIVER,
+    PARAMETRI_PER_PRESTITO,
+    PARAMETRI_SCALARI,
+    ParametriPiano,
+    adatta_orizzonte,
+    anno_break_even,
+    calcola_piano,
+    prepara_parametri,
+)
+
+CAMPI = {f.name for f in fields(ParametriPiano)}
+CAMPO_NOME = "nome"
+SEPARATORE_SERIE = ";"
+FORMATI = ("csv", "parquet")
+
+# Serie del piano riportate nella sintesi, oltre ai prospetti
+VOCI_SINTESI = (
+    "studenti_totali",
+    "ricavi_totali",
+    "totale_struttura",
+    "docenti_assunti",
+    "docenti_contratto",
+    "totale_personale",
+    "costi_totali",
+    "risultato_netto",
+)
+
+
+# ================= LETTURA DEGLI SCENARI ================= #
+def parametri_da_dizionario(valori):
+    """ParametriPiano da un dizionario ``campo -> valore`` (campi mancanti = default).
+
+    ``classi`` può essere l'elenco delle classi o il nome di un ordinamento.
+    Le serie annuali più corte di ``new_first_students`` vengono estese come
+    nell'app.
+    """
+    sconosciuti = set(valori) - CAMPI
+    if sconosciuti:
+        raise ValueError(f"parametri sconosciuti: {', '.join(sorted(sconosciuti))}")
+
+    valori = dict(valori)
+    if isinstance(valori.get("classi"), str):
+        if valori["classi"] not in ORDINAMENTI:
+            raise ValueError(f"ordinamento sconosciuto: {valori['classi']}")
+        valori["classi"] = ORDINAMENTI[valori["classi"]]
+    for nome, valore in valori.items():
+        if isinstance(valore, list):
+            valori[nome] = tuple(tuple(v) if isinstance(v, list) else v for v in valore)
+
+    p = ParametriPiano(**valori)
+    return adatta_orizzonte(p, len(p.new_first_students))
+
+
+def _valore_csv(nome, testo):
+    if nome == "classi":
+        if testo in ORDINAMENTI:
+            return testo
+        return tuple(c.strip() for c in testo.split(SEPARATORE_SERIE))
+    if nome in PARAMETRI_SCALARI:
+        return float(testo)
+    return tuple(float(v) for v in testo.split(SEPARATORE_SERIE))
+
+
+def leggi_scenari(percorso):
+    """Elenco di ``(nome, ParametriPiano)`` da un file ``.json`` o ``.csv``.
+
+    JSON: un oggetto o una lista di oggetti con i campi di ParametriPiano (e un
+    ``nome`` facoltativo). CSV: una riga per scenario, le serie con i valori
+    separati da ``;``; le celle vuote usano il valore di default.
+    """
+    percorso = Path(percorso)
+    if percorso.suffix.lower() == ".json":
+        with open(percorso, encoding="utf-8") as f:
+            righe = json.load(f)
+        if isinstance(righe, dict):
+            righe = [righe]
+    elif percorso.suffix.lower() == ".csv":
+        with open(percorso, newline="", encoding="utf-8") as f:
+            righe = [
+                {
+                    nome: testo.strip() if nome == CAMPO_NOME else _valore_csv(nome, testo.strip())
+                    for nome, testo in riga.items()
+                    if testo is not None and testo.strip() != ""
+                }
+                for riga in csv.DictReader(f)
+            ]
+    else:
+        raise ValueError(f"formato non supportato: {percorso.suffix} (attesi .json o .csv)")
+
+    scenari = []
+    for i, riga in enumerate(righe, start=1):
+        riga = dict(riga)
+        nome = str(riga.pop(CAMPO_NOME, f"scenario_{i}"))
+        try:
+            p = parametri_da_dizionario(riga)
+            # Forme e lunghezze si controllano qui, per segnalare lo scenario
+            # invece di fermare la valutazione a blocchi
+            prepara_parametri(p)
+            scenari.append((nome, p))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"scenario {nome}: {e}") from e
+    return scenari
+
+
+# ================= VALUTAZIONE A BLOCCHI ================= #
+def _struttura(p):
+    """Scenari con la stessa struttura possono essere valutati in un unico blocco."""
+    return (
+        len(p.new_first_students),
+        tuple(p.classi),
+        None if p.ore_curricolo is None else tuple(np.ravel(p.ore_curricolo).tolist()),
+        len(p.prestiti_importo),
+        tuple(getattr(p, nome) is None
+              for nome in PARAMETRI_ANNUALI + PARAMETRI_PER_CLASSE + PARAMETRI_PER_DRIVER),
+    )
+
+
+def _impila(gruppo):
+    """Un ParametriPiano con asse scenari a partire da parametri con la stessa struttura."""
+    primo = gruppo[0]
+    n_anni = len(primo.new_first_students)
+    n_classi = len(primo.classi)
+    valori = {"classi": primo.classi, "ore_curricolo": primo.ore_curricolo}
+    for nome in PARAMETRI_SCALARI:
+        valori[nome] = np.array([getattr(p, nome) for p in gruppo], dtype=float)
+    for nome in PARAMETRI_ANNUALI:
+        if getattr(primo, nome) is not None:
+            valori[nome] = np.array([getattr(p, nome) for p in gruppo], dtype=float)
+    for nome in PARAMETRI_PER_CLASSE:
+        if getattr(primo, nome) is not None:
+            valori[nome] = np.stack([
+                np.broadcast_to(np.asarray(getattr(p, nome), dtype=float), (n_anni, n_classi))
+                for p in gruppo
+            ])
+    for nome in PARAMETRI_PER_PRESTITO:
+        valori[nome] = np.array([getattr(p, nome) for p in gruppo], dtype=float)
+    for nome in PARAMETRI_PER_DRIVER:
+        if getattr(primo, nome) is not None:
+            valori[nome] = np.stack([matrice_tassi(getattr(p, nome)) for p in gruppo])
+    facoltativi = PARAMETRI_ANNUALI + PARAMETRI_PER_CLASSE + PARAMETRI_PER_DRIVER
+    return ParametriPiano(**{**{nome: None for nome in facoltativi}, **valori})
+
+
+def _righe(nomi, piano, serie):
+    """DataFrame (scenario, anno, voci...) da array ``(scenari, anni)``."""
+    n_scenari, n_anni = piano.risultato_netto.shape
+    df = pd.DataFrame({
+        "scenario": np.repeat(nomi, n_anni),
+        "anno": np.tile(piano.anni, n_scenari),
+    })
+    for voce, valori in serie.items():
+        df[voce] = np.asarray(valori).reshape(-1)
+    return df
+
+
+def valuta_a_gruppi(scenari):
+    """Valuta gli scenari ``(nome, params)`` con un blocco per struttura.
+
+    Gli scenari con la stessa struttura (orizzonte, classi, curricolo, numero
+    di prestiti, parametri facoltativi presenti) vengono valutati insieme.
+    Genera ``(indici, piano)``: le posizioni degli scenari del blocco e il
+    piano con asse scenari.
+    """
+    gruppi = {}
+    for i, (_, p) in enumerate(scenari):
+        gruppi.setdefault(_struttura(p), []).append(i)
+    for indici in gruppi.values():
+        yield indici, calcola_piano(_impila([scenari[i][1] for i in indici]))
+
+
+def valuta_scenari(scenari):
+    """Prospetti di tutti gli scenari: dizionario ``nome prospetto -> DataFrame``.
+
+    Gli scenari vengono valutati a blocchi (vedi ``valuta_a_gruppi``);
+    l'ordine del file è mantenuto.
+    """
+    parti = {"sintesi": [], "conto_economico": [], "stato_patrimoniale": [],
+             "rendiconto_finanziario": []}
+    for indici, piano in valuta_a_gruppi(scenari):
+        nomi = np.array([scenari[i][0] for i in indici], dtype=object)
+
+        sintesi = _righe(nomi, piano, {v: getattr(piano, v) for v in VOCI_SINTESI})
+        sintesi["break_even"] = np.repeat(anno_break_even(piano), len(piano.anni))
+        ordine = np.repeat(indici, len(piano.anni))
+        for nome, df in [("sintesi", sintesi),
+                         ("conto_economico", _righe(nomi, piano, piano.ce)),
+                         ("stato_patrimoniale", _righe(nomi, piano, piano.sp)),
+                         ("rendiconto_finanziario", _righe(nomi, piano, piano.rf))]:
+            parti[nome].append(df.assign(_ordine=ordine))
+
+    return {
+        nome: pd.concat(dfs, ignore_index=True)
+        .sort_values(["_ordine", "anno"], kind="stable")
+        .drop(columns="_ordine")
+        .reset_index(drop=True)
+        for nome, dfs in parti.items() if dfs
+    }
+
+
+def scrivi_prospetti(prospetti, cartella, formato="csv"):
+    """Scrive un file per prospetto in ``cartella``; restituisce i percorsi."""
+    cartella = Path(cartella)
+    cartella.mkdir(parents=True, exist_ok=True)
+    percorsi = []
+    for nome, df in prospetti.items():
+        percorso = cartella / f"{nome}.{formato}"
+        if formato == "parquet":
+            df.to_parquet(percorso, index=False)
+        else:
+            df.to_csv(percorso, index=False)
+        percorsi.append(percorso)
+    return percorsi
+
+
+# ================= RIGA DI COMANDO ================= #
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m piano",
+        description="Valuta un file di scenari del business plan e ne scrive i prospetti.",
+    )
+    parser.add_argument("scenari", help="file .json o .csv con gli scenari")
+    parser.add_argument("-o", "--output", default="risultati",
+                        help="cartella di destinazione (default: %(default)s)")
+    parser.add_argument("-f", "--formato", choices=FORMATI, default="csv",
+                        help="formato dei file (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    try:
+        scenari = leggi_scenari(args.scenari)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if not scenari:
+        parser.error("nessuno scenario nel file")
+
+    try:
+        percorsi = scrivi_prospetti(valuta_scenari(scenari), args.output, args.formato)
+    except ImportError as e:
+        # Parquet richiede pyarrow o fastparquet
+        parser.error(str(e))
+
+    print(f"{len(scenari)} scenari valutati:", file=sys.stderr)
+    for percorso in percorsi:
+        print(f"  {percorso}", file=sys.stderr)
+    return 0
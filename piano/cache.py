@@ -0,0 +1,209 @@
+"""Memoizzazione degli stadi di calcolo, con chiave sull'impronta degli input.
+
+Ogni stadio del motore (studenti e ricavi, costi di struttura, personale,
+prospetti di bilancio) viene ricalcolato solo quando cambiano gli input da cui
+dipende davvero. Le cache sono limitate nel numero di voci (e facoltativamente
+nella memoria occupata), eliminano la voce usata meno di recente (LRU) e
+possono far scadere le voci dopo un tempo massimo (TTL).
+
+Le cache definite a livello di modulo sono condivise da tutte le sessioni
+dell'app servite dallo stesso processo: un piano già calcolato per un utente
+viene servito subito anche agli altri.
+"""
+
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import fields, is_dataclass
+
+import numpy as np
+
+
+def impronta(*valori):
+    """Impronta (hash) stabile di scalari, array NumPy, tuple/liste e dizionari."""
+    h = hashlib.blake2b(digest_size=16)
+    for v in valori:
+        _aggiorna(h, v)
+    return h.hexdigest()
+
+
+def _aggiorna(h, v):
+    if v is None:
+        h.update(b"N")
+    elif isinstance(v, np.ndarray):
+        a = np.ascontiguousarray(v)
+        h.update(f"A{a.dtype.str}{a.shape}".encode())
+        h.update(a.tobytes())
+    elif isinstance(v, dict):
+        h.update(f"D{len(v)}".encode())
+        for chiave in sorted(v):
+            h.update(str(chiave).encode())
+            _aggiorna(h, v[chiave])
+    elif isinstance(v, (list, tuple)):
+        h.update(f"T{len(v)}".encode())
+        for elemento in v:
+            _aggiorna(h, elemento)
+    else:
+        h.update(f"S{type(v).__name__}:{v!r}".encode())
+
+
+def _sola_lettura(v):
+    """Protegge i risultati in cache da modifiche accidentali dei chiamanti."""
+    if isinstance(v, np.ndarray):
+        v.flags.writeable = False
+    elif isinstance(v, dict):
+        for elemento in v.values():
+            _sola_lettura(elemento)
+    elif isinstance(v, tuple):
+        for elemento in v:
+            _sola_lettura(elemento)
+    return v
+
+
+def dimensione(v):
+    """Stima in byte della memoria occupata da un risultato in cache."""
+    if isinstance(v, np.ndarray):
+        # Le viste condividono la memoria dell'array di base: si conta la vista
+        return v.nbytes
+    if isinstance(v, dict):
+        return sum(dimensione(elemento) for elemento in v.values())
+    if isinstance(v, (list, tuple)):
+        return sum(dimensione(elemento) for elemento in v)
+    if is_dataclass(v) and not isinstance(v, type):
+        return sum(dimensione(getattr(v, f.name)) for f in fields(v))
+    return sys.getsizeof(v)
+
+
+class CacheLRU:
+    """Dizionario limitato a ``max_voci`` elementi con eliminazione LRU.
+
+    ``max_byte`` limita anche la memoria stimata delle voci (vedi
+    ``dimensione``); ``ttl`` è la durata massima in secondi di una voce.
+    Sicura fra thread: le sessioni Streamlit possono condividerla.
+    """
+
+    def __init__(self, max_voci=32, ttl=None, max_byte=None):
+        self.max_voci = max_voci
+        self.ttl = ttl
+        self.max_byte = max_byte
+        self.successi = 0
+        self.mancati = 0
+        self.eliminati = 0
+        self.scaduti = 0
+        self.byte = 0
+        # chiave -> (valore, scadenza, byte)
+        self._voci = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._voci)
+
+    def _rimuovi(self, chiave):
+        _, _, byte = self._voci.pop(chiave)
+        self.byte -= byte
+
+    def leggi(self, chiave):
+        """Restituisce ``(trovato, valore)``."""
+        with self._lock:
+            voce = self._voci.get(chiave)
+            if voce is not None:
+                valore, scadenza, _ = voce
+                if scadenza is None or time.monotonic() < scadenza:
+                    self._voci.move_to_end(chiave)
+                    self.successi += 1
+                    return True, valore
+                self._rimuovi(chiave)
+                self.scaduti += 1
+            self.mancati += 1
+            return False, None
+
+    def scrivi(self, chiave, valore):
+        byte = dimensione(valore) if self.max_byte is not None else 0
+        scadenza = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            if chiave in self._voci:
+                self._rimuovi(chiave)
+            self._voci[chiave] = (valore, scadenza, byte)
+            self.byte += byte
+            # Resta almeno l'ultima voce, anche se da sola supera max_byte
+            while len(self._voci) > 1 and (
+                len(self._voci) > self.max_voci
+                or (self.max_byte is not None and self.byte > self.max_byte)
+            ):
+                self._rimuovi(next(iter(self._voci)))
+                self.eliminati += 1
+
+    def ottieni(self, chiave, calcola):
+        """Valore in cache per ``chiave``, altrimenti ``calcola()`` (poi memorizzato)."""
+        trovato, valore = self.leggi(chiave)
+        if not trovato:
+            valore = calcola()
+            self.scrivi(chiave, valore)
+        return valore
+
+    def statistiche(self):
+        """Successi, mancati, voci, byte stimati, voci eliminate (LRU) e scadute."""
+        with self._lock:
+            return {
+                "successi": self.successi,
+                "mancati": self.mancati,
+                "voci": len(self._voci),
+                "byte": self.byte,
+                "eliminati": self.eliminati,
+                "scaduti": self.scaduti,
+            }
+
+    def svuota(self):
+        with self._lock:
+            self._voci.clear()
+            self.successi = 0
+            self.mancati = 0
+            self.eliminati = 0
+            self.scaduti = 0
+            self.byte = 0
+
+
+class CacheStadi:
+    """Una cache LRU per ciascuno stadio del calcolo (stessi limiti per tutte)."""
+
+    def __init__(self, max_voci=32, ttl=None, max_byte=None):
+        self.max_voci = max_voci
+        self.ttl = ttl
+        self.max_byte = max_byte
+        self._stadi = {}
+        self._lock = threading.Lock()
+
+    def _cache(self, stadio):
+        cache = self._stadi.get(stadio)
+        if cache is None:
+            with self._lock:
+                cache = self._stadi.setdefault(
+                    stadio, CacheLRU(self.max_voci, self.ttl, self.max_byte)
+                )
+        return cache
+
+    def esegui(self, stadio, funzione, *argomenti):
+        """Esegue ``funzione(*argomenti)`` o restituisce il risultato già calcolato."""
+        cache = self._cache(stadio)
+        chiave = impronta(*argomenti)
+        trovato, risultato = cache.leggi(chiave)
+        if not trovato:
+            risultato = _sola_lettura(funzione(*argomenti))
+            cache.scrivi(chiave, risultato)
+        return risultato
+
+    def memorizza(self, stadio, risultato, *argomenti):
+        """Inserisce un risultato già noto (es. letto dall'archivio) come se
+        fosse stato calcolato da ``esegui`` con questi ``argomenti``."""
+        self._cache(stadio).scrivi(impronta(*argomenti), _sola_lettura(risultato))
+        return risultato
+
+    def statistiche(self):
+        """Statistiche della cache di ogni stadio (vedi ``CacheLRU.statistiche``)."""
+        return {stadio: c.statistiche() for stadio, c in list(self._stadi.items())}
+
+    def svuota(self):
+        for cache in self._stadi.values():
+            cache.svuota()
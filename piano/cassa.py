@@ -0,0 +1,119 @@
+"""Liquidità infra-annuale: flussi di cassa per mese (o per periodo).
+
+Il rendiconto finanziario lavora su totali annui; qui ogni flusso annuo del
+piano viene ripartito sui periodi dell'anno secondo un calendario di incassi
+e pagamenti (rette a rate, stipendi mensili con tredicesima e quattordicesima,
+utenze mensili, conferimenti a inizio anno). L'anno del piano è l'anno
+scolastico: il primo mese è settembre.
+
+Le voci senza un calendario proprio (variazioni di crediti e rimanenze,
+investimenti, TFR, fondi rischi) formano gli "altri flussi", ripartiti anch'essi
+secondo un calendario: così la liquidità di fine anno coincide sempre con
+quella del rendiconto annuale. Il calcolo è vettoriale anche con un asse di
+scenari: ``(scenari, anni, periodi)``.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+MESI = ("Set", "Ott", "Nov", "Dic", "Gen", "Feb", "Mar", "Apr", "Mag", "Giu", "Lug", "Ago")
+PERIODI = {12: "Mensile", 6: "Bimestrale", 4: "Trimestrale", 3: "Quadrimestrale",
+           2: "Semestrale", 1: "Annuale"}
+
+VOCI_CASSA = {
+    "rette": "Incasso rette",
+    "contributi": "Contributi",
+    "personale": "Personale",
+    "struttura": "Costi di struttura (esclusi ammortamenti)",
+    "fondo": "Conferimenti al fondo",
+    "altri": "Altri flussi",
+}
+
+
+@dataclass(frozen=True)
+class Calendari:
+    """Pesi mensili (da settembre ad agosto) di incassi e pagamenti.
+
+    I pesi sono relativi: vengono normalizzati a somma 1.
+    """
+
+    # Tre rate: settembre, gennaio, aprile
+    rette: tuple = (0.4, 0, 0, 0, 0.3, 0, 0, 0.3, 0, 0, 0, 0)
+    contributi: tuple = (1,) * 12
+    # Quattordici mensilità: tredicesima a dicembre, quattordicesima a luglio
+    personale: tuple = (1, 1, 1, 2, 1, 1, 1, 1, 1, 1, 2, 1)
+    struttura: tuple = (1,) * 12
+    fondo: tuple = (1,) + (0,) * 11
+    altri: tuple = (1,) * 12
+
+    def pesi(self, voce, periodi=12):
+        """Pesi per periodo della voce, forma ``(periodi,)``, somma 1."""
+        if periodi not in PERIODI:
+            raise ValueError(f"periodi ammessi: {', '.join(map(str, PERIODI))}")
+        mensili = np.asarray(getattr(self, voce), dtype=float)
+        if mensili.shape != (12,) or (mensili < 0).any() or mensili.sum() <= 0:
+            raise ValueError(f"{voce}: attesi 12 pesi mensili non negativi, non tutti nulli")
+        return (mensili / mensili.sum()).reshape(periodi, 12 // periodi).sum(axis=-1)
+
+
+def etichette_periodi(periodi=12):
+    """Etichette dei periodi dell'anno scolastico (es. "Set" o "Set–Nov")."""
+    passo = 12 // periodi
+    if passo == 1:
+        return MESI
+    return tuple(f"{MESI[i]}–{MESI[i + passo - 1]}" for i in range(0, 12, passo))
+
+
+def flussi_annui(piano):
+    """Flussi di cassa annui del piano per voce di ``VOCI_CASSA``: la somma è
+    il flusso netto del rendiconto finanziario."""
+    rf = piano.rf
+    flussi = {
+        "rette": piano.ricavi_totali - piano.contributi,
+        "contributi": piano.contributi,
+        "personale": -piano.totale_personale,
+        "struttura": -(piano.totale_struttura - rf["ammortamenti"]),
+        "fondo": rf["var_pn"],
+    }
+    flussi["altri"] = rf["flusso_netto"] - sum(flussi.values())
+    return flussi
+
+
+@dataclass
+class CassaPeriodica:
+    """Flussi e saldi per periodo, forma ``(..., anni, periodi)``."""
+
+    periodi: int
+    anni: np.ndarray
+    annui: dict  # voce -> (..., anni)
+    pesi: dict  # voce -> (periodi,)
+    liquidita: np.ndarray  # saldo a fine periodo
+
+    def flusso(self, voce):
+        """Flusso della voce per periodo, forma ``(..., anni, periodi)``."""
+        return self.annui[voce][..., None] * self.pesi[voce]
+
+    @property
+    def minimo_annuo(self):
+        """Liquidità minima di ogni anno, forma ``(..., anni)``."""
+        return self.liquidita.min(axis=-1)
+
+    @property
+    def periodo_minimo(self):
+        """Periodo (da 0) in cui si tocca il minimo di ogni anno."""
+        return self.liquidita.argmin(axis=-1)
+
+
+def cassa_periodica(piano, calendari=Calendari(), periodi=12):
+    """Ripartisce i flussi annui del piano (anche con scenari) sui periodi."""
+    annui = flussi_annui(piano)
+    pesi = {voce: calendari.pesi(voce, periodi) for voce in annui}
+    # Flusso netto per periodo in un solo prodotto: (voci, ..., anni) × (voci, periodi)
+    netto = np.einsum("v...y,vp->...yp", np.stack(list(annui.values())),
+                      np.stack(list(pesi.values())))
+    forma = netto.shape
+    # La liquidità iniziale del primo anno è zero, come nel rendiconto annuale
+    liquidita = np.cumsum(netto.reshape(*forma[:-2], -1), axis=-1).reshape(forma)
+    return CassaPeriodica(periodi=periodi, anni=piano.anni, annui=annui, pesi=pesi,
+                          liquidita=liquidita)
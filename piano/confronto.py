@@ -0,0 +1,87 @@
+"""Confronto affiancato di più scenari.
+
+Gli scenari vengono valutati insieme dal motore (un blocco per ogni
+struttura, vedi ``batch.valuta_a_gruppi``) e le serie annuali allineate su un
+asse comune di anni: con orizzonti diversi gli anni mancanti valgono NaN.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .batch import valuta_a_gruppi
+from .motore import anno_break_even
+
+# Serie confrontate: nome -> estrattore dal piano (con asse scenari)
+SERIE = {
+    "Ricavi": lambda piano: piano.ricavi_totali,
+    "Costi totali": lambda piano: piano.costi_totali,
+    "EBIT": lambda piano: piano.risultato_netto,
+    "Liquidità": lambda piano: piano.rf["liq_fine"],
+}
+
+
+@dataclass
+class Confronto:
+    """Serie annuali di K scenari, forma ``(K, anni)``."""
+
+    nomi: tuple
+    anni: np.ndarray
+    n_anni: np.ndarray  # (K,) orizzonte di ogni scenario
+    serie: dict  # nome -> (K, anni), NaN oltre l'orizzonte dello scenario
+    break_even: np.ndarray  # (K,), 0 = non raggiunto
+
+    def delta(self, nome, base=0):
+        """Differenza di ogni scenario rispetto allo scenario ``base``."""
+        valori = self.serie[nome]
+        return valori - valori[base]
+
+    def tabella(self, nome, base=None):
+        """Serie ``nome`` con un anno per riga e uno scenario per colonna
+        (differenze rispetto a ``base``, se indicato)."""
+        valori = self.serie[nome] if base is None else self.delta(nome, base)
+        return pd.DataFrame(valori.T, index=pd.Index(self.anni, name="Anno"),
+                            columns=list(self.nomi))
+
+    def sintesi(self, base=0):
+        """Indicatori per scenario, con le differenze rispetto a ``base``."""
+        ultimo = self.n_anni - 1
+        righe = np.arange(len(self.nomi))
+        ebit = self.serie["EBIT"]
+        df = pd.DataFrame({
+            "Scenario": self.nomi,
+            "Anni": self.n_anni,
+            "Break-even": self.break_even,
+            "Ricavi ultimo anno (€)": self.serie["Ricavi"][righe, ultimo],
+            "EBIT ultimo anno (€)": ebit[righe, ultimo],
+            "EBIT cumulato (€)": np.nansum(ebit, axis=-1),
+            "Liquidità minima (€)": np.nanmin(self.serie["Liquidità"], axis=-1),
+        })
+        for colonna in ("EBIT ultimo anno (€)", "EBIT cumulato (€)", "Liquidità minima (€)"):
+            df[f"Δ {colonna}"] = df[colonna] - df[colonna].iloc[base]
+        return df
+
+
+def confronta(scenari):
+    """Valuta insieme gli scenari ``(nome, params)`` e ne allinea le serie."""
+    if not scenari:
+        raise ValueError("nessuno scenario da confrontare")
+    n_anni = np.array([len(p.new_first_students) for _, p in scenari])
+    anni_max = int(n_anni.max())
+    serie = {nome: np.full((len(scenari), anni_max), np.nan) for nome in SERIE}
+    break_even = np.zeros(len(scenari), dtype=int)
+
+    for indici, piano in valuta_a_gruppi(scenari):
+        orizzonte = len(piano.anni)
+        for nome, estrai in SERIE.items():
+            serie[nome][indici, :orizzonte] = estrai(piano)
+        break_even[indici] = anno_break_even(piano)
+
+    return Confronto(
+        nomi=tuple(nome for nome, _ in scenari),
+        anni=np.arange(1, anni_max + 1),
+        n_anni=n_anni,
+        serie=serie,
+        break_even=break_even,
+    )
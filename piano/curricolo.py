@@ -0,0 +1,65 @@
+"""Curricolo: ore settimanali di lezione per classe e materia.
+
+Ogni classe della scuola ha le proprie ore settimanali per materia (matrice
+``(classi, materie)``, parametro ``ore_curricolo``). Le ore di lezione da
+coprire ogni anno sono le sezioni di ogni classe per le ore della classe::
+
+    ore[s, anno, materia] = sum_c sezioni[s, anno, c] * curricolo[c, materia]
+
+un unico prodotto su classi × materie × anni, anche con un asse di scenari.
+I docenti equivalenti a tempo pieno (FTE) sono le ore divise per le ore
+settimanali di un docente assunto.
+"""
+
+import numpy as np
+
+MATERIE = (
+    "Italiano",
+    "Matematica",
+    "Inglese",
+    "Storia e geografia",
+    "Scienze",
+    "Arte e musica",
+    "Tecnologia",
+    "Educazione fisica",
+)
+
+# Ore settimanali di ogni materia in una sezione, uguali per tutte le classi
+# se il curricolo non è indicato
+ORE_PREDEFINITE = (6, 5, 5, 3, 2, 2, 2, 2)
+
+
+def matrice_curricolo(ore_curricolo, n_classi):
+    """Curricolo ``(classi, materie)`` da ``ore_curricolo`` (``None`` = predefinito).
+
+    Accetta anche i valori in un'unica sequenza, classe per classe (come nei CSV).
+    """
+    if ore_curricolo is None:
+        return np.tile(np.asarray(ORE_PREDEFINITE, dtype=float), (n_classi, 1))
+    curricolo = np.asarray(ore_curricolo, dtype=float)
+    if curricolo.size != n_classi * len(MATERIE):
+        raise ValueError(
+            f"ore_curricolo: attese {len(MATERIE)} materie per ognuna delle {n_classi} classi"
+        )
+    if (curricolo < 0).any():
+        raise ValueError("ore_curricolo: ore negative")
+    return curricolo.reshape(n_classi, len(MATERIE))
+
+
+def sezioni(studenti, alunni_per_sezione):
+    """Sezioni per classe: ``studenti`` ``(S, anni, classi)``, ``alunni_per_sezione`` ``(S,)``."""
+    rapporto = studenti / np.maximum(alunni_per_sezione, 1)[:, None, None]
+    # Tolleranza prima del ceil: 40 studenti / 20 sono 2 sezioni anche con
+    # studenti non interi calcolati dal turnover
+    return np.ceil(rapporto - 1e-9)
+
+
+def ore_lezione(studenti, alunni_per_sezione, curricolo):
+    """Ore settimanali da coprire per materia, forma ``(S, anni, materie)``."""
+    return np.einsum("syc,cm->sym", sezioni(studenti, alunni_per_sezione), curricolo)
+
+
+def docenti_equivalenti(ore, ore_cattedra):
+    """Docenti equivalenti a tempo pieno: ``ore`` ``(S, anni, ...)``, ``ore_cattedra`` ``(S,)``."""
+    ore_cattedra = np.maximum(np.asarray(ore_cattedra, dtype=float), 1)
+    return ore / ore_cattedra.reshape(ore_cattedra.shape + (1,) * (ore.ndim - 1))
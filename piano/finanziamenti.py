@@ -0,0 +1,76 @@
+"""Finanziamenti: prestiti con piano di rimborso e linea di credito revolving.
+
+I prestiti sono descritti da parametri con un valore per prestito
+(``prestiti_importo``, ``prestiti_tasso``, ...), con eventuale asse iniziale
+di scenari: i piani di rimborso di tutti i prestiti e di tutti gli anni si
+calcolano insieme come array ``(scenari, prestiti, anni)``.
+
+Convenzioni: il prestito viene erogato a inizio dell'anno di erogazione, gli
+interessi maturano sul debito in essere durante l'anno e le quote capitale si
+rimborsano a fine anno. La linea revolving viene utilizzata a fine anno per
+riportare a zero la liquidità negativa (fino al fido) e rimborsata appena la
+liquidità lo consente; i suoi interessi maturano sull'utilizzo di inizio anno.
+"""
+
+import numpy as np
+
+# Tipi di prestito (valori di ``prestiti_tipo``)
+AMMORTAMENTO = 0  # quote capitale costanti (ammortamento all'italiana)
+BULLET = 1  # solo interessi, capitale rimborsato alla scadenza
+TIPI_PRESTITO = {AMMORTAMENTO: "Ammortamento", BULLET: "Bullet"}
+
+
+def piano_prestiti(importo, tasso, durata, anno, tipo, n_anni):
+    """Piano di rimborso dei prestiti.
+
+    Gli argomenti hanno forma ``(S, prestiti)``; restituisce un dizionario di
+    array ``(S, prestiti, anni)``: ``erogazione``, ``debito_inizio`` (in essere
+    durante l'anno), ``interessi``, ``rimborso`` e ``debito_fine``.
+    """
+    t = np.arange(1, n_anni + 1)
+    # Anni trascorsi dall'erogazione (0 = anno di erogazione)
+    k = t - anno[..., None]
+    durata = np.maximum(durata, 1)[..., None]
+    importo = importo[..., None]
+    in_essere = (k >= 0) & (k < durata)
+    ultimo = k == durata - 1
+
+    bullet = (tipo == BULLET)[..., None]
+    debito_inizio = np.where(
+        in_essere, np.where(bullet, importo, importo * (1 - k / durata)), 0.0
+    )
+    rimborso = np.where(
+        in_essere, np.where(bullet, np.where(ultimo, importo, 0.0), importo / durata), 0.0
+    )
+    return {
+        "erogazione": np.where(k == 0, importo, 0.0),
+        "debito_inizio": debito_inizio,
+        "interessi": debito_inizio * tasso[..., None],
+        "rimborso": rimborso,
+        # All'ultima rata il debito si estingue esattamente (senza residui di arrotondamento)
+        "debito_fine": np.where(ultimo, 0.0, debito_inizio - rimborso),
+    }
+
+
+def linea_revolving(liquidita, fido, tasso):
+    """Utilizzo della linea revolving che copre la liquidità negativa.
+
+    ``liquidita`` ``(S, anni)`` è la liquidità di fine anno senza la linea;
+    ``fido`` e ``tasso`` hanno forma ``(S,)``. Restituisce ``(utilizzo,
+    interessi)``, entrambi ``(S, anni)``: l'utilizzo di fine anno e gli
+    interessi pagati nell'anno sull'utilizzo di inizio anno.
+
+    Gli interessi riducono la liquidità e quindi possono richiedere un
+    utilizzo maggiore negli anni successivi: la ricorrenza procede per anno,
+    vettoriale sugli scenari.
+    """
+    utilizzo = np.zeros_like(liquidita)
+    interessi = np.zeros_like(liquidita)
+    precedente = np.zeros(liquidita.shape[:-1])
+    interessi_cumulati = np.zeros(liquidita.shape[:-1])
+    for t in range(liquidita.shape[-1]):
+        interessi[..., t] = precedente * tasso
+        interessi_cumulati += interessi[..., t]
+        precedente = np.clip(interessi_cumulati - liquidita[..., t], 0.0, fido)
+        utilizzo[..., t] = precedente
+    return utilizzo, interessi
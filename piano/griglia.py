@@ -0,0 +1,231 @@
+"""Esplorazione a griglia: tutte le combinazioni di retta, crescita delle
+iscrizioni, piano delle superfici e rapporto studenti/docente.
+
+La griglia viene numerata (l'identificativo di uno scenario è il suo indice
+nel prodotto cartesiano) e suddivisa in blocchi contigui, valutati dal motore
+in un pool di processi. I processi scrivono gli esiti direttamente in buffer di
+memoria condivisa, senza serializzare i risultati: anche con milioni di
+scenari si trasferiscono solo gli estremi dei blocchi.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, replace
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+import pandas as pd
+
+from .motore import anno_break_even, calcola_piano
+
+SCENARI_PER_BLOCCO = 20_000
+# Sotto questa soglia il costo di avvio dei processi supera il guadagno
+SCENARI_MINIMI_PARALLELO = 200_000
+
+# Esiti per scenario: (nome, tipo, colonne per anno)
+_ESITI = (
+    ("risultato_netto", np.float32, True),
+    ("liquidita_minima", np.float32, False),
+    ("break_even", np.int16, False),
+)
+
+
+@dataclass(frozen=True)
+class Griglia:
+    """Valori esplorati per ogni asse della griglia.
+
+    ``crescite_iscrizioni`` è il tasso annuo di crescita delle nuove prime a
+    partire da quelle del primo anno (se vuoto si usa la serie dei parametri);
+    ``piani_superficie`` contiene serie di superfici annue complete;
+    ``rapporti_docenti`` il numero di studenti per docente assunto. Gli assi
+    vuoti usano i valori dei parametri di base. Il piano superfici non conta
+    con ``spazi_automatici``, il rapporto studenti per docente con
+    ``organico_ottimizzato``.
+    """
+
+    rette: tuple = ()
+    crescite_iscrizioni: tuple = ()
+    piani_superficie: tuple = ()
+    rapporti_docenti: tuple = ()
+
+
+ASSI = ("Retta (€)", "Crescita iscrizioni", "Piano superfici", "Studenti per docente")
+
+
+@dataclass(frozen=True)
+class RisultatiGriglia:
+    """Esiti compatti della griglia, un elemento per scenario."""
+
+    forma: tuple
+    anni: np.ndarray
+    valori_assi: tuple
+    risultato_netto: np.ndarray  # (scenari, anni)
+    liquidita_minima: np.ndarray  # (scenari,)
+    break_even: np.ndarray  # (scenari,), 0 = non raggiunto
+
+    @property
+    def n_scenari(self):
+        return self.break_even.shape[0]
+
+    def indici_assi(self, ids):
+        """Indice del valore di ogni asse per gli scenari ``ids``."""
+        return np.unravel_index(ids, self.forma)
+
+    def filtra(self, break_even_entro=None, liquidita_minima=None):
+        """Identificativi degli scenari che rispettano i vincoli indicati."""
+        ok = np.ones(self.n_scenari, dtype=bool)
+        if break_even_entro is not None:
+            ok &= (self.break_even > 0) & (self.break_even <= break_even_entro)
+        if liquidita_minima is not None:
+            ok &= self.liquidita_minima >= liquidita_minima
+        return np.flatnonzero(ok)
+
+    def tabella(self, ids=None):
+        """DataFrame degli scenari ``ids`` (tutti se ``None``)."""
+        if ids is None:
+            ids = np.arange(self.n_scenari)
+        ids = np.asarray(ids)
+        df = pd.DataFrame({"Scenario": ids})
+        for nome, valori, indici in zip(ASSI, self.valori_assi, self.indici_assi(ids)):
+            df[nome] = valori[indici]
+        for j, anno in enumerate(self.anni):
+            df[f"EBIT anno {anno} (€)"] = self.risultato_netto[ids, j]
+        df["Liquidità minima (€)"] = self.liquidita_minima[ids]
+        df["Anno di break-even"] = self.break_even[ids]
+        return df
+
+
+def valori_assi(params, griglia):
+    """Valori di ogni asse come array, con quelli di ``params`` per gli assi vuoti."""
+    superfici = griglia.piani_superficie or (params.superfici,)
+    return (
+        np.asarray(griglia.rette or (params.retta_unica,), dtype=float),
+        np.asarray(griglia.crescite_iscrizioni or (np.nan,), dtype=float),
+        np.arange(len(superfici)),
+        np.asarray(griglia.rapporti_docenti or (params.studenti_per_docente,), dtype=float),
+    )
+
+
+def parametri_scenari(params, griglia, ids):
+    """Parametri (con asse scenari) degli scenari ``ids`` della griglia.
+
+    Il numero di docenti è sempre quello automatico, perché il rapporto
+    studenti/docente è uno degli assi.
+    """
+    rette, crescite, _, rapporti = valori_assi(params, griglia)
+    superfici = np.asarray(griglia.piani_superficie or (params.superfici,), dtype=float)
+    forma = (len(rette), len(crescite), len(superfici), len(rapporti))
+    i_retta, i_crescita, i_superficie, i_rapporto = np.unravel_index(ids, forma)
+
+    prime = np.asarray(params.new_first_students, dtype=float)
+    crescita = crescite[i_crescita, None]
+    prime = np.where(
+        np.isnan(crescita), prime, np.rint(prime[0] * (1 + crescita) ** np.arange(len(prime)))
+    )
+    return replace(
+        params,
+        retta_unica=rette[i_retta],
+        new_first_students=prime,
+        superfici=superfici[i_superficie],
+        studenti_per_docente=rapporti[i_rapporto],
+        docenti_assunti=None,
+        docenti_contratto=None,
+    )
+
+
+def _valuta_blocco(params, griglia, ids, buffer):
+    piano = calcola_piano(parametri_scenari(params, griglia, ids), cache=None)
+    buffer["risultato_netto"][ids] = piano.risultato_netto
+    buffer["liquidita_minima"][ids] = piano.rf["liq_fine"].min(axis=-1)
+    buffer["break_even"][ids] = anno_break_even(piano)
+
+
+# ================= PROCESSI DI CALCOLO ================= #
+# Stato del singolo processo, impostato una volta all'avvio del pool
+_processo = {}
+
+
+def _avvia_processo(params, griglia, nomi_memoria, n_scenari, n_anni):
+    memorie = {}
+    buffer = {}
+    for nome, tipo, annuale in _ESITI:
+        memorie[nome] = shared_memory.SharedMemory(name=nomi_memoria[nome])
+        forma = (n_scenari, n_anni) if annuale else (n_scenari,)
+        buffer[nome] = np.ndarray(forma, dtype=tipo, buffer=memorie[nome].buf)
+    _processo.update(params=params, griglia=griglia, memorie=memorie, buffer=buffer)
+
+
+def _esegui_blocco(inizio, fine):
+    ids = np.arange(inizio, fine)
+    _valuta_blocco(_processo["params"], _processo["griglia"], ids, _processo["buffer"])
+    return fine - inizio
+
+
+def esplora(params, griglia, processi=None, scenari_per_blocco=SCENARI_PER_BLOCCO,
+            progresso=None):
+    """Valuta tutti gli scenari della griglia attorno ai parametri ``params``.
+
+    ``processi`` è il numero di processi (``None`` = tutti i core; con 1, o con
+    griglie piccole, il calcolo resta nel processo corrente). ``progresso``, se
+    indicato, viene chiamato con ``(scenari_completati, scenari_totali)``.
+    """
+    assi = valori_assi(params, griglia)
+    forma = tuple(len(a) for a in assi)
+    n_scenari = int(np.prod(forma))
+    n_anni = np.shape(params.new_first_students)[-1]
+    blocchi = [
+        (inizio, min(inizio + scenari_per_blocco, n_scenari))
+        for inizio in range(0, n_scenari, scenari_per_blocco)
+    ]
+
+    if processi is None:
+        processi = os.cpu_count() or 1
+    processi = min(processi, len(blocchi))
+
+    memorie = {}
+    buffer = {}
+    try:
+        for nome, tipo, annuale in _ESITI:
+            forma_esito = (n_scenari, n_anni) if annuale else (n_scenari,)
+            dimensione = max(int(np.prod(forma_esito)) * np.dtype(tipo).itemsize, 1)
+            memorie[nome] = shared_memory.SharedMemory(create=True, size=dimensione)
+            buffer[nome] = np.ndarray(forma_esito, dtype=tipo, buffer=memorie[nome].buf)
+
+        completati = 0
+        if processi <= 1 or n_scenari < SCENARI_MINIMI_PARALLELO:
+            for inizio, fine in blocchi:
+                _valuta_blocco(params, griglia, np.arange(inizio, fine), buffer)
+                completati += fine - inizio
+                if progresso is not None:
+                    progresso(completati, n_scenari)
+        else:
+            # "spawn": il fork di un processo con thread attivi (es. Streamlit) non è sicuro
+            with ProcessPoolExecutor(
+                max_workers=processi,
+                mp_context=get_context("spawn"),
+                initializer=_avvia_processo,
+                initargs=(params, griglia, {n: m.name for n, m in memorie.items()},
+                          n_scenari, n_anni),
+            ) as pool:
+                futuri = [pool.submit(_esegui_blocco, *blocco) for blocco in blocchi]
+                for futuro in as_completed(futuri):
+                    completati += futuro.result()
+                    if progresso is not None:
+                        progresso(completati, n_scenari)
+
+        esiti = {nome: np.array(a) for nome, a in buffer.items()}
+    finally:
+        # Le viste sui buffer vanno rilasciate prima di chiudere la memoria
+        buffer.clear()
+        for memoria in memorie.values():
+            memoria.close()
+            memoria.unlink()
+
+    return RisultatiGriglia(
+        forma=forma,
+        anni=np.arange(1, n_anni + 1),
+        valori_assi=assi,
+        risultato_netto=esiti["risultato_netto"],
+        liquidita_minima=esiti["liquidita_minima"],
+        break_even=esiti["break_even"],
+    )
@@ -0,0 +1,106 @@
+"""Indicizzazione dei prezzi: curve di crescita per driver su orizzonti lunghi.
+
+Retta, retribuzioni e costi al m² di struttura crescono ogni anno secondo il
+tasso del proprio driver: un tasso fisso (``inflazione_<driver>``), una serie
+di tassi per anno (``tassi_indicizzazione``, matrice ``(anni, driver)``) o un
+percorso stocastico estratto attorno ai tassi fissi (``percorsi_stocastici``,
+usato dalla simulazione Monte Carlo). I valori indicati nei parametri sono
+quelli del primo anno.
+
+L'indice di ogni driver è il prodotto cumulato dei fattori di crescita::
+
+    indice[s, anno, driver] = prod_{t=2..anno} (1 + tasso[s, t, driver])
+
+un unico ``cumprod`` per tutti gli scenari, gli anni e i driver; i costi si
+moltiplicano per l'indice del proprio driver con un'indicizzazione.
+"""
+
+import numpy as np
+
+DRIVER = {
+    "rette": "Rette",
+    "personale": "Retribuzioni del personale",
+    "energia": "Energia, gas e acqua",
+    "servizi": "Manutenzioni, pulizie e servizi",
+}
+
+# Driver di ogni voce di struttura al m² (nell'ordine di VOCI_STRUTTURA, senza
+# l'ampliamento degli spazi); None = non indicizzata (gli ammortamenti seguono
+# il costo storico dei beni)
+DRIVER_STRUTTURA = (
+    "servizi",  # manutenzione fabbricati
+    "servizi",  # manutenzione impianti
+    "energia",
+    "energia",  # gas
+    "energia",  # acqua
+    "servizi",  # pulizie
+    None,  # ammortamenti arredi
+    None,  # ammortamenti attrezzature
+    "servizi",  # reception / servizi
+)
+
+
+def matrice_tassi(tassi):
+    """Tassi ``(..., anni, driver)``; accetta anche i valori in un'unica
+    sequenza, anno per anno (come nei CSV)."""
+    a = np.asarray(tassi, dtype=float)
+    if a.ndim == 1:
+        if a.size % len(DRIVER):
+            raise ValueError(f"tassi_indicizzazione: attesi {len(DRIVER)} tassi per anno")
+        a = a.reshape(-1, len(DRIVER))
+    return a
+
+
+def tassi_annui(tassi_fissi, tassi, n_anni):
+    """Tassi di crescita ``(S, anni, driver)``.
+
+    ``tassi_fissi`` mappa ogni driver su un array ``(S,)``; ``tassi``, se non
+    ``None``, è la serie ``(S, anni, driver)`` che li sostituisce.
+    """
+    if tassi is not None:
+        return tassi
+    fissi = np.stack([tassi_fissi[driver] for driver in DRIVER], axis=-1)
+    return np.broadcast_to(fissi[:, None, :], (fissi.shape[0], n_anni, len(DRIVER)))
+
+
+def indici(tassi):
+    """Indici dei prezzi ``(S, anni, driver)`` dai tassi annui: 1 nel primo anno."""
+    fattori = 1 + np.asarray(tassi, dtype=float)
+    fattori = np.concatenate([np.ones_like(fattori[:, :1]), fattori[:, 1:]], axis=1)
+    return np.cumprod(fattori, axis=1)
+
+
+def indice(indici, driver):
+    """Indice ``(S, anni)`` di un driver (``None`` se ``indici`` è ``None``)."""
+    if indici is None:
+        return None
+    return indici[..., list(DRIVER).index(driver)]
+
+
+def moltiplicatori_struttura(indici):
+    """Moltiplicatori ``(S, anni, voci)`` dei costi di struttura al m²."""
+    # Colonna 0 = nessuna indicizzazione, poi i driver nell'ordine di DRIVER
+    con_unita = np.concatenate([np.ones_like(indici[..., :1]), indici], axis=-1)
+    colonne = [0 if driver is None else 1 + list(DRIVER).index(driver)
+               for driver in DRIVER_STRUTTURA]
+    return con_unita[..., colonne]
+
+
+def tassi_centrali(p):
+    """Tassi attorno a cui estrarre i percorsi stocastici di un piano: la serie
+    ``tassi_indicizzazione`` ``(anni, driver)`` o i tassi fissi ``(driver,)``."""
+    if p.tassi_indicizzazione is not None:
+        return matrice_tassi(p.tassi_indicizzazione)
+    return np.array([getattr(p, f"inflazione_{driver}") for driver in DRIVER], dtype=float)
+
+
+def percorsi_stocastici(tassi_medi, volatilita, n_scenari, n_anni, rng):
+    """Tassi ``(n_scenari, anni, driver)`` estratti attorno ai ``tassi_medi``
+    (forma ``(driver,)`` o ``(anni, driver)``).
+
+    Il tasso di ogni anno e driver segue una normale di media il tasso medio
+    e deviazione standard ``volatilita`` (assoluta, es. 0.01 = un punto
+    percentuale), indipendente per anno: la crescita cumulata dei prezzi è un
+    percorso casuale attorno alla curva dei tassi medi.
+    """
+    return rng.normal(tassi_medi, volatilita, size=(n_scenari, n_anni, len(DRIVER)))
@@ -0,0 +1,1015 @@
+"""Motore di calcolo del business plan, indipendente da Streamlit.
+
+Tutti i prospetti (ricavi, personale, costi di struttura, conto economico,
+stato patrimoniale e rendiconto finanziario) sono calcolati come array NumPy
+in un unico passaggio vettoriale.
+
+Ogni parametro di ``ParametriPiano`` può avere un asse iniziale di scenari:
+i parametri scalari accettano un array di forma ``(scenari,)`` e quelli annuali
+un array ``(scenari, anni)``. Lo stesso codice valuta quindi un singolo piano
+oppure migliaia di piani in blocco.
+"""
+
+from dataclasses import dataclass, field, fields, replace
+from typing import Optional, Sequence
+
+import numpy as np
+
+from .cache import CacheStadi
+from .curricolo import matrice_curricolo, ore_lezione
+from .finanziamenti import linea_revolving, piano_prestiti
+from .indicizzazione import (
+    DRIVER,
+    indice,
+    indici,
+    matrice_tassi,
+    moltiplicatori_struttura,
+    tassi_annui,
+)
+from .organico import ottimizza_organico
+from .profilo import misura
+from .spazi import costi_ampliamento, fabbisogno_spazi, percorso_ampliamenti
+
+# --- Variabili di base ---
+CLASSI = ("Prima", "Seconda", "Terza", "Quarta", "Quinta")
+
+# Ordinamenti scolastici disponibili (elenco delle classi dalla prima all'ultima)
+_PRIMARIA = tuple(f"{n}ª primaria" for n in range(1, 6))
+_SECONDARIA_I = tuple(f"{n}ª secondaria I grado" for n in range(1, 4))
+_SECONDARIA_II = tuple(f"{n}ª secondaria II grado" for n in range(1, 6))
+ORDINAMENTI = {
+    "Cinque classi": CLASSI,
+    "Primaria e secondaria di I grado (8 classi)": _PRIMARIA + _SECONDARIA_I,
+    "Primaria e secondaria (13 classi)": _PRIMARIA + _SECONDARIA_I + _SECONDARIA_II,
+}
+ORIZZONTE_MASSIMO = 40
+
+# Rapporto studenti / docente assunto e minimi strutturali dei primi anni
+STUDENTI_PER_DOCENTE = 8
+MINIMO_ASSUNTI = {1: 2, 2: 3}
+DOCENTI_CONTRATTO_BASE = 2
+
+# Ipotesi patrimoniali (stato patrimoniale e rendiconto finanziario)
+IMM_IMMATERIALI_INIZIALI = 30000
+QUOTA_IMM_IMMATERIALI = 5000
+IMM_IMMATERIALI_MINIME = 10000
+IMM_FINANZIARIE = 10000
+ANNI_ARREDI = 5
+RIMANENZE_INIZIALI = 2000
+INCREMENTO_RIMANENZE = 1000
+QUOTA_CREDITI = 0.2
+FONDI_RISCHI_INIZIALI = 5000
+INCREMENTO_FONDI_RISCHI = 1000
+ALIQUOTA_TFR = 0.07
+
+# Voci dei costi di struttura, nell'ordine delle colonne di df_costs
+VOCI_STRUTTURA = (
+    "Manutenzione fabbricati (€/anno)",
+    "Manutenzione impianti (€/anno)",
+    "Energia elettrica (€/anno)",
+    "Fornitura gas (€/anno)",
+    "Acqua (€/anno)",
+    "Pulizie (€/anno)",
+    "Ammortamenti arredi (€/anno)",
+    "Ammort. attrezzature (€/anno)",
+    "Reception / servizi (€/anno)",
+    "Ampliamento spazi (€/anno)",
+)
+IDX_AMM_ARREDI = 6
+IDX_AMM_ATTREZZATURE = 7
+
+
+@dataclass(frozen=True)
+class ParametriPiano:
+    """Insieme completo dei parametri di un piano (o di un blocco di scenari)."""
+
+    # Ricavi
+    new_first_students: Sequence = (10, 12, 14, 16, 18)
+    retta_unica: float = 10000
+    altri_contributi: float = 0
+
+    # Costi di struttura (€/m²/anno)
+    superfici: Sequence = (200, 200, 500, 500, 500)
+    cost_manufab: float = 2.60
+    cost_manimpi: float = 11.96
+    cost_energia: float = 11.52
+    cost_gas: float = 7.05
+    cost_acqua: float = 3.78
+    cost_pulizie: float = 38.43
+    ammort_arredi: float = 10.0
+    base_amm_att: float = 8.5
+    incremento_amm_att: float = 8.5
+    reception_first_two: float = 230.58
+    reception_other: float = 184.46
+    # Piano degli spazi (piano/spazi.py): con spazi_automatici = 1 le superfici
+    # vengono dal fabbisogno di aule, uffici e WC e dal percorso di ampliamento
+    # di costo minimo, al posto di quelle indicate
+    spazi_automatici: float = 0
+    mq_aula: float = 40
+    mq_ufficio: float = 12
+    studenti_per_ufficio: float = 15
+    mq_wc: float = 20
+    studenti_per_wc: float = 30
+    quota_altre: float = 0.65  # altre superfici / (aule + uffici + WC)
+    modulo_superficie: float = 50  # m² di un modulo in locazione
+    costo_ampliamento: float = 0  # € per ogni ampliamento della sede
+
+    # Indicizzazione dei prezzi (piano/indicizzazione.py): tasso annuo di
+    # crescita di ogni driver dal secondo anno (i valori indicati sono quelli del
+    # primo anno). tassi_indicizzazione, se indicato, dà i tassi per anno e
+    # driver (matrice (anni, driver)) al posto di quelli fissi
+    inflazione_rette: float = 0
+    inflazione_personale: float = 0
+    inflazione_energia: float = 0
+    inflazione_servizi: float = 0
+    tassi_indicizzazione: Optional[Sequence] = None
+
+    # Costi del personale
+    costo_docente_assunto: float = 40000
+    costo_docente_contratto: float = 15000
+    personale_direttivo: float = 60000
+    # Regola automatica: un docente assunto ogni ``studenti_per_docente`` studenti
+    studenti_per_docente: float = STUDENTI_PER_DOCENTE
+    # Organico ottimizzato (piano/organico.py), al posto della regola automatica
+    # quando organico_ottimizzato = 1: docenti di costo minimo che coprono le ore
+    # di lezione delle sezioni (al più alunni_per_sezione studenti ciascuna)
+    organico_ottimizzato: float = 0
+    alunni_per_sezione: float = 20
+    ore_cattedra: float = 18  # ore settimanali di un docente assunto
+    ore_contratto: float = 6  # ore settimanali di un docente a contratto
+    ore_direttivo: float = 0  # ore settimanali insegnate dal personale direttivo
+    # None = numero di docenti calcolato automaticamente dagli studenti
+    docenti_assunti: Optional[Sequence] = None
+    docenti_contratto: Optional[Sequence] = None
+
+    # Patrimonio
+    fondo_progressivo: Sequence = (200000, 120000, 90000, 60000, 30000)
+
+    # Finanziamenti (vedi piano/finanziamenti.py): un valore per prestito.
+    # Tipo 0 = quote capitale costanti, 1 = bullet (capitale a scadenza)
+    prestiti_importo: Sequence = ()
+    prestiti_tasso: Sequence = ()
+    prestiti_durata: Sequence = ()
+    prestiti_anno: Sequence = ()
+    prestiti_tipo: Sequence = ()
+    # Linea di credito revolving usata automaticamente per coprire la
+    # liquidità negativa, fino al fido (0 = nessuna linea)
+    fido_revolving: float = 0
+    tasso_revolving: float = 0.06
+
+    # Classi della scuola, dalla prima all'ultima (l'orizzonte è la lunghezza
+    # delle serie annuali, a partire da new_first_students)
+    classi: Sequence = CLASSI
+    # Ore settimanali per classe e materia (vedi piano/curricolo.py), una riga
+    # per classe. None = stesse ore predefinite per tutte le classi
+    ore_curricolo: Optional[Sequence] = None
+
+    # Turnover per classe: quota di studenti della classe precedente che passa
+    # alla classe c e nuovi ingressi laterali in c, in proporzione alla classe
+    # precedente. Un valore per classe (il valore della prima è ignorato) o una
+    # matrice (anni, classi). None = tutti promossi, nessun ingresso.
+    ritenzione: Optional[Sequence] = None
+    ingressi: Optional[Sequence] = None
+
+
+# Parametri con un valore per anno, per classe, per prestito o per anno e
+# driver di indicizzazione; "classi" e "ore_curricolo" descrivono la struttura
+# della scuola, uguale per tutti gli scenari di un blocco; tutti gli altri sono
+# scalari
+PARAMETRI_ANNUALI = (
+    "new_first_students",
+    "superfici",
+    "docenti_assunti",
+    "docenti_contratto",
+    "fondo_progressivo",
+)
+PARAMETRI_PER_CLASSE = ("ritenzione", "ingressi")
+PARAMETRI_PER_PRESTITO = (
+    "prestiti_importo",
+    "prestiti_tasso",
+    "prestiti_durata",
+    "prestiti_anno",
+    "prestiti_tipo",
+)
+PARAMETRI_PER_DRIVER = ("tassi_indicizzazione",)
+PARAMETRI_STRUTTURALI = ("classi", "ore_curricolo")
+PARAMETRI_SCALARI = tuple(
+    f.name for f in fields(ParametriPiano)
+    if f.name not in PARAMETRI_ANNUALI + PARAMETRI_PER_CLASSE + PARAMETRI_PER_PRESTITO
+    and f.name not in PARAMETRI_PER_DRIVER + PARAMETRI_STRUTTURALI
+)
+
+# Come estendere le serie annuali oltre l'ultimo anno indicato: con l'ultimo
+# valore, salvo il fondo di dotazione (nessun nuovo conferimento)
+_RIEMPIMENTO_ANNUALE = {"fondo_progressivo": 0.0}
+PARAMETRI_STRUTTURA = (
+    "cost_manufab",
+    "cost_manimpi",
+    "cost_energia",
+    "cost_gas",
+    "cost_acqua",
+    "cost_pulizie",
+    "ammort_arredi",
+    "base_amm_att",
+    "incremento_amm_att",
+    "reception_first_two",
+    "reception_other",
+)
+PARAMETRI_INFLAZIONE = tuple(f"inflazione_{driver}" for driver in DRIVER)
+PARAMETRI_SPAZI = (
+    "spazi_automatici",
+    "mq_aula",
+    "mq_ufficio",
+    "studenti_per_ufficio",
+    "mq_wc",
+    "studenti_per_wc",
+    "quota_altre",
+    "modulo_superficie",
+    "costo_ampliamento",
+)
+PARAMETRI_PERSONALE = (
+    "costo_docente_assunto",
+    "costo_docente_contratto",
+    "personale_direttivo",
+)
+PARAMETRI_ORGANICO = (
+    "organico_ottimizzato",
+    "alunni_per_sezione",
+    "ore_cattedra",
+    "ore_contratto",
+    "ore_direttivo",
+)
+
+
+@dataclass(frozen=True)
+class Piano:
+    """Risultati del piano. Con scenari, ogni array ha un asse iniziale in più."""
+
+    anni: np.ndarray
+    classi: tuple
+    studenti: np.ndarray  # (anni, classi)
+    studenti_totali: np.ndarray
+    ricavi_classi: np.ndarray  # (anni, classi)
+    contributi: np.ndarray
+    ricavi_totali: np.ndarray
+    superfici: np.ndarray
+    costi_struttura: np.ndarray  # (anni, voci), voci in VOCI_STRUTTURA
+    totale_struttura: np.ndarray
+    docenti_assunti: np.ndarray
+    docenti_contratto: np.ndarray
+    costo_assunti: np.ndarray
+    costo_contratto: np.ndarray
+    personale_direttivo: np.ndarray
+    totale_personale: np.ndarray
+    costi_totali: np.ndarray
+    risultato_netto: np.ndarray
+    ce: dict = field(default_factory=dict)
+    sp: dict = field(default_factory=dict)
+    rf: dict = field(default_factory=dict)
+    # Finanziamenti: oneri, debiti e flussi di prestiti e linea revolving
+    fin: dict = field(default_factory=dict)
+    # Indici dei prezzi per driver di indicizzazione (1 nel primo anno)
+    indici: dict = field(default_factory=dict)
+
+    @property
+    def n_scenari(self):
+        """Numero di scenari (1 per un piano singolo)."""
+        return self.studenti_totali.shape[0] if self.studenti_totali.ndim == 2 else 1
+
+    def scenario(self, k):
+        """Estrae lo scenario ``k`` come piano singolo."""
+        if self.studenti_totali.ndim == 1:
+            return self
+        return _seleziona(self, k)
+
+
+def _seleziona(piano, k):
+    valori = {}
+    for f in fields(piano):
+        v = getattr(piano, f.name)
+        if f.name in ("anni", "classi"):
+            valori[f.name] = v
+        elif isinstance(v, dict):
+            valori[f.name] = {chiave: a[k] for chiave, a in v.items()}
+        else:
+            valori[f.name] = v[k]
+    return Piano(**valori)
+
+
+# ================= PREPARAZIONE PARAMETRI ================= #
+
+def estendi_serie(serie, n_anni, riempimento=None):
+    """Tronca o estende una serie annuale a ``n_anni`` valori.
+
+    L'estensione ripete l'ultimo valore o, se indicato, usa ``riempimento``.
+    Funziona anche con un asse iniziale di scenari.
+    """
+    a = np.asarray(serie, dtype=float)
+    if a.shape[-1] >= n_anni:
+        return a[..., :n_anni]
+    coda = a[..., -1:] if riempimento is None else np.full(a.shape[:-1] + (1,), riempimento)
+    return np.concatenate(
+        [a, np.repeat(coda, n_anni - a.shape[-1], axis=-1)], axis=-1
+    )
+
+
+def adatta_orizzonte(p, n_anni):
+    """Copia di ``p`` con tutte le serie annuali portate a ``n_anni`` valori."""
+    modifiche = {}
+    for nome in PARAMETRI_ANNUALI:
+        serie = getattr(p, nome)
+        if serie is not None:
+            modifiche[nome] = tuple(
+                estendi_serie(serie, n_anni, _RIEMPIMENTO_ANNUALE.get(nome)).tolist()
+            )
+    for nome in PARAMETRI_PER_CLASSE:
+        tassi = getattr(p, nome)
+        if tassi is not None and np.ndim(tassi) == 2:
+            # Tassi variabili per anno: si estende l'asse degli anni
+            modifiche[nome] = tuple(map(tuple, estendi_serie(
+                np.swapaxes(tassi, 0, 1), n_anni
+            ).T.tolist()))
+    for nome in PARAMETRI_PER_DRIVER:
+        tassi = getattr(p, nome)
+        if tassi is not None:
+            modifiche[nome] = tuple(map(tuple, estendi_serie(
+                matrice_tassi(tassi).T, n_anni
+            ).T.tolist()))
+    return replace(p, **modifiche)
+
+
+def prepara_parametri(p):
+    """Converte i parametri in array con asse scenari esplicito.
+
+    Restituisce ``(valori, a_scenari)``: ``valori`` mappa ogni parametro su un
+    array ``(S,)``, ``(S, anni)``, ``(S, anni, classi)`` o ``(S, prestiti)`` (``None`` per i
+    parametri facoltativi assenti) e ``a_scenari`` indica se l'input aveva già
+    un asse di scenari.
+    """
+    grezzi = {}
+    a_scenari = False
+    n_anni = np.shape(p.new_first_students)[-1]
+    n_classi = len(p.classi)
+
+    for nome in PARAMETRI_SCALARI:
+        a = np.asarray(getattr(p, nome), dtype=float)
+        if a.ndim > 1:
+            raise ValueError(f"{nome}: atteso uno scalare o un vettore di scenari")
+        a_scenari |= a.ndim == 1
+        grezzi[nome] = a
+
+    for nome in PARAMETRI_ANNUALI:
+        v = getattr(p, nome)
+        if v is None:
+            grezzi[nome] = None
+            continue
+        a = np.asarray(v, dtype=float)
+        if a.ndim not in (1, 2) or a.shape[-1] != n_anni:
+            raise ValueError(f"{nome}: attesi {n_anni} valori annuali")
+        a_scenari |= a.ndim == 2
+        grezzi[nome] = a
+
+    for nome in PARAMETRI_PER_CLASSE:
+        v = getattr(p, nome)
+        if v is None:
+            grezzi[nome] = None
+            continue
+        a = np.asarray(v, dtype=float)
+        if a.ndim not in (1, 2, 3) or a.shape[-1] != n_classi or (
+            a.ndim > 1 and a.shape[-2] != n_anni
+        ):
+            raise ValueError(f"{nome}: attesi {n_classi} valori per classe (per anno)")
+        a_scenari |= a.ndim == 3
+        grezzi[nome] = a
+
+    for nome in PARAMETRI_PER_DRIVER:
+        v = getattr(p, nome)
+        if v is None:
+            grezzi[nome] = None
+            continue
+        a = matrice_tassi(v)
+        if a.ndim not in (2, 3) or a.shape[-2:] != (n_anni, len(DRIVER)):
+            raise ValueError(f"{nome}: attesi {len(DRIVER)} tassi per anno, per {n_anni} anni")
+        a_scenari |= a.ndim == 3
+        grezzi[nome] = a
+
+    n_prestiti = np.shape(p.prestiti_importo)[-1]
+    for nome in PARAMETRI_PER_PRESTITO:
+        a = np.asarray(getattr(p, nome), dtype=float)
+        if a.ndim not in (1, 2) or a.shape[-1] != n_prestiti:
+            raise ValueError(f"{nome}: attesi {n_prestiti} valori, uno per prestito")
+        a_scenari |= a.ndim == 2
+        grezzi[nome] = a
+
+    def forma_scenari(nome, a):
+        if nome in PARAMETRI_SCALARI:
+            return a.shape[:1]
+        if nome in PARAMETRI_PER_CLASSE + PARAMETRI_PER_DRIVER:
+            return a.shape[:-2]
+        return a.shape[:-1]
+
+    forme = [forma_scenari(nome, a) for nome, a in grezzi.items() if a is not None]
+    n_scenari = np.broadcast_shapes(*forme, (1,))[0]
+
+    valori = {}
+    for nome, a in grezzi.items():
+        if a is None:
+            valori[nome] = None
+        elif nome in PARAMETRI_SCALARI:
+            valori[nome] = np.broadcast_to(a, (n_scenari,))
+        elif nome in PARAMETRI_PER_CLASSE:
+            valori[nome] = np.broadcast_to(a, (n_scenari, n_anni, n_classi))
+        elif nome in PARAMETRI_PER_PRESTITO:
+            valori[nome] = np.broadcast_to(a, (n_scenari, n_prestiti))
+        elif nome in PARAMETRI_PER_DRIVER:
+            valori[nome] = np.broadcast_to(a, (n_scenari, n_anni, len(DRIVER)))
+        else:
+            valori[nome] = np.broadcast_to(a, (n_scenari, n_anni))
+    return valori, a_scenari
+
+
+def ha_scenari(p):
+    """Vero se almeno un parametro ha l'asse iniziale degli scenari."""
+    return (
+        any(np.ndim(getattr(p, nome)) > 0 for nome in PARAMETRI_SCALARI)
+        or any(np.ndim(getattr(p, nome)) > 1
+               for nome in PARAMETRI_ANNUALI if getattr(p, nome) is not None)
+        or any(np.ndim(getattr(p, nome)) > 2
+               for nome in PARAMETRI_PER_CLASSE if getattr(p, nome) is not None)
+        or any(np.ndim(getattr(p, nome)) > 1 for nome in PARAMETRI_PER_PRESTITO)
+        or any(np.ndim(matrice_tassi(getattr(p, nome))) > 2
+               for nome in PARAMETRI_PER_DRIVER if getattr(p, nome) is not None)
+    )
+
+
+# ================= STADI DI CALCOLO ================= #
+# Ogni stadio lavora su array con asse iniziale di scenari (S).
+
+def calcola_studenti(new_first_students, n_classi=len(CLASSI), ritenzione=None, ingressi=None):
+    """Scorrimento delle coorti: la prima dell'anno t è la seconda dell'anno t+1.
+
+    La classe c dell'anno t è la coorte entrata in prima nell'anno t - c: lo
+    scorrimento è un'unica indicizzazione ``(anni, classi)``, per qualsiasi
+    orizzonte e numero di classi. ``new_first_students`` ha forma
+    ``(S, anni)``; il risultato ``(S, anni, classi)``.
+
+    Con ``ritenzione`` e ``ingressi`` (forma ``(S, anni, classi)``) il passaggio
+    dalla classe c-1 alla classe c nell'anno t moltiplica la coorte per
+    ``ritenzione[t, c] + ingressi[t, c]``. Il fattore cumulato di ogni coorte
+    è un prodotto lungo la sua diagonale (anno di ingresso + c, c), calcolato
+    per tutte le coorti e gli scenari con un solo ``cumprod``.
+    """
+    n_anni = new_first_students.shape[-1]
+    coorte = np.arange(n_anni)[:, None] - np.arange(n_classi)[None, :]
+    studenti = new_first_students[..., np.clip(coorte, 0, None)]
+
+    if ritenzione is not None or ingressi is not None:
+        transizione = 1.0
+        if ritenzione is not None:
+            transizione = ritenzione
+        if ingressi is not None:
+            transizione = transizione + ingressi
+        transizione = np.broadcast_to(
+            transizione, new_first_students.shape + (n_classi,)
+        )
+
+        # Diagonali: coorte d (anno di ingresso), classe c -> anno d + c
+        anno = np.arange(n_anni)[:, None] + np.arange(n_classi)[None, :]
+        fattori = np.where(
+            anno < n_anni,
+            transizione[..., np.minimum(anno, n_anni - 1), np.arange(n_classi)],
+            1.0,
+        )
+        fattori[..., 0] = 1.0
+        cumulato = np.cumprod(fattori, axis=-1)  # (S, coorte, classe)
+        studenti = studenti * cumulato[..., np.clip(coorte, 0, None), np.arange(n_classi)]
+
+    return np.where(coorte >= 0, studenti, 0.0)
+
+
+def calcola_ricavi(studenti, retta_unica, altri_contributi, indice_rette=None):
+    """Ricavi per classe (solo retta) e totale annuo comprensivo dei contributi.
+
+    ``indice_rette`` ``(S, anni)`` indicizza la retta (``None`` = costante).
+    """
+    retta = retta_unica[:, None] if indice_rette is None else retta_unica[:, None] * indice_rette
+    ricavi_classi = studenti * retta[..., None]
+    contributi = np.broadcast_to(altri_contributi[:, None], studenti.shape[:2])
+    ricavi_totali = ricavi_classi.sum(axis=-1) + contributi
+    return ricavi_classi, contributi, ricavi_totali
+
+
+def costi_al_m2(n_scenari, n_anni, v, indici_prezzi=None):
+    """Costo al m² di ogni voce di struttura per anno, forma ``(S, anni, voci)``
+    (senza l'ampliamento degli spazi).
+
+    ``v`` mappa i nomi in ``PARAMETRI_STRUTTURA`` su array ``(S,)``; con
+    ``indici_prezzi`` ``(S, anni, driver)`` ogni voce segue l'indice del suo driver.
+    """
+    anni = np.arange(1, n_anni + 1)
+
+    amm_att = v["base_amm_att"][:, None] + (anni - 1) * v["incremento_amm_att"][:, None]
+    reception = np.where(
+        anni <= 2, v["reception_first_two"][:, None], v["reception_other"][:, None]
+    )
+
+    def costante(nome):
+        return np.broadcast_to(v[nome][:, None], (n_scenari, n_anni))
+
+    costi_m2 = np.stack([
+        costante("cost_manufab"),
+        costante("cost_manimpi"),
+        costante("cost_energia"),
+        costante("cost_gas"),
+        costante("cost_acqua"),
+        costante("cost_pulizie"),
+        costante("ammort_arredi"),
+        amm_att,
+        reception,
+    ], axis=-1)
+    if indici_prezzi is None:
+        return costi_m2
+    return costi_m2 * moltiplicatori_struttura(indici_prezzi)
+
+
+def calcola_costi_struttura(superfici, v, ampliamenti=None, indici_prezzi=None):
+    """Costi di struttura per voce, come superficie × costo al m² dell'anno,
+    più il costo degli ``ampliamenti`` della sede ``(S, anni)`` (nessuno se ``None``).
+
+    ``v`` mappa i nomi in ``PARAMETRI_STRUTTURA`` su array ``(S,)``.
+    """
+    costi = superfici[..., None] * costi_al_m2(*superfici.shape, v, indici_prezzi)
+    if ampliamenti is None:
+        ampliamenti = np.zeros_like(superfici)
+    costi = np.concatenate([costi, ampliamenti[..., None]], axis=-1)
+    return costi, costi.sum(axis=-1)
+
+
+def docenti_automatici(studenti_totali, studenti_per_docente=STUDENTI_PER_DOCENTE):
+    """Numero di docenti assunti e a contratto: uno ogni ``studenti_per_docente`` studenti.
+
+    ``studenti_per_docente`` può essere uno scalare o un valore per scenario ``(S,)``.
+    """
+    n_anni = studenti_totali.shape[-1]
+    anni = np.arange(1, n_anni + 1)
+    rapporto = np.asarray(studenti_per_docente, dtype=float)[..., None]
+
+    minimi = np.array([MINIMO_ASSUNTI.get(a, 0) for a in anni], dtype=float)
+    assunti = np.maximum(studenti_totali // rapporto, minimi)
+
+    resto_studenti = studenti_totali - assunti * rapporto
+    contratto = DOCENTI_CONTRATTO_BASE + (resto_studenti > 0)
+    return assunti, contratto.astype(float)
+
+
+def calcola_personale(assunti, contratto, v, indice_personale=None):
+    """Costi del personale docente e direttivo (``v``: ``PARAMETRI_PERSONALE``).
+
+    ``indice_personale`` ``(S, anni)`` indicizza le retribuzioni (``None`` = costanti).
+    """
+    indice_personale = 1.0 if indice_personale is None else indice_personale
+    costo_assunti = assunti * v["costo_docente_assunto"][:, None] * indice_personale
+    costo_contratto = contratto * v["costo_docente_contratto"][:, None] * indice_personale
+    direttivo = np.broadcast_to(
+        v["personale_direttivo"][:, None] * indice_personale, assunti.shape
+    )
+    totale = costo_assunti + costo_contratto + direttivo
+    return costo_assunti, costo_contratto, direttivo, totale
+
+
+def conto_economico(ricavi_totali, altri_contributi, totale_struttura,
+                    totale_personale, costi_struttura, oneri_finanziari=0.0):
+    """Voci del conto economico riclassificato.
+
+    ``ricavi_totali`` comprende già i contributi: i ricavi delle prestazioni
+    sono la differenza, così il risultato coincide con quello dello stato
+    patrimoniale e del rendiconto.
+    """
+    zeri = np.zeros_like(ricavi_totali)
+    oneri_finanziari = zeri + oneri_finanziari
+    ricavi = ricavi_totali
+    contributi = np.broadcast_to(altri_contributi[:, None], ricavi.shape)
+    amm = costi_struttura[..., IDX_AMM_ATTREZZATURE] + costi_struttura[..., IDX_AMM_ARREDI]
+    per_servizi = totale_struttura - amm
+    costi_tot = totale_personale + per_servizi + amm
+    diff = ricavi - costi_tot
+
+    return {
+        "ricavi_puri": ricavi - contributi,
+        "altri_contributi": contributi,
+        "altri_ricavi": zeri,
+        "ricavi_tot": ricavi,
+        "personale": totale_personale,
+        "primo_margine": ricavi - totale_personale,
+        "materie_prime": zeri,
+        "godimento_beni": zeri,
+        "per_servizi": per_servizi,
+        "ammortamenti": amm,
+        "costi_tot": costi_tot,
+        "risultato_operativo": diff,
+        "proventi_partecipazioni": zeri,
+        "altri_proventi_fin": zeri,
+        "interessi_oneri": oneri_finanziari,
+        "tot_finanziari": -oneri_finanziari,
+        "risultato_prima_imposte": diff - oneri_finanziari,
+        "imposte": zeri,
+        "utile_netto": diff - oneri_finanziari,
+    }
+
+
+def _variazione(saldi):
+    """Variazione annua di un saldo, partendo da zero prima del primo anno."""
+    return np.diff(saldi, axis=-1, prepend=0.0)
+
+
+def saldi_patrimoniali(ricavi_totali, totale_personale, costi_struttura):
+    """Saldi di fine anno delle voci patrimoniali diverse da liquidità,
+    patrimonio netto e debiti finanziari, forma ``(S, anni)``."""
+    n_anni = ricavi_totali.shape[-1]
+    i = np.arange(n_anni)
+    zeri = np.zeros_like(ricavi_totali)
+    return {
+        "imm_immateriali": zeri + np.maximum(
+            IMM_IMMATERIALI_INIZIALI - i * QUOTA_IMM_IMMATERIALI, IMM_IMMATERIALI_MINIME
+        ),
+        "imm_materiali": costi_struttura[..., IDX_AMM_ARREDI] * ANNI_ARREDI,
+        "imm_fin": zeri + IMM_FINANZIARIE,
+        "rimanenze": zeri + (RIMANENZE_INIZIALI + i * INCREMENTO_RIMANENZE),
+        "crediti": ricavi_totali * QUOTA_CREDITI,
+        "fondi_rischi": zeri + (FONDI_RISCHI_INIZIALI + i * INCREMENTO_FONDI_RISCHI),
+        "tfr": totale_personale * ALIQUOTA_TFR,
+    }
+
+
+def bilancio_integrato(risultato_netto, ricavi_totali, totale_personale,
+                       costi_struttura, fondo_progressivo,
+                       oneri_finanziari=0.0, debiti_prestiti=0.0, debiti_revolving=0.0):
+    """Stato patrimoniale e rendiconto finanziario dagli stessi saldi: ``(sp, rf)``.
+
+    Ogni voce patrimoniale ha un unico saldo di fine anno (vedi
+    ``saldi_patrimoniali``; la scuola parte da saldi nulli) e il rendiconto
+    ne riporta le variazioni con il metodo indiretto. La liquidità dello stato
+    patrimoniale è quella di fine anno del rendiconto, quindi attivo e passivo
+    quadrano per costruzione. Le attrezzature si rinnovano ogni anno per il
+    valore del loro ammortamento.
+
+    ``risultato_netto`` è il risultato operativo: gli ``oneri_finanziari``
+    riducono il risultato d'esercizio; ``debiti_prestiti`` e
+    ``debiti_revolving`` sono i debiti verso banche di fine anno.
+    """
+    zeri = np.zeros_like(risultato_netto)
+    oneri_finanziari = zeri + oneri_finanziari
+    debiti_prestiti = zeri + debiti_prestiti
+    debiti_revolving = zeri + debiti_revolving
+    debiti_finanziari = debiti_prestiti + debiti_revolving
+    saldi = saldi_patrimoniali(ricavi_totali, totale_personale, costi_struttura)
+    variazioni = {voce: _variazione(saldo) for voce, saldo in saldi.items()}
+    risultato_esercizio = risultato_netto - oneri_finanziari
+
+    # ===== RENDICONTO FINANZIARIO =====
+    # 1) GESTIONE CARATTERISTICA
+    ammortamenti = (
+        costi_struttura[..., IDX_AMM_ARREDI] + costi_struttura[..., IDX_AMM_ATTREZZATURE]
+    )
+    flusso_gestione_caratt = risultato_netto + ammortamenti
+
+    # 2) GESTIONI NON OPERATIVE
+    gestione_finanziaria = -oneri_finanziari
+    flusso_potenziale_ccn = flusso_gestione_caratt + gestione_finanziaria
+
+    # 3) VARIAZIONI CCN
+    var_rimanenze = -variazioni["rimanenze"]
+    var_crediti = -variazioni["crediti"]
+    flusso_gestione_reddituale = flusso_potenziale_ccn + var_rimanenze + var_crediti
+
+    # 4) INVESTIMENTI (al lordo degli ammortamenti restituiti alla gestione caratteristica)
+    var_imm_immateriali = -variazioni["imm_immateriali"]
+    var_imm_materiali = -(variazioni["imm_materiali"] + ammortamenti)
+    var_imm_fin = -variazioni["imm_fin"]
+    flusso_investimenti = var_imm_immateriali + var_imm_materiali + var_imm_fin
+
+    # 5) FINANZIAMENTI
+    var_tfr = variazioni["tfr"]
+    var_fondo_rischi = variazioni["fondi_rischi"]
+    var_patrimonio_netto = fondo_progressivo + zeri
+    var_debiti_lp = _variazione(debiti_prestiti)
+    var_debiti_fin = _variazione(debiti_revolving)
+    flusso_finanziamenti = (var_tfr + var_fondo_rischi + var_patrimonio_netto
+                            + var_debiti_lp + var_debiti_fin)
+
+    # 6) FLUSSO NETTO
+    flusso_netto = flusso_gestione_reddituale + flusso_investimenti + flusso_finanziamenti
+    liquidita_finale = np.cumsum(flusso_netto, axis=-1)
+    liquidita_iniziale = liquidita_finale - flusso_netto
+
+    rf = {
+        "risultato_operativo": risultato_netto,
+        "ammortamenti": ammortamenti,
+        "flusso_gestione_caratt": flusso_gestione_caratt,
+        "gestione_fin": gestione_finanziaria,
+        "gestione_str": zeri,
+        "gestione_fisc": zeri,
+        "flusso_pot_ccn": flusso_potenziale_ccn,
+        "var_rimanenze": var_rimanenze,
+        "var_crediti": var_crediti,
+        "flusso_gestione_redd": flusso_gestione_reddituale,
+        "var_imm_imm": var_imm_immateriali,
+        "var_imm_mat": var_imm_materiali,
+        "var_imm_fin": var_imm_fin,
+        "var_debiti_fin": var_debiti_fin,
+        "var_tfr": var_tfr,
+        "var_debiti_lp": var_debiti_lp,
+        "var_fondo_rischi": var_fondo_rischi,
+        "var_pn": var_patrimonio_netto,
+        "flusso_netto": flusso_netto,
+        "liq_inizio": liquidita_iniziale,
+        "liq_fine": liquidita_finale,
+    }
+
+    # ===== STATO PATRIMONIALE =====
+    tot_imm = saldi["imm_immateriali"] + saldi["imm_materiali"] + saldi["imm_fin"]
+    tot_circ = saldi["rimanenze"] + saldi["crediti"] + liquidita_finale
+    fondo_cumulato = np.cumsum(fondo_progressivo, axis=-1) + zeri
+    utili_portati = np.cumsum(risultato_esercizio, axis=-1) - risultato_esercizio
+    patrimonio_netto = fondo_cumulato + utili_portati + risultato_esercizio
+
+    sp = {
+        # ATTIVO
+        "imm_immateriali": saldi["imm_immateriali"],
+        "imm_materiali": saldi["imm_materiali"],
+        "imm_fin": saldi["imm_fin"],
+        "tot_imm": tot_imm,
+        "rimanenze": saldi["rimanenze"],
+        "crediti": saldi["crediti"],
+        "att_fin_non_imm": zeri,
+        "liquidita": liquidita_finale,
+        "tot_circ": tot_circ,
+        "tot_attivo": tot_imm + tot_circ,
+        # PASSIVO
+        "fondo": fondo_cumulato,
+        "fin_invest": zeri,
+        "riserve_vinc": zeri,
+        "altre_riserve": zeri,
+        "contrib_rip": zeri,
+        "utili_portati": utili_portati,
+        "risultato_es": risultato_esercizio,
+        "tot_pn": patrimonio_netto,
+        "fondi_rischi": saldi["fondi_rischi"],
+        "tfr": saldi["tfr"],
+        "debiti": debiti_finanziari,
+        "debiti_fin": debiti_finanziari,
+        "tot_passivo": patrimonio_netto + saldi["fondi_rischi"] + saldi["tfr"] + debiti_finanziari,
+    }
+    return sp, rf
+
+
+def squadrature(ce, sp, rf):
+    """Scarti massimi delle quadrature (attivo - passivo, liquidità dello stato
+    patrimoniale - liquidità del rendiconto, utile del conto economico -
+    risultato dello stato patrimoniale): zero a meno degli arrotondamenti."""
+    return (
+        float(np.abs(sp["tot_attivo"] - sp["tot_passivo"]).max()),
+        float(np.abs(sp["liquidita"] - rf["liq_fine"]).max()),
+        float(np.abs(ce["utile_netto"] - sp["risultato_es"]).max()),
+    )
+
+
+# ================= PIANO COMPLETO ================= #
+# Ogni stadio riceve solo gli input da cui dipende: la cache lo ricalcola
+# soltanto quando questi cambiano (vedi piano/cache.py).
+
+# Condivisa da tutte le sessioni del processo: con molti utenti sugli stessi
+# parametri (spesso quelli di default) il piano viene calcolato una volta sola.
+# I piani singoli occupano pochi KB, quindi il limite di voci basta a contenere
+# la memoria; la scadenza libera le voci di sessioni ormai chiuse.
+CACHE_STADI = CacheStadi(max_voci=256, ttl=3600)
+
+
+def parametri_canonici(p):
+    """Valori dei parametri in forma canonica, per la chiave della cache.
+
+    Parametri uguali nei numeri danno la stessa chiave anche se arrivano come
+    interi o float, liste o tuple (es. dai widget di sessioni diverse).
+    """
+    return tuple(
+        tuple(str(c) for c in valore) if f.name == "classi"
+        else None if valore is None
+        else np.asarray(valore, dtype=float)
+        for f in fields(p)
+        for valore in [getattr(p, f.name)]
+    )
+
+
+def _stadio_indici(inflazione, tassi_indicizzazione, n_anni):
+    """Indici dei prezzi ``(S, anni, driver)`` dai tassi fissi o dalla serie di
+    tassi; ``None`` se i prezzi sono costanti (nessun moltiplicatore da applicare)."""
+    if tassi_indicizzazione is None and not any(np.any(t) for t in inflazione.values()):
+        return None
+    return indici(tassi_annui(
+        {driver: inflazione[f"inflazione_{driver}"] for driver in DRIVER},
+        tassi_indicizzazione, n_anni,
+    ))
+
+
+def _stadio_ricavi(new_first_students, n_classi, ritenzione, ingressi,
+                   retta_unica, altri_contributi, indice_rette):
+    studenti = calcola_studenti(new_first_students, n_classi, ritenzione, ingressi)
+    studenti_totali = studenti.sum(axis=-1)
+    ricavi_classi, contributi, ricavi_totali = calcola_ricavi(
+        studenti, retta_unica, altri_contributi, indice_rette
+    )
+    return studenti, studenti_totali, ricavi_classi, contributi, ricavi_totali
+
+
+def _stadio_struttura(studenti, superfici, spazi, struttura, indici_prezzi):
+    """Superfici del piano (indicate o dal piano degli spazi, per scenario) e
+    costi di struttura."""
+    if np.any(spazi["spazi_automatici"]):
+        n_scenari, n_anni = superfici.shape
+        fabbisogno = fabbisogno_spazi(studenti, spazi["alunni_per_sezione"], spazi)["fabbisogno"]
+        pianificate = percorso_ampliamenti(
+            fabbisogno, costi_al_m2(n_scenari, n_anni, struttura, indici_prezzi).sum(axis=-1),
+            spazi["modulo_superficie"], spazi["costo_ampliamento"],
+        )
+        superfici = np.where(spazi["spazi_automatici"][:, None] > 0, pianificate, superfici)
+    ampliamenti = costi_ampliamento(superfici, spazi["costo_ampliamento"])
+    return (superfici,) + calcola_costi_struttura(superfici, struttura, ampliamenti,
+                                                  indici_prezzi)
+
+
+def docenti_ottimizzati(studenti, organico, costi, curricolo):
+    """Docenti assunti e a contratto dell'organico ottimizzato dove
+    ``organico_ottimizzato`` è attivo, della regola automatica altrove."""
+    studenti_totali = studenti.sum(axis=-1)
+    assunti, contratto = docenti_automatici(studenti_totali, organico["studenti_per_docente"])
+    ottimizzato = organico["organico_ottimizzato"] > 0
+    if np.any(ottimizzato):
+        ottimo = ottimizza_organico(
+            ore_lezione(studenti, organico["alunni_per_sezione"], curricolo),
+            organico["ore_cattedra"], organico["ore_contratto"], organico["ore_direttivo"],
+            costi["costo_docente_assunto"], costi["costo_docente_contratto"],
+        )
+        assunti = np.where(ottimizzato[:, None], ottimo.totale_assunti, assunti)
+        contratto = np.where(ottimizzato[:, None], ottimo.totale_contratto, contratto)
+    return assunti, contratto
+
+
+def _stadio_personale(studenti, organico, curricolo, docenti_assunti, docenti_contratto, costi,
+                      indice_personale):
+    studenti_totali = studenti.sum(axis=-1)
+    assunti, contratto = docenti_ottimizzati(studenti, organico, costi, curricolo)
+    if docenti_assunti is not None:
+        assunti = docenti_assunti
+    if docenti_contratto is not None:
+        contratto = docenti_contratto
+    assunti = np.broadcast_to(assunti, studenti_totali.shape)
+    contratto = np.broadcast_to(contratto, studenti_totali.shape)
+    # L'indicizzazione non cambia l'organico ottimo: i costi dei due tipi di
+    # docente crescono con lo stesso indice
+    return (assunti, contratto) + calcola_personale(assunti, contratto, costi, indice_personale)
+
+
+def _stadio_prestiti(importo, tasso, durata, anno, tipo, n_anni):
+    """Interessi e debito di fine anno di tutti i prestiti, sommati sui prestiti:
+    ``(S, anni)``."""
+    prestiti = piano_prestiti(importo, tasso, durata, anno, tipo, n_anni)
+    return prestiti["interessi"].sum(axis=-2), prestiti["debito_fine"].sum(axis=-2)
+
+
+def _stadio_prospetti(ricavi_totali, altri_contributi, totale_struttura,
+                      totale_personale, costi_struttura, fondo_progressivo,
+                      prestiti, fido_revolving, tasso_revolving):
+    costi_totali = totale_struttura + totale_personale
+    risultato_netto = ricavi_totali - costi_totali
+    interessi_prestiti, debito_prestiti = prestiti
+
+    argomenti_patrimoniali = (
+        risultato_netto, ricavi_totali, totale_personale,
+        costi_struttura, fondo_progressivo,
+    )
+    # La linea revolving copre la liquidità negativa del bilancio senza la linea
+    utilizzo = interessi_revolving = np.zeros_like(risultato_netto)
+    if np.any(fido_revolving > 0):
+        _, senza_linea = bilancio_integrato(*argomenti_patrimoniali, interessi_prestiti,
+                                            debito_prestiti)
+        utilizzo, interessi_revolving = linea_revolving(
+            senza_linea["liq_fine"], fido_revolving, tasso_revolving
+        )
+    oneri_finanziari = interessi_prestiti + interessi_revolving
+
+    ce = conto_economico(ricavi_totali, altri_contributi, totale_struttura,
+                         totale_personale, costi_struttura, oneri_finanziari)
+    sp, rf = bilancio_integrato(*argomenti_patrimoniali, oneri_finanziari,
+                                debito_prestiti, utilizzo)
+    fin = {
+        "interessi_prestiti": interessi_prestiti,
+        "interessi_revolving": interessi_revolving,
+        "oneri_finanziari": oneri_finanziari,
+        "debito_prestiti": debito_prestiti,
+        "utilizzo_revolving": utilizzo,
+        "debiti_finanziari": debito_prestiti + utilizzo,
+    }
+    return costi_totali, risultato_netto, ce, sp, rf, fin
+
+
+def calcola_piano(p=ParametriPiano(), cache=CACHE_STADI):
+    """Valuta un piano (o un blocco di scenari) e restituisce tutti i prospetti.
+
+    Per un piano singolo gli stadi sono memoizzati in ``cache`` (il piano
+    completo con chiave sui ``parametri_canonici``); i blocchi di
+    scenari vengono sempre ricalcolati, perché raramente si ripetono e
+    occuperebbero troppa memoria. ``cache=None`` disattiva la memoizzazione.
+    """
+    with misura("Calcolo piano"):
+        if cache is None or ha_scenari(p):
+            return _calcola_piano(p, None)
+        return cache.esegui("piano", lambda *_: _calcola_piano(p, cache),
+                            *parametri_canonici(p))
+
+
+def _calcola_piano(p, cache):
+    v, a_scenari = prepara_parametri(p)
+    n_anni = v["new_first_students"].shape[-1]
+
+    def stadio(nome, funzione, *argomenti):
+        with misura(f"Stadio {nome}"):
+            if cache is None:
+                return funzione(*argomenti)
+            return cache.esegui(nome, funzione, *argomenti)
+
+    indici_prezzi = stadio(
+        "indici", _stadio_indici,
+        {nome: v[nome] for nome in PARAMETRI_INFLAZIONE}, v["tassi_indicizzazione"], n_anni,
+    )
+
+    studenti, studenti_totali, ricavi_classi, contributi, ricavi_totali = stadio(
+        "ricavi", _stadio_ricavi,
+        v["new_first_students"], len(p.classi), v["ritenzione"], v["ingressi"],
+        v["retta_unica"], v["altri_contributi"], indice(indici_prezzi, "rette"),
+    )
+
+    superfici, costi_struttura, totale_struttura = stadio(
+        "struttura", _stadio_struttura,
+        studenti, v["superfici"],
+        {nome: v[nome] for nome in PARAMETRI_SPAZI + ("alunni_per_sezione",)},
+        {nome: v[nome] for nome in PARAMETRI_STRUTTURA}, indici_prezzi,
+    )
+
+    (assunti, contratto, costo_assunti, costo_contratto,
+     direttivo, totale_personale) = stadio(
+        "personale", _stadio_personale,
+        studenti, {nome: v[nome] for nome in ("studenti_per_docente",) + PARAMETRI_ORGANICO},
+        matrice_curricolo(p.ore_curricolo, len(p.classi)),
+        v["docenti_assunti"], v["docenti_contratto"],
+        {nome: v[nome] for nome in PARAMETRI_PERSONALE}, indice(indici_prezzi, "personale"),
+    )
+
+    prestiti = stadio(
+        "prestiti", _stadio_prestiti,
+        *(v[nome] for nome in PARAMETRI_PER_PRESTITO), n_anni,
+    )
+
+    costi_totali, risultato_netto, ce, sp, rf, fin = stadio(
+        "prospetti", _stadio_prospetti,
+        ricavi_totali, v["altri_contributi"], totale_struttura,
+        totale_personale, costi_struttura, v["fondo_progressivo"],
+        prestiti, v["fido_revolving"], v["tasso_revolving"],
+    )
+
+    piano = Piano(
+        anni=np.arange(1, n_anni + 1),
+        classi=tuple(p.classi),
+        studenti=studenti,
+        studenti_totali=studenti_totali,
+        ricavi_classi=ricavi_classi,
+        contributi=contributi,
+        ricavi_totali=ricavi_totali,
+        superfici=superfici,
+        costi_struttura=costi_struttura,
+        totale_struttura=totale_struttura,
+        docenti_assunti=assunti,
+        docenti_contratto=contratto,
+        costo_assunti=costo_assunti,
+        costo_contratto=costo_contratto,
+        personale_direttivo=direttivo,
+        totale_personale=totale_personale,
+        costi_totali=costi_totali,
+        risultato_netto=risultato_netto,
+        ce=ce,
+        sp=sp,
+        rf=rf,
+        fin=fin,
+        indici={
+            driver: np.ones_like(risultato_netto) if indici_prezzi is None
+            else indice(indici_prezzi, driver)
+            for driver in DRIVER
+        },
+    )
+    return piano if a_scenari else piano.scenario(0)
+
+
+def anno_break_even(piano):
+    """Primo anno con ricavi ≥ costi totali (0 se non raggiunto), per scenario."""
+    raggiunto = piano.ricavi_totali >= piano.costi_totali
+    primo = np.argmax(raggiunto, axis=-1) + 1
+    return np.where(raggiunto.any(axis=-1), primo, 0)
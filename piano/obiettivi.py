@@ -0,0 +1,75 @@
+"""Ricerca obiettivo: retta, iscrizioni e fondo di dotazione minimi.
+
+Dove il modello è lineare nella variabile cercata la soluzione è in forma
+chiusa (retta e fondo di dotazione); per le iscrizioni, da cui dipende anche il
+numero di docenti a gradini, si valutano tutti i candidati in un unico blocco
+di scenari del motore.
+"""
+
+from dataclasses import replace
+
+import numpy as np
+
+from .motore import anno_break_even, calcola_piano
+
+ISCRIZIONI_MASSIME = 1000
+
+
+def retta_minima(params, anno_obiettivo):
+    """Retta minima per raggiungere il break-even entro ``anno_obiettivo``.
+
+    I ricavi dell'anno t sono ``retta × indice_t × studenti_t + contributi``
+    (``indice_t`` è l'indicizzazione delle rette, 1 nel primo anno) e i costi
+    non dipendono dalla retta: il break-even nell'anno t richiede
+    ``retta ≥ (costi_t - contributi) / (indice_t × studenti_t)`` e basta che
+    valga in un anno qualsiasi fino all'obiettivo. La retta restituita è
+    quella del primo anno. Restituisce ``inf`` se nessuna retta è
+    sufficiente (nessuno studente negli anni considerati).
+    """
+    piano = calcola_piano(params)
+    k = slice(0, anno_obiettivo)
+
+    studenti = piano.studenti_totali[..., k] * piano.indici["rette"][..., k]
+    scoperto = piano.costi_totali[..., k] - piano.contributi[..., k]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        necessaria = np.where(
+            studenti > 0, scoperto / studenti, np.where(scoperto <= 0, 0.0, np.inf)
+        )
+    return np.maximum(necessaria.min(axis=-1), 0.0)
+
+
+def iscrizioni_minime(params, anno_obiettivo, massimo=ISCRIZIONI_MASSIME):
+    """Minime nuove prime annue (costanti) per il break-even entro ``anno_obiettivo``.
+
+    Tutti i valori da 0 a ``massimo`` sono valutati insieme come scenari.
+    Restituisce ``None`` se nessuno è sufficiente.
+    """
+    n_anni = np.shape(params.new_first_students)[-1]
+    candidati = np.arange(massimo + 1, dtype=float)
+
+    piano = calcola_piano(replace(
+        params, new_first_students=np.repeat(candidati[:, None], n_anni, axis=1)
+    ))
+    anno = anno_break_even(piano)
+    raggiunto = (anno > 0) & (anno <= anno_obiettivo)
+    if not raggiunto.any():
+        return None
+    return int(candidati[np.argmax(raggiunto)])
+
+
+def fondo_minimo(params):
+    """Conferimenti annui minimi al fondo di dotazione con liquidità mai negativa.
+
+    La liquidità di fine anno (la stessa nello stato patrimoniale e nel
+    rendiconto) cresce euro per euro con il fondo cumulato. Il fondo cumulato
+    minimo è quindi il massimo progressivo del fabbisogno; i conferimenti ne
+    sono le variazioni annue (mai negative). Funziona anche per blocchi di scenari.
+    """
+    senza_fondo = replace(
+        params, fondo_progressivo=np.zeros(np.shape(params.new_first_students))
+    )
+    piano = calcola_piano(senza_fondo)
+
+    fabbisogno = np.maximum(-piano.rf["liq_fine"], 0.0)
+    cumulato = np.maximum.accumulate(fabbisogno, axis=-1)
+    return np.diff(cumulato, axis=-1, prepend=0.0)
@@ -0,0 +1,183 @@
+"""Organico docenti ottimizzato: il mix di docenti di costo minimo che copre le ore.
+
+Le ore settimanali di lezione di ogni materia vengono dal curricolo (vedi
+``curricolo.ore_lezione``). Ogni docente insegna una sola materia: un docente
+assunto copre fino a ``ore_cattedra`` ore settimanali al costo
+``costo_docente_assunto``, uno a contratto fino a ``ore_contratto`` ore al
+costo ``costo_docente_contratto``. Il personale direttivo, già retribuito,
+insegna fino a ``ore_direttivo`` ore, ripartite fra le materie in modo da
+ridurre il più possibile il costo dei docenti.
+
+Per ogni materia e anno il problema è un piccolo programma intero (copertura
+delle ore con due tipi di docente). Si risolve in modo esatto con una
+programmazione dinamica sulle ore::
+
+    costo[h] = min(costo[h - ore_cattedra] + costo_assunto,
+                   costo[h - ore_contratto] + costo_contratto)
+
+calcolata una sola volta per ogni combinazione distinta di ore e costi del
+blocco di scenari (di solito una) fino al fabbisogno massimo, e poi letta con
+un'indicizzazione per tutti gli scenari, gli anni e le materie.
+
+La ripartizione delle ore del direttivo è un problema dello zaino sulle
+materie, con i costi letti dalla stessa tabella::
+
+    migliore[m, d] = min_k migliore[m - 1, d - k] + costo[ore[m] - k]
+
+risolto per ogni combinazione distinta di ore e parametri degli anni.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from .curricolo import MATERIE
+
+
+@dataclass
+class Organico:
+    """Organico per materia, forma ``(..., anni, materie)``."""
+
+    materie: tuple
+    ore: np.ndarray  # ore settimanali da coprire
+    ore_direttivo: np.ndarray  # ore insegnate dal personale direttivo
+    assunti: np.ndarray
+    contratto: np.ndarray
+    costo: np.ndarray  # costo dei docenti (direttivo escluso)
+
+    @property
+    def totale_assunti(self):
+        return self.assunti.sum(axis=-1)
+
+    @property
+    def totale_contratto(self):
+        return self.contratto.sum(axis=-1)
+
+
+def tabella_copertura(h_max, ore_cattedra, ore_contratto, costo_assunto, costo_contratto):
+    """Copertura di costo minimo di 0..``h_max`` ore per ogni riga di parametri ``(R,)``.
+
+    Restituisce ``(costo, assunti, contratto)``, forma ``(R, h_max + 1)``. A parità
+    di costo si preferisce il docente assunto.
+    """
+    n_righe = len(ore_cattedra)
+    righe = np.arange(n_righe)
+    # Tabelle (ore, righe) in memoria contigua per ora: ogni passo legge due
+    # ore precedenti di tutte le righe con indici piatti
+    costo = np.zeros((h_max + 1) * n_righe)
+    assunti = np.zeros((h_max + 1) * n_righe, dtype=int)
+    contratto = np.zeros((h_max + 1) * n_righe, dtype=int)
+    for h in range(1, h_max + 1):
+        da_assunto = np.maximum(h - ore_cattedra, 0) * n_righe + righe
+        da_contratto = np.maximum(h - ore_contratto, 0) * n_righe + righe
+        con_assunto = costo[da_assunto] + costo_assunto
+        con_contratto = costo[da_contratto] + costo_contratto
+        assunto = con_assunto <= con_contratto
+        corrente = slice(h * n_righe, (h + 1) * n_righe)
+        costo[corrente] = np.where(assunto, con_assunto, con_contratto)
+        assunti[corrente] = np.where(assunto, assunti[da_assunto] + 1, assunti[da_contratto])
+        contratto[corrente] = np.where(assunto, contratto[da_assunto],
+                                       contratto[da_contratto] + 1)
+    return tuple(t.reshape(h_max + 1, n_righe).T for t in (costo, assunti, contratto))
+
+
+def ripartisci_direttivo(costo_min, base, ore, ore_direttivo):
+    """Ore del direttivo per materia che minimizzano il costo dei docenti.
+
+    ``costo_min`` è la tabella di copertura appiattita, ``base`` l'indice della
+    riga di ogni scenario, ``ore`` le ore da coprire ``(S, anni, materie)`` e
+    ``ore_direttivo`` le ore disponibili, tutti compatibili per broadcasting.
+    A parità di costo il direttivo insegna più ore.
+    """
+    n_materie = ore.shape[-1]
+    base, ore_direttivo = (np.broadcast_to(a, ore.shape[:-1] + (1,))
+                           for a in (base, ore_direttivo))
+    # Una ripartizione per ogni combinazione distinta di ore, riga e direttivo
+    punti, inverso = np.unique(
+        np.concatenate([ore, base, ore_direttivo], axis=-1).reshape(-1, n_materie + 2),
+        axis=0, return_inverse=True,
+    )
+    ore_p, base_p, disponibili = punti[:, :n_materie], punti[:, -2:-1], punti[:, -1]
+    n_punti, d_max = len(punti), int(disponibili.max(initial=0))
+
+    # costo[p, m, k]: costo della materia m con k ore al direttivo (inf oltre le ore)
+    k = np.arange(d_max + 1)
+    costo = np.where(
+        k <= ore_p[..., None],
+        np.take(costo_min, base_p[..., None] + np.maximum(ore_p[..., None] - k, 0)),
+        np.inf,
+    )
+    # migliore[p, d]: costo minimo delle materie fin qui con al più d ore
+    migliore = np.zeros((n_punti, d_max + 1))
+    scelta = np.zeros((n_materie, n_punti, d_max + 1), dtype=int)
+    for m in range(n_materie):
+        candidato = np.full_like(migliore, np.inf)
+        for ore_m in range(d_max + 1):
+            valore = migliore[:, :d_max + 1 - ore_m] + costo[:, m, ore_m:ore_m + 1]
+            meglio = valore <= candidato[:, ore_m:]
+            candidato[:, ore_m:] = np.where(meglio, valore, candidato[:, ore_m:])
+            scelta[m, :, ore_m:][meglio] = ore_m
+        migliore = candidato
+
+    # Ricostruzione all'indietro dalle ore disponibili
+    punto = np.arange(n_punti)
+    residue = disponibili.copy()
+    direttivo = np.zeros_like(ore_p)
+    for m in range(n_materie - 1, -1, -1):
+        direttivo[:, m] = scelta[m, punto, residue]
+        residue -= direttivo[:, m]
+    return direttivo[inverso.reshape(-1)].reshape(ore.shape)
+
+
+def ottimizza_organico(ore, ore_cattedra, ore_contratto, ore_direttivo,
+                       costo_assunto, costo_contratto, materie=MATERIE):
+    """Organico di costo minimo per ogni scenario, anno e materia.
+
+    ``ore`` sono le ore settimanali da coprire, forma ``(S, anni, materie)``
+    (o ``(anni, materie)`` per un piano singolo; le ore frazionarie si
+    arrotondano per eccesso); gli altri parametri sono scalari o ``(S,)``.
+    """
+    singolo = np.ndim(ore) == 2
+    ore = np.ceil(np.asarray(ore, dtype=float) - 1e-9).astype(int)
+    if singolo:
+        ore = ore[None]
+    n_scenari = ore.shape[0]
+
+    def per_scenario(valore):
+        return np.broadcast_to(np.asarray(valore, dtype=float), (n_scenari,))
+
+    ore_cattedra = np.maximum(np.rint(per_scenario(ore_cattedra)), 1).astype(int)
+    ore_contratto = np.maximum(np.rint(per_scenario(ore_contratto)), 1).astype(int)
+    ore_direttivo = np.maximum(np.rint(per_scenario(ore_direttivo)), 0).astype(int)
+
+    # Una tabella di copertura per ogni combinazione distinta di ore e costi
+    combinazioni, riga = np.unique(
+        np.stack([ore_cattedra, ore_contratto, per_scenario(costo_assunto),
+                  per_scenario(costo_contratto)], axis=-1),
+        axis=0, return_inverse=True,
+    )
+    h_max = int(ore.max(initial=0))
+    costo_min, assunti_min, contratto_min = tabella_copertura(
+        h_max,
+        combinazioni[:, 0].astype(int), combinazioni[:, 1].astype(int),
+        combinazioni[:, 2], combinazioni[:, 3],
+    )
+    # Indici piatti nelle tabelle: riga dello scenario + ore da coprire
+    base = (riga.reshape(-1) * (h_max + 1))[:, None, None]
+    costo_min = costo_min.ravel()
+
+    direttivo = ripartisci_direttivo(costo_min, base, ore, ore_direttivo[:, None, None])
+    indice = base + ore - direttivo
+
+    organico = Organico(
+        materie=tuple(materie),
+        ore=ore,
+        ore_direttivo=direttivo,
+        assunti=np.take(assunti_min.ravel(), indice),
+        contratto=np.take(contratto_min.ravel(), indice),
+        costo=np.take(costo_min, indice),
+    )
+    if singolo:
+        for nome in ("ore", "ore_direttivo", "assunti", "contratto", "costo"):
+            setattr(organico, nome, getattr(organico, nome)[0])
+    return organico
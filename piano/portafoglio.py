@@ -0,0 +1,134 @@
+"""Portafoglio di più campus con prospetti consolidati.
+
+Ogni campus ha i propri parametri (iscrizioni, superfici, retta, personale)
+e un anno di apertura nel piano di gruppo. I campus vengono valutati insieme
+dal motore (un blocco per struttura, vedi ``batch.valuta_a_gruppi``) e i
+prospetti allineati in array ``(campus, anni)``: il consolidato è la somma
+sull'asse dei campus, perché tutte le voci di conto economico, stato
+patrimoniale e rendiconto sono additive.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .batch import valuta_a_gruppi
+from .motore import ParametriPiano, adatta_orizzonte
+
+PROSPETTI = ("ce", "sp", "rf")
+
+# Serie del piano riportate per campus e nel consolidato
+VOCI = (
+    "studenti_totali",
+    "ricavi_totali",
+    "totale_struttura",
+    "totale_personale",
+    "costi_totali",
+    "risultato_netto",
+)
+
+
+@dataclass(frozen=True)
+class Campus:
+    nome: str
+    params: ParametriPiano
+    anno_apertura: int = 1
+
+
+@dataclass
+class Portafoglio:
+    """Prospetti dei campus sull'asse di anni del gruppo, forma ``(campus, anni)``.
+
+    Prima dell'apertura di un campus le sue voci valgono zero.
+    """
+
+    nomi: tuple
+    anni: np.ndarray
+    aperture: np.ndarray  # (campus,)
+    serie: dict  # voce in VOCI -> (campus, anni)
+    ce: dict
+    sp: dict
+    rf: dict
+
+    @property
+    def n_campus(self):
+        return len(self.nomi)
+
+    def prospetto(self, nome, campus=None):
+        """Voci del prospetto ``nome`` ("ce", "sp" o "rf") di un campus
+        (indice) o, con ``campus=None``, consolidate."""
+        voci = getattr(self, nome)
+        if campus is None:
+            return {voce: valori.sum(axis=0) for voce, valori in voci.items()}
+        return {voce: valori[campus] for voce, valori in voci.items()}
+
+    def sintesi(self):
+        """Una riga per campus e una per il consolidato, con i totali sull'orizzonte
+        (la liquidità minima di un campus è calcolata dalla sua apertura)."""
+        liquidita = self.rf["liq_fine"]
+        aperto = self.anni >= self.aperture[:, None]
+        return pd.DataFrame({
+            "Campus": self.nomi + ("Consolidato",),
+            "Apertura": np.append(self.aperture, self.aperture.min()),
+            "Studenti ultimo anno": np.append(
+                self.serie["studenti_totali"][:, -1], self.serie["studenti_totali"][:, -1].sum()
+            ),
+            "Ricavi (€)": np.append(
+                self.serie["ricavi_totali"].sum(axis=-1), self.serie["ricavi_totali"].sum()
+            ),
+            "Costi totali (€)": np.append(
+                self.serie["costi_totali"].sum(axis=-1), self.serie["costi_totali"].sum()
+            ),
+            "EBIT cumulato (€)": np.append(
+                self.serie["risultato_netto"].sum(axis=-1), self.serie["risultato_netto"].sum()
+            ),
+            "Liquidità minima (€)": np.append(
+                np.where(aperto, liquidita, np.inf).min(axis=-1), liquidita.sum(axis=0).min()
+            ),
+        })
+
+
+def consolida(campus, n_anni=None):
+    """Valuta i ``campus`` su un orizzonte di gruppo di ``n_anni`` anni.
+
+    Senza ``n_anni`` l'orizzonte è quello del campus che chiude più tardi.
+    Le serie di ogni campus vengono adattate agli anni tra la sua apertura e
+    la fine del piano di gruppo (vedi ``adatta_orizzonte``).
+    """
+    if not campus:
+        raise ValueError("nessun campus nel portafoglio")
+    aperture = np.array([c.anno_apertura for c in campus], dtype=int)
+    if aperture.min() < 1:
+        raise ValueError("l'anno di apertura parte da 1")
+    if n_anni is None:
+        n_anni = int(max(a - 1 + len(c.params.new_first_students) for a, c in zip(aperture, campus)))
+    if aperture.max() > n_anni:
+        raise ValueError(f"un campus apre dopo la fine del piano ({n_anni} anni)")
+
+    scenari = [
+        (c.nome, adatta_orizzonte(c.params, n_anni - a + 1)) for a, c in zip(aperture, campus)
+    ]
+    n_campus = len(campus)
+    serie = {voce: np.zeros((n_campus, n_anni)) for voce in VOCI}
+    prospetti = {nome: {} for nome in PROSPETTI}
+
+    # Nello stesso blocco del motore i campus hanno lo stesso orizzonte, quindi
+    # la stessa apertura: ogni voce si copia con un'unica assegnazione
+    for indici, piano in valuta_a_gruppi(scenari):
+        anni = slice(n_anni - len(piano.anni), n_anni)
+        for voce in VOCI:
+            serie[voce][indici, anni] = getattr(piano, voce)
+        for nome in PROSPETTI:
+            for voce, valori in getattr(piano, nome).items():
+                if voce not in prospetti[nome]:
+                    prospetti[nome][voce] = np.zeros((n_campus, n_anni))
+                prospetti[nome][voce][indici, anni] = valori
+
+    return Portafoglio(
+        nomi=tuple(c.nome for c in campus),
+        anni=np.arange(1, n_anni + 1),
+        aperture=aperture,
+        **prospetti,
+        serie=serie,
+    )
@@ -0,0 +1,151 @@
+"""Profilazione facoltativa dei tempi di calcolo e di disegno.
+
+Il motore e l'app segnano i propri stadi con ``misura(nome)`` (blocchi
+annidati) o ``traguardo(nome)`` (tempo trascorso dal traguardo precedente
+dello stesso blocco). Senza un profilatore attivo nel thread corrente le due
+funzioni non fanno nulla, quindi possono restare nel percorso critico.
+
+Ogni sessione dell'app ha il proprio ``Profilatore``; Streamlit esegue ogni
+sessione nel proprio thread, per cui il profilatore attivo è per thread.
+"""
+
+import cProfile
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+SEPARATORE = " › "
+
+_locale = threading.local()
+
+
+class Profilatore:
+    """Tempi delle ultime ``max_esecuzioni`` esecuzioni, con cProfile facoltativo."""
+
+    def __init__(self, max_esecuzioni=50, cprofile=False):
+        self.esecuzioni = deque(maxlen=max_esecuzioni)
+        self.cprofile = cProfile.Profile() if cprofile else None
+        self._pila = []
+
+    # --- Registrazione ---
+    def _registra(self, nome, durata):
+        """Aggiunge una misura sotto il blocco corrente; restituisce la sua posizione."""
+        misure = self.esecuzioni[-1]["misure"]
+        percorso = SEPARATORE.join([blocco["nome"] for blocco in self._pila[1:]] + [nome])
+        misure.append((len(self._pila), percorso, durata))
+        return len(misure) - 1
+
+    def _apri(self, nome):
+        # Il blocco viene registrato subito (prima delle misure interne) e la
+        # durata completata alla chiusura
+        posizione = self._registra(nome, 0.0) if self._pila else None
+        adesso = time.perf_counter()
+        self._pila.append({"nome": nome, "inizio": adesso, "traguardo": adesso,
+                           "posizione": posizione})
+
+    def _chiudi(self):
+        blocco = self._pila.pop()
+        adesso = time.perf_counter()
+        durata = adesso - blocco["inizio"]
+        if self._pila:
+            misure = self.esecuzioni[-1]["misure"]
+            livello, percorso, _ = misure[blocco["posizione"]]
+            misure[blocco["posizione"]] = (livello, percorso, durata)
+            # Il traguardo successivo del blocco esterno parte da qui
+            self._pila[-1]["traguardo"] = adesso
+        else:
+            self.esecuzioni[-1]["totale"] = durata
+
+    def avvia(self, tipo):
+        self.esecuzioni.append({"tipo": tipo, "ora": time.time(), "misure": [], "totale": 0.0})
+        self._pila = []
+        self._apri(tipo)
+        if self.cprofile is not None:
+            try:
+                self.cprofile.enable()
+            except ValueError:
+                # Un altro profilatore è già attivo (es. un'altra sessione con Python ≥ 3.12)
+                pass
+
+    def termina(self):
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        while self._pila:
+            self._chiudi()
+
+    @contextmanager
+    def misura(self, nome):
+        self._apri(nome)
+        try:
+            yield
+        finally:
+            self._chiudi()
+
+    def traguardo(self, nome):
+        blocco = self._pila[-1]
+        adesso = time.perf_counter()
+        self._registra(nome, adesso - blocco["traguardo"])
+        blocco["traguardo"] = adesso
+
+    # --- Lettura ---
+    def riepilogo(self, indice=-1):
+        """Righe ``(livello, nome, chiamate, secondi)`` di un'esecuzione, nell'ordine di misura."""
+        righe = {}
+        for livello, nome, durata in self.esecuzioni[indice]["misure"]:
+            riga = righe.setdefault(nome, [livello, nome, 0, 0.0])
+            riga[2] += 1
+            riga[3] += durata
+        return [tuple(riga) for riga in righe.values()]
+
+    def salva(self, percorso):
+        """Scrive i tempi in JSON (e le statistiche cProfile accanto, ``.prof``)."""
+        percorso = Path(percorso)
+        percorso.parent.mkdir(parents=True, exist_ok=True)
+        percorso.write_text(json.dumps([
+            {**esecuzione, "misure": [
+                {"livello": livello, "nome": nome, "secondi": durata}
+                for livello, nome, durata in esecuzione["misure"]
+            ]}
+            for esecuzione in self.esecuzioni
+        ], indent=2, ensure_ascii=False), encoding="utf-8")
+        percorsi = [percorso]
+        if self.cprofile is not None:
+            percorsi.append(percorso.with_suffix(".prof"))
+            self.cprofile.dump_stats(percorsi[-1])
+        return percorsi
+
+
+# ================= PROFILATORE DEL THREAD CORRENTE ================= #
+def corrente():
+    return getattr(_locale, "profilatore", None)
+
+
+def avvia(profilatore, tipo):
+    """Attiva ``profilatore`` nel thread corrente e apre un'esecuzione."""
+    termina()
+    _locale.profilatore = profilatore
+    profilatore.avvia(tipo)
+
+
+def termina():
+    """Chiude l'esecuzione in corso (se c'è) e disattiva il profilatore."""
+    profilatore = corrente()
+    if profilatore is not None:
+        profilatore.termina()
+        _locale.profilatore = None
+
+
+def misura(nome):
+    profilatore = corrente()
+    if profilatore is None:
+        return nullcontext()
+    return profilatore.misura(nome)
+
+
+def traguardo(nome):
+    profilatore = corrente()
+    if profilatore is not None:
+        profilatore.traguardo(nome)
@@ -0,0 +1,318 @@
+"""Tabelle HTML dei prospetti di bilancio (conto economico, stato patrimoniale,
+rendiconto finanziario).
+
+La struttura di ogni prospetto è descritta come dati (sezioni e righe con la
+voce del motore da mostrare) e un unico renderer la trasforma in HTML. I
+valori di tutte le celle vengono formattati insieme, con operazioni su array,
+e il markup è memoizzato sui valori mostrati e sugli anni visibili: se nulla
+cambia, la riesecuzione riusa la stessa stringa e il browser mantiene
+l'iframe già caricato.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from .cache import CacheLRU, impronta
+
+# Condivisa fra le sessioni, come la cache dei piani (vedi motore.CACHE_STADI)
+CACHE_HTML = CacheLRU(max_voci=256, ttl=3600)
+
+
+@dataclass(frozen=True)
+class Sezione:
+    titolo: str
+
+
+@dataclass(frozen=True)
+class Riga:
+    etichetta: str
+    voce: str
+    grassetto: bool = False
+    rientro: bool = False
+    # Voce su cui calcolare la percentuale (solo nei prospetti con percentuali)
+    percentuale: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Tabella:
+    righe: tuple
+    titolo: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Prospetto:
+    nome: str
+    classe: str
+    stile: str
+    tabelle: tuple
+    intestazione: str = "VOCI"
+    etichetta_anno: str = "ANNO {}"
+    percentuali: bool = False
+
+
+# ================= FORMATTAZIONE VETTORIALE ================= #
+def formatta_euro(valori):
+    """Importi come ``€ 1.234`` / ``-€ 1.234`` (arrotondati all'euro), per un array intero."""
+    v = np.asarray(valori, dtype=float)
+    n = np.rint(np.abs(v)).astype(np.int64)
+
+    # Gruppi di tre cifre dal più significativo: il primo senza zeri iniziali
+    testo = np.full(v.shape, "", dtype=str)
+    cifre = len(str(int(n.max()))) if n.size else 1
+    for k in range((cifre - 1) // 3, -1, -1):
+        soglia = 1000 ** k
+        gruppo = ((n // soglia) % 1000).astype(str)
+        presente = (n >= soglia) | (k == 0)
+        primo = presente & (n < soglia * 1000)
+        pezzo = np.where(primo, gruppo, np.char.add(".", np.char.zfill(gruppo, 3)))
+        testo = np.where(presente, np.char.add(testo, pezzo), testo)
+
+    return np.char.add(np.where(v < 0, "-€ ", "€ "), testo)
+
+
+def formatta_percentuali(valori, totali):
+    """Quote percentuali con un decimale (``"0%"`` se il totale è zero)."""
+    valori = np.asarray(valori, dtype=float)
+    totali = np.asarray(totali, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        quote = np.char.mod("%.1f%%", valori / totali * 100)
+    return np.where(totali == 0, "0%", quote)
+
+
+# ================= RENDERER ================= #
+def html_prospetto(prospetto, serie, anni):
+    """HTML del prospetto per gli ``anni`` indicati (a partire da 1).
+
+    ``serie`` associa a ogni voce del motore i valori annui (``piano.ce``,
+    ``piano.sp`` o ``piano.rf``).
+    """
+    anni = tuple(int(a) for a in anni)
+    indici = np.array(anni, dtype=int) - 1
+    voci = {r.voce for t in prospetto.tabelle for r in t.righe if isinstance(r, Riga)}
+    voci |= {r.percentuale for t in prospetto.tabelle for r in t.righe
+             if isinstance(r, Riga) and r.percentuale}
+    valori = {voce: np.asarray(serie[voce], dtype=float)[indici] for voce in sorted(voci)}
+
+    chiave = impronta(prospetto.nome, anni, valori)
+    trovato, html = CACHE_HTML.leggi(chiave)
+    if not trovato:
+        html = _componi(prospetto, valori, anni)
+        CACHE_HTML.scrivi(chiave, html)
+    return html
+
+
+def _intestazione(prospetto, anni):
+    if prospetto.percentuali:
+        anni_th = "".join(
+            f"<th colspan='2' style='text-align:center;'>{prospetto.etichetta_anno.format(a)}</th>"
+            for a in anni
+        )
+        return (
+            f"<tr><th>{prospetto.intestazione}</th>{anni_th}</tr>"
+            f"<tr><th></th>{'<th>Valore</th><th>%</th>' * len(anni)}</tr>"
+        )
+    anni_th = "".join(f"<th>{prospetto.etichetta_anno.format(a)}</th>" for a in anni)
+    return f"<tr><th>{prospetto.intestazione}</th>{anni_th}</tr>"
+
+
+def _componi(prospetto, valori, anni):
+    colonne = 1 + len(anni) * (2 if prospetto.percentuali else 1)
+    parti = [f"<style>{prospetto.stile}</style>"]
+
+    for tabella in prospetto.tabelle:
+        righe = [r for r in tabella.righe if isinstance(r, Riga)]
+        # Tutte le celle della tabella formattate in un colpo solo: (righe, anni)
+        importi = formatta_euro(np.array([valori[r.voce] for r in righe]).reshape(len(righe), len(anni)))
+        if prospetto.percentuali:
+            quote = formatta_percentuali(
+                [valori[r.voce] for r in righe],
+                [valori[r.percentuale or r.voce] for r in righe],
+            ).reshape(len(righe), len(anni))
+
+        if tabella.titolo:
+            parti.append(f"<h3>{tabella.titolo}</h3>")
+        parti.append(f'<table class="{prospetto.classe}">')
+        parti.append(_intestazione(prospetto, anni))
+
+        i = 0
+        for elemento in tabella.righe:
+            if isinstance(elemento, Sezione):
+                parti.append(
+                    f'<tr class="section"><td colspan="{colonne}">{elemento.titolo}</td></tr>'
+                )
+                continue
+            etichetta = f"<b>{elemento.etichetta}</b>" if elemento.grassetto else elemento.etichetta
+            if prospetto.percentuali:
+                celle = "".join(
+                    f"<td class='value'>{importo}</td>"
+                    f"<td class='perc'>{quota if elemento.percentuale else ''}</td>"
+                    for importo, quota in zip(importi[i], quote[i])
+                )
+            else:
+                celle = "".join(f"<td class='value'>{importo}</td>" for importo in importi[i])
+            classe = " class='sub'" if elemento.rientro else ""
+            parti.append(f"<tr{classe}><td class='label'>{etichetta}</td>{celle}</tr>")
+            i += 1
+
+        parti.append("</table>")
+    return "\n".join(parti)
+
+
+# ================= STRUTTURA DEI PROSPETTI ================= #
+_STILE_CONTO = """
+table.conto {
+    width: 100%; border-collapse: collapse; font-size: 14px; margin-top: 20px;
+}
+table.conto th {
+    background-color: #e1e8f7; text-align: center; padding: 6px 10px; font-weight: bold;
+}
+table.conto td { padding: 6px 10px; border-bottom: 1px solid #ddd; }
+tr.section td {
+    background-color: #f2f5fc; font-weight: bold; border-top: 2px solid #ccc;
+}
+tr.sub td { padding-left: 20px; }
+td.label { text-align: left; }
+td.value { text-align: right; white-space: nowrap; }
+td.perc { text-align: right; color: #555; font-size: 12px; }
+"""
+
+
+def _stile_bilancio(classe, margine=""):
+    return f"""
+table.{classe} {{
+    width: 100%;
+    border-collapse: collapse;
+    font-size: 14px;{margine}
+}}
+table.{classe} th {{
+    background-color: #e1e8f7;
+    padding: 6px;
+    text-align: center;
+}}
+table.{classe} td {{
+    padding: 6px;
+    border-bottom: 1px solid #ddd;
+}}
+td.value {{ text-align: right; }}
+.section {{
+    background-color: #f2f5fc;
+    font-weight: bold;
+}}
+"""
+
+
+CONTO_ECONOMICO = Prospetto(
+    nome="conto_economico",
+    classe="conto",
+    stile=_STILE_CONTO,
+    intestazione="Conto economico",
+    etichetta_anno="Anno {}",
+    percentuali=True,
+    tabelle=(Tabella((
+        Sezione("A) Valore della produzione"),
+        Riga("1) Ricavi delle vendite e delle prestazioni", "ricavi_puri", rientro=True, percentuale="ricavi_tot"),
+        Riga("2) Altri contributi", "altri_contributi", rientro=True, percentuale="ricavi_tot"),
+        Riga("5) Altri ricavi e proventi", "altri_ricavi", rientro=True, percentuale="ricavi_tot"),
+        Riga("Totale valore della produzione (A)", "ricavi_tot", grassetto=True, percentuale="ricavi_tot"),
+
+        Sezione("B) Costi della produzione"),
+        Riga("6) Totale costi per il personale", "personale", rientro=True, percentuale="costi_tot"),
+        Riga("Primo margine operativo", "primo_margine", grassetto=True),
+        Riga("7) Materie prime, sussidiarie, merci", "materie_prime", rientro=True, percentuale="costi_tot"),
+        Riga("8) Per godimento di beni di terzi", "godimento_beni", rientro=True, percentuale="costi_tot"),
+        Riga("9) Per servizi", "per_servizi", rientro=True, percentuale="costi_tot"),
+        Riga("10) Ammortamenti e svalutazioni", "ammortamenti", rientro=True, percentuale="costi_tot"),
+        Riga("Totale costi della produzione (B)", "costi_tot", grassetto=True, percentuale="costi_tot"),
+        Riga("Risultato operativo (A - B)", "risultato_operativo", grassetto=True),
+
+        Sezione("C) Proventi e oneri finanziari"),
+        Riga("15) Proventi da partecipazioni", "proventi_partecipazioni", rientro=True),
+        Riga("16) Altri proventi finanziari", "altri_proventi_fin", rientro=True),
+        Riga("17) Interessi e altri oneri finanziari", "interessi_oneri", rientro=True),
+        Riga("Totale proventi e oneri finanziari", "tot_finanziari", grassetto=True),
+
+        Riga("Risultato prima delle imposte", "risultato_prima_imposte", grassetto=True),
+        Riga("20) Imposte", "imposte"),
+        Riga("Risultato dell'esercizio", "utile_netto", grassetto=True),
+    )),),
+)
+
+STATO_PATRIMONIALE = Prospetto(
+    nome="stato_patrimoniale",
+    classe="sp",
+    stile=_stile_bilancio("sp", "\n    margin-bottom: 40px;"),
+    tabelle=(
+        Tabella(titolo="STATO PATRIMONIALE ATTIVO", righe=(
+            Sezione("A) IMMOBILIZZAZIONI"),
+            Riga("I Immobilizzazioni immateriali", "imm_immateriali"),
+            Riga("II Immobilizzazioni materiali", "imm_materiali"),
+            Riga("III Immobilizzazioni finanziarie", "imm_fin"),
+            Riga("Totale A) Immobilizzazioni", "tot_imm", grassetto=True),
+
+            Sezione("B) ATTIVO CIRCOLANTE"),
+            Riga("I Rimanenze", "rimanenze"),
+            Riga("II Crediti", "crediti"),
+            Riga("III Attività finanziarie non immobilizzate", "att_fin_non_imm"),
+            Riga("IV Disponibilità liquide", "liquidita"),
+            Riga("Totale B) Attivo circolante", "tot_circ", grassetto=True),
+
+            Riga("TOTALE ATTIVO (A+B)", "tot_attivo", grassetto=True),
+        )),
+        Tabella(titolo="STATO PATRIMONIALE PASSIVO", righe=(
+            Sezione("A) PATRIMONIO NETTO"),
+            Riga("I Fondo di dotazione", "fondo"),
+            Riga("II Finanziamenti per investimenti", "fin_invest"),
+            Riga("III Riserve vincolate", "riserve_vinc"),
+            Riga("IV Altre riserve", "altre_riserve"),
+            Riga("V Contributi ripiano perdite", "contrib_rip"),
+            Riga("VI Utili (perdite) portati a nuovo", "utili_portati"),
+            Riga("VII Risultato esercizio", "risultato_es"),
+            Riga("Totale A) Patrimonio netto", "tot_pn", grassetto=True),
+
+            Riga("B) FONDI PER RISCHI E ONERI", "fondi_rischi"),
+            Riga("C) TRATTAMENTO FINE RAPPORTO", "tfr"),
+            Riga("D) DEBITI", "debiti"),
+            Riga("di cui verso banche", "debiti_fin", rientro=True),
+
+            Riga("TOTALE PASSIVO", "tot_passivo", grassetto=True),
+        )),
+    ),
+)
+
+RENDICONTO_FINANZIARIO = Prospetto(
+    nome="rendiconto_finanziario",
+    classe="rf",
+    stile=_stile_bilancio("rf"),
+    tabelle=(Tabella((
+        Sezione("GESTIONE CARATTERISTICA"),
+        Riga("Risultato operativo", "risultato_operativo"),
+        Riga("Ammortamenti e accantonamenti", "ammortamenti"),
+        Riga("FLUSSO DI CASSA DELLA GESTIONE CARATTERISTICA", "flusso_gestione_caratt", grassetto=True),
+
+        Sezione("GESTIONE REDDITUALE"),
+        Riga("Gestione finanziaria (interessi)", "gestione_fin"),
+        Riga("FLUSSO POTENZIALE DI CCN", "flusso_pot_ccn", grassetto=True),
+        Riga("Variazione Rimanenze", "var_rimanenze"),
+        Riga("Variazione Crediti commerciali", "var_crediti"),
+        Riga("FLUSSO DI CASSA DELLA GESTIONE REDDITUALE", "flusso_gestione_redd", grassetto=True),
+
+        Sezione("INVESTIMENTI"),
+        Riga("Variazione Immobilizzazioni immateriali", "var_imm_imm"),
+        Riga("Variazione Immobilizzazioni materiali", "var_imm_mat"),
+        Riga("Variazione Immobilizzazioni finanziarie", "var_imm_fin"),
+
+        Sezione("FINANZIAMENTI"),
+        Riga("Variazione Fondo TFR", "var_tfr"),
+        Riga("Variazione Fondi per rischi e oneri", "var_fondo_rischi"),
+        Riga("Variazione Patrimonio Netto", "var_pn"),
+        Riga("Variazione Debiti verso banche a breve (revolving)", "var_debiti_fin"),
+        Riga("Variazione Debiti a medio-lungo termine (prestiti)", "var_debiti_lp"),
+
+        Sezione("SINTESI"),
+        Riga("FLUSSO DI CASSA NETTO AZIENDALE", "flusso_netto", grassetto=True),
+        Riga("Liquidità netta di inizio anno", "liq_inizio"),
+        Riga("LIQUIDITA' NETTA DI FINE ANNO", "liq_fine", grassetto=True),
+    )),),
+)
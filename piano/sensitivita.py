@@ -0,0 +1,156 @@
+"""Analisi di sensitività dei parametri di costo e della retta.
+
+Entrambe le analisi costruiscono tutti i piani perturbati come un unico blocco
+di scenari e lo valutano con una sola chiamata al motore:
+
+- una alla volta (OAT): ogni parametro a ±x%, per il grafico a tornado e le
+  elasticità;
+- globale: campionamento uniforme di tutti i parametri insieme con gli
+  stimatori di Saltelli (indici di Sobol del primo ordine) e di Jansen
+  (indici totali).
+"""
+
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+from .motore import PARAMETRI_PERSONALE, PARAMETRI_STRUTTURA, anno_break_even, calcola_piano
+
+PARAMETRI_SENSITIVITA = PARAMETRI_STRUTTURA + PARAMETRI_PERSONALE + ("retta_unica",)
+
+ETICHETTE = {
+    "cost_manufab": "Manutenzione fabbricati",
+    "cost_manimpi": "Manutenzione impianti",
+    "cost_energia": "Energia elettrica",
+    "cost_gas": "Fornitura gas",
+    "cost_acqua": "Acqua",
+    "cost_pulizie": "Pulizie",
+    "ammort_arredi": "Ammortamenti arredi",
+    "base_amm_att": "Ammort. attrezzature primo anno",
+    "incremento_amm_att": "Incremento annuo amm. attrezzature",
+    "reception_first_two": "Reception / servizi primi 2 anni",
+    "reception_other": "Reception / servizi dal terzo anno",
+    "costo_docente_assunto": "Costo docente assunto",
+    "costo_docente_contratto": "Costo docente a contratto",
+    "personale_direttivo": "Personale direttivo",
+    "retta_unica": "Retta annuale",
+}
+
+
+def _ebit_finale(piano):
+    return piano.risultato_netto[..., -1]
+
+
+def _liquidita_finale(piano):
+    return piano.sp["liquidita"][..., -1]
+
+
+def _anno_break_even(piano):
+    # Break-even non raggiunto = primo anno oltre l'orizzonte
+    anno = anno_break_even(piano)
+    return np.where(anno > 0, anno, piano.anni[-1] + 1).astype(float)
+
+
+METRICHE = {
+    "EBIT ultimo anno": _ebit_finale,
+    "Liquidità ultimo anno": _liquidita_finale,
+    "Anno di break-even": _anno_break_even,
+}
+
+
+@dataclass(frozen=True)
+class Tornado:
+    """Esiti dell'analisi una alla volta, per metrica: array ``(parametri,)``."""
+
+    parametri: tuple
+    variazione: float
+    base: dict
+    bassa: dict
+    alta: dict
+
+    def elasticita(self, metrica):
+        """Variazione % della metrica per 1% di variazione del parametro."""
+        base = self.base[metrica]
+        if base == 0:
+            return np.full(len(self.parametri), np.nan)
+        delta = (self.alta[metrica] - self.bassa[metrica]) / abs(base)
+        return delta / (2 * self.variazione)
+
+    def ordine(self, metrica):
+        """Indici dei parametri dal più al meno influente."""
+        ampiezza = np.abs(self.alta[metrica] - self.bassa[metrica])
+        return np.argsort(-ampiezza, kind="stable")
+
+
+@dataclass(frozen=True)
+class IndiciSobol:
+    """Indici di Sobol del primo ordine e totali, per metrica: ``(parametri,)``."""
+
+    parametri: tuple
+    primo_ordine: dict
+    totale: dict
+
+
+def _blocco(params, fattori, parametri):
+    """Parametri con ogni voce di ``parametri`` moltiplicata per la colonna di ``fattori``."""
+    modifiche = {
+        nome: float(getattr(params, nome)) * fattori[:, j]
+        for j, nome in enumerate(parametri)
+    }
+    return replace(params, **modifiche)
+
+
+def _metriche(piano):
+    return {nome: funzione(piano) for nome, funzione in METRICHE.items()}
+
+
+def tornado(params, variazione=0.10, parametri=PARAMETRI_SENSITIVITA):
+    """Analisi una alla volta: ogni parametro a ``1 ± variazione``."""
+    n = len(parametri)
+    fattori = np.ones((2 * n + 1, n))
+    fattori[np.arange(n), np.arange(n)] = 1 - variazione
+    fattori[n + np.arange(n), np.arange(n)] = 1 + variazione
+
+    esiti = _metriche(calcola_piano(_blocco(params, fattori, parametri)))
+    return Tornado(
+        parametri=tuple(parametri),
+        variazione=variazione,
+        base={m: float(v[-1]) for m, v in esiti.items()},
+        bassa={m: v[:n] for m, v in esiti.items()},
+        alta={m: v[n:2 * n] for m, v in esiti.items()},
+    )
+
+
+def sobol(params, variazione=0.10, n_campioni=2048, seed=None,
+          parametri=PARAMETRI_SENSITIVITA):
+    """Indici di Sobol con fattori uniformi in ``[1 - variazione, 1 + variazione]``.
+
+    Servono ``n_campioni × (parametri + 2)`` valutazioni, eseguite in un solo
+    blocco: le matrici A, B e le k matrici A con la colonna i presa da B.
+    """
+    rng = np.random.default_rng(seed)
+    k = len(parametri)
+    a = rng.uniform(1 - variazione, 1 + variazione, size=(n_campioni, k))
+    b = rng.uniform(1 - variazione, 1 + variazione, size=(n_campioni, k))
+
+    ab = np.repeat(a[None], k, axis=0)  # (k, N, k)
+    ab[np.arange(k), :, np.arange(k)] = b.T
+    fattori = np.concatenate([a, b, ab.reshape(k * n_campioni, k)])
+
+    esiti = _metriche(calcola_piano(_blocco(params, fattori, parametri)))
+
+    primo_ordine = {}
+    totale = {}
+    for metrica, f in esiti.items():
+        f_a = f[:n_campioni]
+        f_b = f[n_campioni:2 * n_campioni]
+        f_ab = f[2 * n_campioni:].reshape(k, n_campioni)
+        varianza = np.var(np.concatenate([f_a, f_b]))
+        if varianza == 0:
+            primo_ordine[metrica] = np.zeros(k)
+            totale[metrica] = np.zeros(k)
+            continue
+        primo_ordine[metrica] = np.mean(f_b * (f_ab - f_a), axis=1) / varianza
+        totale[metrica] = 0.5 * np.mean((f_a - f_ab) ** 2, axis=1) / varianza
+
+    return IndiciSobol(parametri=tuple(parametri), primo_ordine=primo_ordine, totale=totale)
@@ -0,0 +1,158 @@
+"""Simulazione Monte Carlo di iscrizioni, retta, costi unitari di struttura e
+indicizzazione dei prezzi.
+
+Gli scenari vengono estratti tutti insieme e valutati dal motore come array
+``(scenari, anni, classi)``, a blocchi per contenere la memoria: anche con
+un milione di scenari non si esegue alcun ciclo Python per anno o per classe.
+I percorsi dei tassi di indicizzazione ``(scenari, anni, driver)`` si
+estraggono blocco per blocco, per non tenerli tutti in memoria.
+"""
+
+from dataclasses import astuple, dataclass, replace
+
+import numpy as np
+
+from .cache import CacheLRU, impronta
+from .indicizzazione import percorsi_stocastici, tassi_centrali
+from .motore import anno_break_even, calcola_piano, parametri_canonici
+
+# Costi al m² soggetti a incertezza (gli ammortamenti restano deterministici)
+COSTI_M2_INCERTI = (
+    "cost_manufab",
+    "cost_manimpi",
+    "cost_energia",
+    "cost_gas",
+    "cost_acqua",
+    "cost_pulizie",
+    "reception_first_two",
+    "reception_other",
+)
+
+PERCENTILI = (5, 25, 50, 75, 95)
+SCENARI_PER_BLOCCO = 100_000
+
+# Poche voci: una simulazione da un milione di scenari occupa circa 100 MB.
+# Il limite in byte tiene sotto controllo la memoria quando più sessioni
+# lanciano simulazioni grandi.
+CACHE_SIMULAZIONI = CacheLRU(max_voci=4, ttl=3600, max_byte=512 * 2**20)
+
+
+@dataclass(frozen=True)
+class Incertezza:
+    """Variabilità dei driver, espressa come deviazione standard relativa."""
+
+    variazione_studenti: float = 0.15
+    variazione_retta: float = 0.05
+    variazione_costi_m2: float = 0.10
+    # Deviazione standard assoluta dei tassi annui di indicizzazione attorno a
+    # quelli del piano (0 = curve deterministiche)
+    volatilita_inflazione: float = 0.0
+
+
+@dataclass(frozen=True)
+class Simulazione:
+    """Esiti della simulazione, con un asse iniziale di scenari."""
+
+    anni: np.ndarray
+    risultato_netto: np.ndarray  # (scenari, anni)
+    liquidita: np.ndarray  # (scenari, anni)
+    break_even: np.ndarray  # (scenari,), 0 = non raggiunto
+
+    @property
+    def n_scenari(self):
+        return self.break_even.shape[0]
+
+    def percentili(self, serie, q=PERCENTILI):
+        """Percentili per anno di ``"risultato_netto"`` o ``"liquidita"``: forma ``(len(q), anni)``."""
+        return np.percentile(getattr(self, serie), q, axis=0)
+
+    def frequenze_break_even(self):
+        """Quota di scenari per anno di break-even (indice 0 = non raggiunto)."""
+        conteggi = np.bincount(self.break_even, minlength=len(self.anni) + 1)
+        return conteggi / self.n_scenari
+
+
+def estrai_scenari(params, incertezza, n_scenari, seed=None):
+    """Estrae ``n_scenari`` parametri attorno ai valori centrali di ``params``.
+
+    Le nuove prime seguono una normale arrotondata all'intero e troncata a zero,
+    la retta una normale troncata a zero, i costi al m² un fattore lognormale
+    di media 1 (indipendente per ogni voce).
+    """
+    rng = np.random.default_rng(seed)
+
+    prime = np.asarray(params.new_first_students, dtype=float)
+    prime = rng.normal(prime, incertezza.variazione_studenti * prime,
+                       size=(n_scenari, prime.shape[-1]))
+    prime = np.maximum(np.rint(prime), 0)
+
+    retta = float(params.retta_unica)
+    retta = np.maximum(
+        rng.normal(retta, incertezza.variazione_retta * retta, size=n_scenari), 0
+    )
+
+    sigma = np.sqrt(np.log1p(incertezza.variazione_costi_m2 ** 2))
+    costi = {
+        nome: getattr(params, nome)
+        * rng.lognormal(-sigma ** 2 / 2, sigma, size=n_scenari)
+        for nome in COSTI_M2_INCERTI
+    }
+
+    return replace(params, new_first_students=prime, retta_unica=retta, **costi)
+
+
+def simula(params, incertezza=Incertezza(), n_scenari=10_000, seed=None,
+           scenari_per_blocco=SCENARI_PER_BLOCCO):
+    """Valuta ``n_scenari`` piani estratti attorno a ``params``.
+
+    Con ``seed`` fissato la simulazione è riproducibile e viene memoizzata.
+    """
+    if seed is None:
+        return _simula(params, incertezza, n_scenari, seed, scenari_per_blocco)
+
+    chiave = impronta(parametri_canonici(params), astuple(incertezza), n_scenari, seed)
+    trovato, sim = CACHE_SIMULAZIONI.leggi(chiave)
+    if not trovato:
+        sim = _simula(params, incertezza, n_scenari, seed, scenari_per_blocco)
+        CACHE_SIMULAZIONI.scrivi(chiave, sim)
+    return sim
+
+
+def _simula(params, incertezza, n_scenari, seed, scenari_per_blocco):
+    estratti = estrai_scenari(params, incertezza, n_scenari, seed)
+    n_anni = np.shape(params.new_first_students)[-1]
+
+    # Generatore a parte per i tassi: gli altri estratti non cambiano con la volatilità
+    rng_tassi = np.random.default_rng(None if seed is None else (seed, 1))
+
+    risultato = np.empty((n_scenari, n_anni))
+    liquidita = np.empty((n_scenari, n_anni))
+    break_even = np.empty(n_scenari, dtype=np.int64)
+
+    for inizio in range(0, n_scenari, scenari_per_blocco):
+        blocco = slice(inizio, min(inizio + scenari_per_blocco, n_scenari))
+        parametri = _blocco_parametri(estratti, blocco)
+        if incertezza.volatilita_inflazione > 0:
+            parametri = replace(parametri, tassi_indicizzazione=percorsi_stocastici(
+                tassi_centrali(params), incertezza.volatilita_inflazione,
+                blocco.stop - blocco.start, n_anni, rng_tassi,
+            ))
+        piano = calcola_piano(parametri)
+        risultato[blocco] = piano.risultato_netto
+        liquidita[blocco] = piano.sp["liquidita"]
+        break_even[blocco] = anno_break_even(piano)
+
+    return Simulazione(
+        anni=np.arange(1, n_anni + 1),
+        risultato_netto=risultato,
+        liquidita=liquidita,
+        break_even=break_even,
+    )
+
+
+def _blocco_parametri(estratti, blocco):
+    modifiche = {"new_first_students": estratti.new_first_students[blocco],
+                 "retta_unica": estratti.retta_unica[blocco]}
+    for nome in COSTI_M2_INCERTI:
+        modifiche[nome] = getattr(estratti, nome)[blocco]
+    return replace(estratti, **modifiche)
@@ -0,0 +1,114 @@
+"""Piano degli spazi: superfici necessarie e percorso di ampliamento di costo minimo.
+
+Il fabbisogno di ogni anno viene dagli studenti per classe e da regole di
+dimensionamento:
+
+- un'aula di ``mq_aula`` m² per ogni sezione (vedi ``curricolo.sezioni``);
+- un ufficio di ``mq_ufficio`` m² più uno ogni ``studenti_per_ufficio`` studenti;
+- un blocco WC di ``mq_wc`` m² ogni ``studenti_per_wc`` studenti (almeno uno);
+- altre superfici (hall, reception, disimpegni, locali tecnici) pari a
+  ``quota_altre`` della superficie di aule, uffici e WC.
+
+La sede si prende in locazione a moduli di ``modulo_superficie`` m² e non si
+riduce: ogni ampliamento costa ``costo_ampliamento`` (trasloco, allestimento,
+nuovo contratto), ogni m² in essere il costo al m² dell'anno. Conviene quindi
+anticipare gli ampliamenti quando il costo fisso supera quello degli spazi
+inutilizzati. Con capacità non decrescente la superficie ottima di un anno è
+il fabbisogno massimo raggiunto fino all'ultimo anno prima dell'ampliamento
+successivo, e la scelta si risolve con una programmazione dinamica sugli anni
+di ampliamento (come il problema di lotti economici di Wagner-Whitin)::
+
+    costo[k] = min_j costo[j - 1] + ampliamento(j, k) + fabbisogno[k] * costo_m2[j..k]
+
+vettoriale sugli scenari.
+"""
+
+import numpy as np
+
+from .curricolo import sezioni
+
+VOCI_SPAZI = {
+    "aule": "Aule",
+    "uffici": "Uffici",
+    "blocchi_wc": "Blocchi WC",
+    "mq_aule": "Aule (m²)",
+    "mq_uffici": "Uffici (m²)",
+    "mq_wc": "WC (m²)",
+    "mq_altre": "Altre superfici (m²)",
+    "fabbisogno": "Fabbisogno (m²)",
+}
+
+
+def fabbisogno_spazi(studenti, alunni_per_sezione, regole):
+    """Locali e superfici necessari per anno, forma ``(S, anni)``.
+
+    ``studenti`` ha forma ``(S, anni, classi)``; ``regole`` mappa i nomi delle
+    regole di dimensionamento (``mq_aula``, ``mq_ufficio``, ...) su array ``(S,)``.
+    """
+    def regola(nome):
+        return np.asarray(regole[nome], dtype=float)[:, None]
+
+    studenti_totali = studenti.sum(axis=-1)
+    aule = sezioni(studenti, alunni_per_sezione).sum(axis=-1)
+    uffici = 1 + np.ceil(studenti_totali / np.maximum(regola("studenti_per_ufficio"), 1) - 1e-9)
+    blocchi_wc = np.maximum(
+        np.ceil(studenti_totali / np.maximum(regola("studenti_per_wc"), 1) - 1e-9), 1
+    )
+    spazi = {
+        "aule": aule,
+        "uffici": uffici,
+        "blocchi_wc": blocchi_wc,
+        "mq_aule": aule * regola("mq_aula"),
+        "mq_uffici": uffici * regola("mq_ufficio"),
+        "mq_wc": blocchi_wc * regola("mq_wc"),
+    }
+    netti = spazi["mq_aule"] + spazi["mq_uffici"] + spazi["mq_wc"]
+    spazi["mq_altre"] = netti * regola("quota_altre")
+    spazi["fabbisogno"] = netti + spazi["mq_altre"]
+    return spazi
+
+
+def percorso_ampliamenti(fabbisogno, costo_m2, modulo, costo_ampliamento):
+    """Superficie in locazione per anno che copre il ``fabbisogno`` al costo minimo.
+
+    ``fabbisogno`` e ``costo_m2`` (costo annuo di un m² in essere) hanno forma
+    ``(S, anni)``, ``modulo`` e ``costo_ampliamento`` forma ``(S,)``. La superficie
+    è un multiplo del modulo, non decresce e copre il fabbisogno di ogni anno;
+    il primo insediamento non conta come ampliamento.
+    """
+    n_scenari, n_anni = fabbisogno.shape
+    modulo = np.maximum(np.asarray(modulo, dtype=float), 1)[:, None]
+    costo_ampliamento = np.asarray(costo_ampliamento, dtype=float)
+    # Capacità minima di ogni anno: fabbisogno massimo fin lì, in moduli interi
+    necessaria = np.maximum.accumulate(np.ceil(fabbisogno / modulo - 1e-9) * modulo, axis=-1)
+    # Costo al m² cumulato: la somma sugli anni j..k è una differenza
+    cumulato = np.concatenate([np.zeros((n_scenari, 1)), np.cumsum(costo_m2, axis=-1)], axis=-1)
+
+    costo = np.zeros((n_scenari, n_anni + 1))  # costo[k + 1]: anni 0..k coperti
+    inizio = np.zeros((n_scenari, n_anni), dtype=int)  # primo anno del blocco che finisce in k
+    for k in range(n_anni):
+        j = np.arange(k + 1)
+        precedente = np.where(j > 0, necessaria[:, np.maximum(j - 1, 0)], 0.0)
+        ampliamento = np.where(
+            (j > 0) & (necessaria[:, k:k + 1] > precedente), costo_ampliamento[:, None], 0.0
+        )
+        candidati = (costo[:, :k + 1] + ampliamento
+                     + necessaria[:, k:k + 1] * (cumulato[:, k + 1:k + 2] - cumulato[:, :k + 1]))
+        inizio[:, k] = candidati.argmin(axis=-1)
+        costo[:, k + 1] = candidati.min(axis=-1)
+
+    # Ricostruzione all'indietro: ogni blocco ha la capacità necessaria al suo ultimo anno
+    righe = np.arange(n_scenari)
+    superfici = np.empty_like(necessaria)
+    fine = np.full(n_scenari, n_anni - 1)
+    for t in range(n_anni - 1, -1, -1):
+        superfici[:, t] = necessaria[righe, fine]
+        fine = np.where(inizio[righe, fine] == t, t - 1, fine)
+    return superfici
+
+
+def costi_ampliamento(superfici, costo_ampliamento):
+    """Costo degli ampliamenti per anno: ``costo_ampliamento`` ``(S,)`` in ogni
+    anno, dal secondo, in cui la superficie ``(S, anni)`` aumenta."""
+    aumenta = np.diff(superfici, axis=-1, prepend=superfici[..., :1]) > 0
+    return np.where(aumenta, np.asarray(costo_ampliamento, dtype=float)[:, None], 0.0)
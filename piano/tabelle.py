@@ -0,0 +1,69 @@
+"""Conversione dei risultati del motore nelle tabelle pandas mostrate dall'app."""
+
+import numpy as np
+import pandas as pd
+
+from .motore import VOCI_STRUTTURA
+
+
+def _interi(a):
+    """Mostra come interi i valori senza parte decimale (studenti, docenti, €)."""
+    a = np.asarray(a)
+    if np.all(np.mod(a, 1) == 0):
+        return a.astype(np.int64)
+    return a
+
+
+def df_students(piano):
+    df = pd.DataFrame({"Anno": piano.anni})
+    studenti = _interi(piano.studenti)
+    for j, c in enumerate(piano.classi):
+        df[c] = studenti[:, j]
+    df["Studenti totali"] = _interi(piano.studenti_totali)
+    return df
+
+
+def df_ricavi(piano):
+    df = pd.DataFrame({"Anno": piano.anni})
+    ricavi_classi = _interi(piano.ricavi_classi)
+    for j, c in enumerate(piano.classi):
+        df[c] = ricavi_classi[:, j]
+    df["Contributi (€)"] = _interi(piano.contributi)
+    df["Totale ricavi (€)"] = _interi(piano.ricavi_totali)
+    return df
+
+
+def df_costs(piano):
+    df = pd.DataFrame({
+        "Anno": piano.anni,
+        "Studenti totali": _interi(piano.studenti_totali),
+        "Superficie (m²)": piano.superfici.astype(float),
+    })
+    for j, voce in enumerate(VOCI_STRUTTURA):
+        df[voce] = piano.costi_struttura[:, j]
+    df["Totale Costi Struttura (€/anno)"] = piano.totale_struttura
+    return df
+
+
+def df_personale(piano):
+    return pd.DataFrame({
+        "Anno": piano.anni,
+        "Studenti totali": _interi(piano.studenti_totali),
+        "Docenti assunti": _interi(piano.docenti_assunti),
+        "Costo annuo docenti assunti (€)": _interi(piano.costo_assunti),
+        "Docenti a contratto": _interi(piano.docenti_contratto),
+        "Costo docenti a contratto (€)": _interi(piano.costo_contratto),
+        "Personale direttivo (€)": _interi(piano.personale_direttivo),
+        "Totale costi personale (€)": _interi(piano.totale_personale),
+    })
+
+
+def df_summary(piano):
+    return pd.DataFrame({
+        "Anno": piano.anni,
+        "Ricavi (€)": _interi(piano.ricavi_totali),
+        "Costi struttura (€)": piano.totale_struttura,
+        "Costi personale (€)": _interi(piano.totale_personale),
+        "Costi totali (€)": piano.costi_totali,
+        "Risultato netto (€)": piano.risultato_netto,
+    })
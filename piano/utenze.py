@@ -0,0 +1,130 @@
+"""Prezzi delle utenze stocastici e costo a rischio della struttura.
+
+Energia elettrica, gas e acqua sono le voci più volatili dei costi di
+struttura. Il prezzo di ogni utenza si discosta da quello del piano (già
+indicizzato) con un fattore ``exp(x)``, dove la deviazione logaritmica ``x``
+ritorna verso zero ogni anno (processo autoregressivo, Ornstein-Uhlenbeck
+discreto) e gli shock delle tre utenze sono correlati::
+
+    x[t] = (1 - riversione) * x[t - 1] + volatilita * L @ z[t],   z ~ N(0, I)
+
+con ``L`` il fattore di Cholesky della matrice di correlazione. Il primo anno
+ha i prezzi del piano; il fattore è corretto per la varianza, quindi ha media 1.
+
+I costi di struttura sono lineari nel costo al m² di ogni voce: i costi di
+tutti i percorsi si ottengono in un unico prodotto a partire da quelli del
+piano, forma ``(percorsi, anni)``. Il costo a rischio (CaR) di un anno è lo
+scarto fra il percentile ``livello`` dei costi e il costo del piano.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# Utenze (parametro di costo al m²) e posizione in VOCI_STRUTTURA
+UTENZE = {
+    "cost_energia": "Energia elettrica",
+    "cost_gas": "Gas",
+    "cost_acqua": "Acqua",
+}
+IDX_UTENZE = (2, 3, 4)
+
+
+@dataclass(frozen=True)
+class ModelloUtenze:
+    """Dinamica dei prezzi delle utenze, nell'ordine di ``UTENZE``."""
+
+    # Deviazione standard annua degli shock (logaritmica, 0.25 ≈ ±25%)
+    volatilita: tuple = (0.25, 0.30, 0.08)
+    # Quota della deviazione riassorbita ogni anno (0 = passeggiata casuale)
+    riversione: float = 0.4
+    correlazione: tuple = (
+        (1.0, 0.7, 0.1),
+        (0.7, 1.0, 0.1),
+        (0.1, 0.1, 1.0),
+    )
+
+    def cholesky(self):
+        """Fattore di Cholesky della correlazione, dopo averla validata."""
+        c = np.asarray(self.correlazione, dtype=float)
+        n = len(UTENZE)
+        if c.shape != (n, n) or not np.allclose(c, c.T) or not np.allclose(np.diag(c), 1):
+            raise ValueError(f"correlazione: attesa una matrice {n}×{n} simmetrica con 1 in diagonale")
+        if (np.abs(c) > 1).any():
+            raise ValueError("correlazione: valori fuori da [-1, 1]")
+        autovalori, autovettori = np.linalg.eigh(c)
+        if autovalori.min() < -1e-9:
+            raise ValueError("correlazione: la matrice non è semidefinita positiva")
+        try:
+            return np.linalg.cholesky(c)
+        except np.linalg.LinAlgError:
+            # Semidefinita (es. correlazione 1): fattore dalla scomposizione spettrale
+            return autovettori * np.sqrt(np.clip(autovalori, 0, None))
+
+
+def percorsi_prezzi(modello, n_percorsi, n_anni, seed=None):
+    """Fattori di prezzo delle utenze, forma ``(percorsi, anni, utenze)``, media 1."""
+    rng = np.random.default_rng(seed)
+    fattore = modello.cholesky()
+    volatilita = np.asarray(modello.volatilita, dtype=float)
+    persistenza = 1 - np.clip(modello.riversione, 0, 1)
+
+    shock = rng.standard_normal((n_percorsi, n_anni, len(UTENZE))) @ fattore.T * volatilita
+    deviazione = np.zeros((n_percorsi, len(UTENZE)))
+    varianza = np.zeros(len(UTENZE))
+    fattori = np.ones((n_percorsi, n_anni, len(UTENZE)))
+    for t in range(1, n_anni):
+        deviazione = persistenza * deviazione + shock[:, t]
+        varianza = persistenza ** 2 * varianza + volatilita ** 2
+        fattori[:, t] = np.exp(deviazione - varianza / 2)
+    return fattori
+
+
+@dataclass(frozen=True)
+class CostiARischio:
+    """Costi di struttura del piano sotto i percorsi di prezzo delle utenze."""
+
+    anni: np.ndarray
+    piano: np.ndarray  # (anni,) costi di struttura del piano
+    totale: np.ndarray  # (percorsi, anni)
+    utenze: np.ndarray  # (percorsi, anni, utenze)
+
+    @property
+    def n_percorsi(self):
+        return self.totale.shape[0]
+
+    def percentile(self, livello):
+        """Percentile ``livello`` (es. 0.95) dei costi per anno."""
+        return np.quantile(self.totale, livello, axis=0)
+
+    def cost_at_risk(self, livello):
+        """Scarto fra il percentile ``livello`` dei costi e il costo del piano."""
+        return self.percentile(livello) - self.piano
+
+    def sintesi(self, livello=0.95):
+        """Una riga per anno: costo del piano, media, percentile, CaR e media
+        dei costi oltre il percentile (expected shortfall)."""
+        soglia = self.percentile(livello)
+        oltre = self.totale >= soglia
+        code = (self.totale * oltre).sum(axis=0) / np.maximum(oltre.sum(axis=0), 1)
+        percentuale = f"{livello:.0%}"
+        return pd.DataFrame({
+            "Anno": self.anni,
+            "Costi struttura del piano (€)": self.piano,
+            "Utenze medie (€)": self.utenze.mean(axis=0).sum(axis=-1),
+            "Costi medi (€)": self.totale.mean(axis=0),
+            f"Percentile {percentuale} (€)": soglia,
+            f"Cost-at-risk {percentuale} (€)": soglia - self.piano,
+            f"Media oltre il {percentuale} (€)": code,
+        })
+
+
+def costi_a_rischio(piano, modello=ModelloUtenze(), n_percorsi=10_000, seed=None):
+    """Costi di struttura di un piano singolo per ``n_percorsi`` percorsi di prezzo."""
+    fattori = percorsi_prezzi(modello, n_percorsi, len(piano.anni), seed)
+    base = piano.costi_struttura[:, list(IDX_UTENZE)]  # (anni, utenze)
+    utenze = fattori * base
+    totale = piano.totale_struttura + (utenze - base).sum(axis=-1)
+    return CostiARischio(anni=piano.anni, piano=piano.totale_struttura,
+                         totale=totale, utenze=utenze)
@@ -1,235 +1,271 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 import numpy as np
 import io
+import sqlite3
+import time
 import streamlit.components.v1 as components
+from dataclasses import fields, replace
+from functools import wraps
+
+from piano import ORDINAMENTI, ParametriPiano, adatta_orizzonte, anno_break_even, calcola_piano
+from piano import profilo, prospetti, tabelle
+from piano.archivio import ArchivioScenari
+from piano.cache import CacheLRU, impronta
+from piano.cassa import MESI, PERIODI, VOCI_CASSA, Calendari, cassa_periodica, etichette_periodi
+from piano.confronto import SERIE, confronta
+from piano.finanziamenti import TIPI_PRESTITO
+from piano.indicizzazione import DRIVER, indici, percorsi_stocastici, tassi_centrali
+from piano.portafoglio import Campus, consolida
+from piano.motore import (
+    CACHE_STADI, ORIZZONTE_MASSIMO, PARAMETRI_SPAZI, parametri_canonici, squadrature
+)
+from piano.curricolo import MATERIE, docenti_equivalenti, matrice_curricolo, ore_lezione
+from piano.organico import ottimizza_organico
+from piano.griglia import Griglia, esplora
+from piano.obiettivi import ISCRIZIONI_MASSIME, fondo_minimo, iscrizioni_minime, retta_minima
+from piano.sensitivita import ETICHETTE, METRICHE, sobol, tornado
+from piano.simulazione import PERCENTILI, Incertezza, simula
+from piano.spazi import VOCI_SPAZI, fabbisogno_spazi
+from piano.utenze import UTENZE, ModelloUtenze, costi_a_rischio
 
 # Configurazione della pagina
 st.set_page_config(page_title="Business Plan Scuola Internazionale", layout="wide")
 st.title("Business Plan Scuola Internazionale")
 
-# --- Variabili di base ---
-years = [1, 2, 3, 4, 5]
-classes = ["Prima", "Seconda", "Terza", "Quarta", "Quinta"]
-default_new_first = [10, 12, 14, 16, 18]
+# ================= PROFILAZIONE (facoltativa) ================= #
+# Attivata dal pannello in fondo alla sidebar; il profilatore vive in
+# session_state e raccoglie i tempi delle ultime esecuzioni della sessione.
+if st.session_state.get("profilazione", False):
+    profilatore = st.session_state.get("profilatore")
+    con_cprofile = st.session_state.get("profilazione_cprofile", False)
+    if profilatore is None or (profilatore.cprofile is not None) != con_cprofile:
+        profilatore = st.session_state["profilatore"] = profilo.Profilatore(cprofile=con_cprofile)
+    profilo.avvia(profilatore, "Esecuzione completa")
+else:
+    profilo.termina()
+    st.session_state.pop("profilatore", None)
 
-# ================= SIDEBAR ================= #
-st.sidebar.header("🎓 Nuove classi prime")
-new_first_students = []
-for i, anno in enumerate(years):
-    val = st.sidebar.number_input(f"Anno {anno} - nuova prima", min_value=0, value=default_new_first[i], step=1)
-    new_first_students.append(val)
-
-st.sidebar.markdown("---")
-st.sidebar.header("💰 Retta annuale")
-retta_unica = st.sidebar.number_input(
-    "Retta annuale per studente (€)", 
-    min_value=0, value=10000, step=100,
-    help="La stessa retta sarà applicata a tutte le classi e a tutti gli anni."
-)
-
-st.sidebar.header("💰 Contributi")
-altri_contributi = st.sidebar.number_input(
-    "Contributi annuali (€)",
-    min_value=0, value=0, step=100,
-    help="Contributi aggiuntivi annuali."
-)
-
-# ================= CALCOLO STUDENTI PER CLASSE ================= #
-df_students = pd.DataFrame({"Anno": years})
-for c in classes:
-    df_students[c] = 0
-
-for i, anno in enumerate(years):
-    df_students.at[i, "Prima"] = new_first_students[i]
-    if i >= 1:
-        df_students.at[i, "Seconda"] = df_students.at[i-1, "Prima"]
-    if i >= 2:
-        df_students.at[i, "Terza"] = df_students.at[i-1, "Seconda"]
-    if i >= 3:
-        df_students.at[i, "Quarta"] = df_students.at[i-1, "Terza"]
-    if i >= 4:
-        df_students.at[i, "Quinta"] = df_students.at[i-1, "Quarta"]
+# --- Variabili di base ---
+default_params = ParametriPiano()
+
+# ================= STATO DEI PARAMETRI ================= #
+# Le schede sono "pigre" (viene eseguita solo quella aperta) e ogni scheda è un
+# fragment che si riesegue da solo quando si interagisce con i suoi widget.
+# I valori dei parametri vivono quindi in session_state, così restano validi
+# anche quando i widget della loro scheda non sono disegnati.
+if "parametri" not in st.session_state:
+    st.session_state["parametri"] = {
+        f.name: getattr(default_params, f.name) for f in fields(ParametriPiano)
+    }
+parametri = st.session_state["parametri"]
+
+
+def parametri_correnti():
+    """ParametriPiano con i valori correnti dei widget."""
+    return ParametriPiano(**{
+        nome: tuple(valore) if isinstance(valore, list) else valore
+        for nome, valore in parametri.items()
+    })
 
-df_students["Studenti totali"] = df_students[classes].sum(axis=1)
- 
 
+def piano_corrente():
+    """Piano calcolato sui parametri correnti (memoizzato dal motore)."""
+    return calcola_piano(parametri_correnti())
 
 
-# ============================= TABS ============================= #
-tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
-    "Ricavi preventivi",
-    "Costi preventivi del personale", 
-    "Costi preventivi di struttura", 
-    "Conto economico",
-    "Stato patrimoniale",
-    "Rendiconto finanziario",
-    "Indici di valutazione"
-])
+def ore_piano(piano):
+    """Ore settimanali di lezione per anno e materia del piano, dal curricolo corrente."""
+    return ore_lezione(
+        piano.studenti[None], np.atleast_1d(float(parametri["alunni_per_sezione"])),
+        matrice_curricolo(parametri["ore_curricolo"], len(piano.classi)),
+    )[0]
 
 
-# ================= CALCOLO RICAVI (Per Tab 1) ================= #
+@st.cache_resource
+def cache_figure():
+    """Figure Plotly condivise da tutte le sessioni del processo."""
+    return CacheLRU(max_voci=256, ttl=3600)
 
-results_ricavi = []
 
-for i, anno in enumerate(years):
-    ricavi_anno = {}
-    totale_anno = 0
-    
-    # Ricavo SOLO dalla retta
-    for c in classes:
-        studenti = df_students.at[i, c]
-        ricavo_classe = studenti * retta_unica
-        ricavi_anno[c] = ricavo_classe
-        totale_anno += ricavo_classe
-    
-    # ➕ aggiunta dei contributi unici annuali
-    totale_anno += altri_contributi
-    
-    results_ricavi.append({
-        "Anno": anno,
-        **ricavi_anno,
-        "Contributi (€)": altri_contributi,
-        "Totale ricavi (€)": totale_anno
-    })
+def figura(nome, costruisci):
+    """Figura ``nome`` del piano corrente, costruita una sola volta per ogni
+    insieme di parametri (le figure in cache non vanno modificate)."""
+    chiave = impronta(nome, parametri_canonici(parametri_correnti()))
+    return cache_figure().ottieni(chiave, costruisci)
 
-df_ricavi = pd.DataFrame(results_ricavi)
-
-
-# ================= CALCOLO COSTI STRUTTURA (Per Tab 3) ================= #
-# Variabili iniziali per struttura (definizione preliminare)
-default_areas = [200, 200, 500, 500, 500]
-superfici = default_areas
-
-# Definizione dei parametri per permetterne l'uso nei calcoli globali se necessario
-cost_manufab = 2.60
-cost_manimpi = 11.96
-cost_energia = 11.52
-cost_gas = 7.05
-cost_acqua = 3.78
-cost_pulizie = 38.43
-ammort_arredi = 10.0
-base_amm_att = 8.5
-incremento_amm_att = 8.5
-reception_first_two = 230.58
-reception_other = 184.46
-
-# --- Calcolo costi struttura ---
-results_costs = []
-for i, anno in enumerate(years):
-    # Usa il default inizialmente, sarà sovrascritto nella tab se l'utente interagisce
-    superficie = float(superfici[i])
-    amm_att_anno = base_amm_att + i * incremento_amm_att
-    reception_m2 = reception_first_two if anno <= 2 else reception_other
-
-    t_manufab = superficie * cost_manufab
-    t_manimpi = superficie * cost_manimpi
-    t_energia = superficie * cost_energia
-    t_gas = superficie * cost_gas
-    t_acqua = superficie * cost_acqua
-    t_pulizie = superficie * cost_pulizie
-    t_amm_arredi = superficie * ammort_arredi
-    t_amm_att = superficie * amm_att_anno
-    t_reception = superficie * reception_m2
-    
-    totale_struttura = sum([ 
-        t_manufab, t_manimpi, t_energia, t_gas, t_acqua, t_pulizie, 
-        t_amm_arredi, t_amm_att, t_reception 
-    ])
-    
-    results_costs.append({
-        "Anno": anno,
-        "Studenti totali": int(df_students.at[i, "Studenti totali"]),
-        "Superficie (m²)": superficie,
-        "Manutenzione fabbricati (€/anno)": t_manufab,
-        "Manutenzione impianti (€/anno)": t_manimpi,
-        "Energia elettrica (€/anno)": t_energia,
-        "Fornitura gas (€/anno)": t_gas,
-        "Acqua (€/anno)": t_acqua,
-        "Pulizie (€/anno)": t_pulizie,
-        "Ammortamenti arredi (€/anno)": t_amm_arredi,
-        "Ammort. attrezzature (€/anno)": t_amm_att,
-        "Reception / servizi (€/anno)": t_reception,
-        "Totale Costi Struttura (€/anno)": totale_struttura
-    })
-df_costs = pd.DataFrame(results_costs)
 
+# ================= ARCHIVIO DEGLI SCENARI ================= #
+# Widget che mostrano i parametri: al caricamento di uno scenario il loro stato
+# viene azzerato, così si ridisegnano con i valori caricati.
+WIDGET_PARAMETRI = {"n_anni", "ordinamento", "manual_override", "turnover", "turnover_per_anno",
+                    "turnover_permanenza", "turnover_ingressi", "prestiti",
+                    "prestiti_iniziali", "curricolo", "indicizzazione_per_anno"} | {
+    f.name for f in fields(ParametriPiano)
+}
+PREFISSI_WIDGET_PARAMETRI = ("prima_", "superficie_", "fondo_", "assunti_", "contr_")
 
-# ================= CALCOLO COSTI PERSONALE (Per Tab 2) ================= #
-# Variabili iniziali per personale (definizione preliminare)
-costo_docente_assunto = 40000
-costo_docente_contratto = 15000
-personale_direttivo = 60000
 
-docenti_assunti = []
-docenti_contratto = []
+@st.cache_resource
+def archivio():
+    """Archivio SQLite condiviso da tutte le sessioni."""
+    return ArchivioScenari()
 
-for i, anno in enumerate(years):
-    studenti = int(df_students.at[i, "Studenti totali"])
-
-    # 1) DOCENTI ASSUNTI (1 ogni 8 studenti)
-    n_assunti = studenti // 8
-
-    # Minimi strutturali anni iniziali (se vuoi mantenerli)
-    if anno == 1:
-        n_assunti = max(n_assunti, 2)
-        min_contratto = 1
-    elif anno == 2:
-        n_assunti = max(n_assunti, 3)
-        min_contratto = 2
-    else:
-        min_contratto = 1  # minimo base per anni successivi
 
-    # Studenti ancora scoperti
-    resto_studenti = studenti - n_assunti * 8
+def carica_scenario(id_scenario):
+    """Callback del pulsante "Carica": sostituisce i parametri della sessione.
 
-    # 2) DOCENTI A CONTRATTO
-    if resto_studenti > 0:
-        n_contratto = max(min_contratto, 1)
-    else:
-        n_contratto = min_contratto
+    Il piano salvato entra nella cache del motore, quindi non viene ricalcolato.
+    """
+    nome, params, _ = archivio().carica(id_scenario)
+    st.session_state["parametri"] = {f.name: getattr(params, f.name) for f in fields(params)}
+    for chiave in list(st.session_state):
+        if chiave in WIDGET_PARAMETRI or str(chiave).startswith(PREFISSI_WIDGET_PARAMETRI):
+            del st.session_state[chiave]
+    st.session_state["archivio_caricato"] = nome
 
-    docenti_assunti.append(n_assunti)
-    docenti_contratto.append(n_contratto)
 
+# ================= SIDEBAR ================= #
+st.sidebar.header("📅 Orizzonte del piano")
+n_anni = st.sidebar.number_input(
+    "Numero di anni",
+    min_value=1, max_value=ORIZZONTE_MASSIMO, value=len(parametri["new_first_students"]), step=1,
+    key="n_anni"
+)
+nomi_ordinamenti = list(ORDINAMENTI)
+ordinamento = st.sidebar.selectbox(
+    "Classi della scuola",
+    nomi_ordinamenti,
+    index=[tuple(c) for c in ORDINAMENTI.values()].index(tuple(parametri["classi"])),
+    key="ordinamento"
+)
 
-# --- Calcolo costi personale ---
-results_personale = []
-for i, anno in enumerate(years):
-    costo_assunti = docenti_assunti[i] * costo_docente_assunto
-    costo_contr = docenti_contratto[i] * costo_docente_contratto
-    totale_personale = costo_assunti + costo_contr + personale_direttivo
-    
-    results_personale.append({
-        "Anno": anno,
-        "Studenti totali": int(df_students.at[i, "Studenti totali"]),
-        "Docenti assunti": docenti_assunti[i],
-        "Costo annuo docenti assunti (€)": costo_assunti,
-        "Docenti a contratto": docenti_contratto[i],
-        "Costo docenti a contratto (€)": costo_contr,
-        "Personale direttivo (€)": personale_direttivo,
-        "Totale costi personale (€)": totale_personale
+# Le serie annuali seguono l'orizzonte scelto (ripetendo l'ultimo valore)
+if n_anni != len(parametri["new_first_students"]):
+    parametri.update({
+        f.name: getattr(adatta_orizzonte(parametri_correnti(), n_anni), f.name)
+        for f in fields(ParametriPiano)
     })
+    # La tabella dei tassi per anno si ridisegna con le nuove righe
+    st.session_state.pop("tassi_indicizzazione", None)
+if tuple(parametri["classi"]) != ORDINAMENTI[ordinamento]:
+    parametri["classi"] = ORDINAMENTI[ordinamento]
+    # I tassi di turnover e il curricolo sono definiti per classe: con altre
+    # classi si azzerano
+    parametri["ritenzione"] = None
+    parametri["ingressi"] = None
+    parametri["ore_curricolo"] = None
+    st.session_state.pop("curricolo", None)
+
+years = list(range(1, n_anni + 1))
+classes = list(parametri["classi"])
 
-df_personale = pd.DataFrame(results_personale)
-
-
+st.sidebar.markdown("---")
+st.sidebar.header("🎓 Nuove classi prime")
+new_first_students = []
+for i, anno in enumerate(years):
+    val = st.sidebar.number_input(
+        f"Anno {anno} - nuova prima", min_value=0,
+        value=int(parametri["new_first_students"][i]), step=1, key=f"prima_{anno}"
+    )
+    new_first_students.append(val)
 
-# ================= CALCOLO RIEPILOGO FINANZIARIO (Per Tab 4) ================= #
-df_summary = pd.DataFrame({
-    "Anno": years,
-    "Costi struttura (€)": df_costs["Totale Costi Struttura (€/anno)"],
-    "Costi personale (€)": df_personale["Totale costi personale (€)"],
-    "Ricavi (€)": df_ricavi["Totale ricavi (€)"]
-})
-df_summary["Costi totali (€)"] = (
-    df_summary["Costi struttura (€)"] + df_summary["Costi personale (€)"]
+st.sidebar.markdown("---")
+st.sidebar.header("💰 Retta annuale")
+retta_unica = st.sidebar.number_input(
+    "Retta annuale per studente (€)", 
+    min_value=0, value=int(parametri["retta_unica"]), step=100,
+    help="La stessa retta sarà applicata a tutte le classi e a tutti gli anni.",
+    key="retta_unica"
 )
-df_summary["Risultato netto (€)"] = (
-    df_summary["Ricavi (€)"] - df_summary["Costi totali (€)"]
+
+st.sidebar.header("💰 Contributi")
+altri_contributi = st.sidebar.number_input(
+    "Contributi annuali (€)",
+    min_value=0, value=int(parametri["altri_contributi"]), step=100,
+    help="Contributi aggiuntivi annuali.",
+    key="altri_contributi"
 )
 
+parametri["new_first_students"] = new_first_students
+parametri["retta_unica"] = retta_unica
+parametri["altri_contributi"] = altri_contributi
+
+
+def estrai_percorso_indicizzazione():
+    """Callback del pulsante: tassi per anno estratti attorno a quelli correnti."""
+    rng = np.random.default_rng()
+    tassi = percorsi_stocastici(
+        tassi_centrali(parametri_correnti()), st.session_state["volatilita_indicizzazione"] / 100,
+        1, n_anni, rng,
+    )[0]
+    parametri["tassi_indicizzazione"] = tassi.tolist()
+    st.session_state.pop("tassi_indicizzazione", None)
+
+
+st.sidebar.header("📈 Indicizzazione dei prezzi")
+with st.sidebar.expander("Crescita annua di rette, retribuzioni e costi", expanded=False):
+    st.caption("I valori inseriti sono quelli del primo anno; dal secondo crescono del tasso indicato.")
+    for driver, etichetta in DRIVER.items():
+        nome = f"inflazione_{driver}"
+        parametri[nome] = st.number_input(
+            f"{etichetta} (%/anno)", value=100 * float(parametri[nome]), step=0.1,
+            format="%.2f", key=nome
+        ) / 100
+    tassi = (
+        np.asarray(parametri["tassi_indicizzazione"], dtype=float)
+        if parametri["tassi_indicizzazione"] is not None
+        else np.tile([parametri[f"inflazione_{driver}"] for driver in DRIVER], (n_anni, 1))
+    )
+    if st.checkbox("Tassi diversi per anno", value=parametri["tassi_indicizzazione"] is not None,
+                   key="indicizzazione_per_anno"):
+        df_tassi = st.data_editor(
+            pd.DataFrame(100 * tassi, index=pd.Index(years, name="Anno"), columns=list(DRIVER.values())),
+            key="tassi_indicizzazione",
+            column_config={
+                etichetta: st.column_config.NumberColumn(format="%.2f", step=0.1)
+                for etichetta in DRIVER.values()
+            }
+        )
+        tassi = df_tassi.fillna(0).to_numpy() / 100
+        parametri["tassi_indicizzazione"] = tassi.tolist()
+        col_vol, col_estrai = st.columns(2)
+        col_vol.number_input("Volatilità (punti %)", min_value=0.0, value=1.0, step=0.1,
+                             key="volatilita_indicizzazione")
+        col_estrai.button("🎲 Percorso casuale", on_click=estrai_percorso_indicizzazione,
+                          help="Tassi per anno estratti attorno ai tassi fissi con la volatilità indicata.")
+    else:
+        parametri["tassi_indicizzazione"] = None
+        tassi = np.tile([parametri[f"inflazione_{driver}"] for driver in DRIVER], (n_anni, 1))
+    indici_finali = indici(tassi[None])[0, -1]
+    st.caption(f"Indici all'anno {n_anni}: " + ", ".join(
+        f"{etichetta.lower()} ×{valore:.2f}" for etichetta, valore in zip(DRIVER.values(), indici_finali)
+    ))
+profilo.traguardo("Sidebar e parametri")
+
+
+def profilata(nome):
+    """Misura i tempi di una scheda, anche quando si riesegue da sola come fragment."""
+    def decoratore(scheda):
+        @wraps(scheda)
+        def avvolta():
+            profilatore = st.session_state.get("profilatore")
+            if profilatore is None:
+                return scheda()
+            if profilo.corrente() is None:
+                # Riesecuzione del solo fragment: è un'esecuzione a sé
+                profilo.avvia(profilatore, f"Fragment {nome}")
+                try:
+                    return scheda()
+                finally:
+                    profilo.termina()
+            with profilo.misura(nome):
+                return scheda()
+        return avvolta
+    return decoratore
+
 
 # ================= FUNZIONE HELPER PER FORMATO EURO (Globale) ================= #
 def euro(x):
@@ -242,8 +278,11 @@ def euro(x):
     else:
         return f"€ {x:,.0f}".replace(",", ".")
 
+
 # ================= TAB 1: RICAVI ================= #
-with tab1:
+@st.fragment
+@profilata("Ricavi")
+def scheda_ricavi():
     st.subheader("Ricavi preventivi")
     st.markdown( 
         "### Variabili da definire:\n"
@@ -259,77 +298,218 @@ with tab1:
         " - 5x1000."
     )
 
+    # --- Turnover per classe ---
+    with st.expander("🔄 Turnover: permanenza e nuovi ingressi per classe", expanded=False):
+        st.markdown(
+            "Per ogni classe successiva alla prima: quota di studenti e studentesse della classe "
+            "precedente che prosegue (**permanenza**) e nuovi ingressi laterali (**nuovi ingressi**), "
+            "entrambi in percentuale della classe precedente dell'anno prima."
+        )
+        # Tassi per classe (classi,) o per anno e classe (anni, classi)
+        ritenzione = np.asarray(
+            parametri["ritenzione"] if parametri["ritenzione"] is not None else [1.0] * len(classes),
+            dtype=float,
+        )
+        ingressi = np.asarray(
+            parametri["ingressi"] if parametri["ingressi"] is not None else [0.0] * len(classes),
+            dtype=float,
+        )
+        if st.checkbox("Tassi diversi per anno",
+                       value=ritenzione.ndim == 2 or ingressi.ndim == 2, key="turnover_per_anno"):
+            matrici = {}
+            for nome, etichetta, tassi, predefinito, massimo in [
+                ("permanenza", "Permanenza (%)", ritenzione, 100, 100),
+                ("ingressi", "Nuovi ingressi (%)", ingressi, 0, None),
+            ]:
+                st.markdown(f"**{etichetta}**")
+                df_tassi = st.data_editor(
+                    pd.DataFrame(
+                        100 * np.broadcast_to(tassi, (n_anni, len(classes)))[:, 1:],
+                        index=pd.Index(years, name="Anno"), columns=classes[1:],
+                    ),
+                    key=f"turnover_{nome}",
+                    use_container_width=True,
+                    column_config={
+                        classe: st.column_config.NumberColumn(min_value=0, max_value=massimo, step=1)
+                        for classe in classes[1:]
+                    },
+                )
+                matrici[nome] = df_tassi.fillna(predefinito).to_numpy() / 100
+            parametri["ritenzione"] = np.column_stack(
+                [np.ones(n_anni), matrici["permanenza"]]
+            ).tolist()
+            parametri["ingressi"] = np.column_stack(
+                [np.zeros(n_anni), matrici["ingressi"]]
+            ).tolist()
+        else:
+            # Tassi per anno disattivati: si riparte da quelli del primo anno
+            ritenzione, ingressi = np.atleast_2d(ritenzione)[0], np.atleast_2d(ingressi)[0]
+            df_turnover = st.data_editor(
+                pd.DataFrame({
+                    "Classe": classes[1:],
+                    "Permanenza (%)": 100 * ritenzione[1:],
+                    "Nuovi ingressi (%)": 100 * ingressi[1:],
+                }),
+                key="turnover",
+                hide_index=True,
+                disabled=["Classe"],
+                use_container_width=True,
+                column_config={
+                    "Permanenza (%)": st.column_config.NumberColumn(min_value=0, max_value=100, step=1),
+                    "Nuovi ingressi (%)": st.column_config.NumberColumn(min_value=0, step=1),
+                }
+            )
+            parametri["ritenzione"] = [1.0] + (df_turnover["Permanenza (%)"].fillna(100) / 100).tolist()
+            parametri["ingressi"] = [0.0] + (df_turnover["Nuovi ingressi (%)"].fillna(0) / 100).tolist()
+
+        st.markdown("**Studenti per classe e anno**")
+        st.dataframe(tabelle.df_students(piano_corrente()), use_container_width=True)
+
+    df_ricavi = tabelle.df_ricavi(piano_corrente())
+
     # --- Tabella risultati ---
     st.subheader("Totale ricavi annuali")
     st.dataframe(df_ricavi, use_container_width=True)
+    profilo.traguardo("Tabelle")
 
      # --- Grafico ---
-    fig_ricavi = px.bar(
-        df_ricavi, 
-        x="Anno", 
-        y="Totale ricavi (€)",
-        text_auto=True  # opzionale: mostra il valore sopra le barre
-        )
+    def grafico_ricavi():
+        fig_ricavi = px.bar(
+            df_ricavi, 
+            x="Anno", 
+            y="Totale ricavi (€)",
+            text_auto=True  # opzionale: mostra il valore sopra le barre
+            )
 
 
-    fig_ricavi.update_layout(
-        title=dict(
-            text="Andamento dei ricavi totali negli anni", 
-            font=dict(size=20)
-        ),
-        yaxis=dict(
-            title=dict(text="Totale ricavi (€)", font=dict(size=18)),
-            tickprefix="€",
-            tickformat="..0f",  # separatore migliaia con punto
-            rangemode="tozero"
-        ),
-        xaxis=dict(
-            title=dict(text="Anno", font=dict(size=18)),
-            tickmode='linear',
-            dtick=1
-        ),
-        font=dict(size=14),
-        plot_bgcolor="white",
-        hovermode="x unified"
-    )
+        fig_ricavi.update_layout(
+            title=dict(
+                text="Andamento dei ricavi totali negli anni", 
+                font=dict(size=20)
+            ),
+            yaxis=dict(
+                title=dict(text="Totale ricavi (€)", font=dict(size=18)),
+                tickprefix="€",
+                tickformat="..0f",  # separatore migliaia con punto
+                rangemode="tozero"
+            ),
+            xaxis=dict(
+                title=dict(text="Anno", font=dict(size=18)),
+                tickmode='linear',
+                dtick=1
+            ),
+            font=dict(size=14),
+            plot_bgcolor="white",
+            hovermode="x unified"
+        )
+        return fig_ricavi
 
     # --- Mostra grafico ---
-    st.plotly_chart(fig_ricavi, use_container_width=True)
+    st.plotly_chart(figura("ricavi", grafico_ricavi), use_container_width=True)
+    profilo.traguardo("Grafico ricavi")
 
 
 # ================= TAB 2: COSTI PERSONALE ================= #
-with tab2:
+@st.fragment
+@profilata("Personale")
+def scheda_personale():
     st.subheader("Costi preventivi del personale")
     
     # Parametri
-    costo_docente_assunto = st.number_input("Costo annuo docente assunto (€)", value=40000)
-    costo_docente_contratto = st.number_input("Costo annuo docente a contratto (€)", value=15000)
-    personale_direttivo = st.number_input("Costo annuo personale direttivo (€)", value=60000)
+    for nome, etichetta in [
+        ("costo_docente_assunto", "Costo annuo docente assunto (€)"),
+        ("costo_docente_contratto", "Costo annuo docente a contratto (€)"),
+        ("personale_direttivo", "Costo annuo personale direttivo (€)"),
+    ]:
+        parametri[nome] = st.number_input(etichetta, value=parametri[nome], key=nome)
 
     st.markdown("---")
     st.subheader("Numero di docenti per anno (automatico in base al numero di studenti)")
 
     # Checkbox per override manuale
-    manual_override = st.checkbox("Modifica manualmente il numero di docenti", value=False)
+    manual_override = st.checkbox(
+        "Modifica manualmente il numero di docenti",
+        value=parametri["docenti_assunti"] is not None,
+        key="manual_override"
+    )
 
-    docenti_assunti = []
-    docenti_contratto = []
+    parametri["organico_ottimizzato"] = st.radio(
+        "Calcolo automatico",
+        [0, 1],
+        format_func=["Un docente assunto ogni N studenti",
+                     "Organico ottimizzato sulle ore di lezione"].__getitem__,
+        index=int(parametri["organico_ottimizzato"]),
+        horizontal=True,
+        key="organico_ottimizzato"
+    )
 
-    for i, anno in enumerate(years):
-        studenti = int(df_students.at[i, "Studenti totali"])
+    if parametri["organico_ottimizzato"]:
+        st.markdown(
+            "Docenti di costo minimo che coprono le ore settimanali di ogni materia in tutte "
+            "le sezioni: ogni docente insegna una materia, il personale direttivo insegna "
+            "le sue ore dove fanno risparmiare di più."
+        )
+    # Sezioni e ore settimanali: servono all'organico ottimizzato e al calcolo dei
+    # docenti equivalenti dal curricolo (in fondo alla scheda)
+    col1, col2, col3, col4 = st.columns(4)
+    for col, nome, etichetta in [
+        (col1, "alunni_per_sezione", "Alunni massimi per sezione"),
+        (col2, "ore_cattedra", "Ore settimanali docente assunto"),
+        (col3, "ore_contratto", "Ore settimanali docente a contratto"),
+        (col4, "ore_direttivo", "Ore settimanali del direttivo"),
+    ]:
+        parametri[nome] = col.number_input(
+            etichetta, min_value=0 if nome == "ore_direttivo" else 1,
+            value=int(parametri[nome]), step=1, key=nome
+        )
+    if not parametri["organico_ottimizzato"]:
+        parametri["studenti_per_docente"] = st.number_input(
+            "Studenti per docente assunto (calcolo automatico)",
+            min_value=1,
+            value=int(parametri["studenti_per_docente"]),
+            step=1,
+            key="studenti_per_docente"
+        )
 
-        # Logica automatica
-        n_assunti = studenti // 8
-        if anno == 1: n_assunti = max(n_assunti, 2)
-        if anno == 2: n_assunti = max(n_assunti, 3)
+    # Numero automatico di docenti (regola o organico ottimizzato), senza modifiche manuali
+    piano_automatico = calcola_piano(
+        replace(parametri_correnti(), docenti_assunti=None, docenti_contratto=None)
+    )
+    assunti_auto = piano_automatico.docenti_assunti
+    contratto_auto = piano_automatico.docenti_contratto
+
+    if parametri["organico_ottimizzato"]:
+        with st.expander("📚 Organico per materia", expanded=False):
+            anno_organico = st.selectbox("Anno", years, index=len(years) - 1, key="organico_anno")
+            organico = ottimizza_organico(
+                ore_piano(piano_automatico),
+                parametri["ore_cattedra"], parametri["ore_contratto"], parametri["ore_direttivo"],
+                parametri["costo_docente_assunto"], parametri["costo_docente_contratto"],
+            )
+            i = anno_organico - 1
+            st.dataframe(
+                pd.DataFrame({
+                    "Materia": organico.materie,
+                    "Ore settimanali": organico.ore[i],
+                    "Ore del direttivo": organico.ore_direttivo[i],
+                    "Docenti assunti": organico.assunti[i],
+                    "Docenti a contratto": organico.contratto[i],
+                    "Costo (€)": organico.costo[i].round(0),
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+    assunti_salvati = (parametri["docenti_assunti"]
+                       if parametri["docenti_assunti"] is not None else assunti_auto)
+    contratto_salvati = (parametri["docenti_contratto"]
+                         if parametri["docenti_contratto"] is not None else contratto_auto)
 
-        resto_studenti = studenti - n_assunti * 8
+    docenti_assunti = []
+    docenti_contratto = []
 
-        # Docenti a contratto
-        if anno in [1, 2]:
-            n_contr = 2 + (1 if resto_studenti > 0 else 0)
-        else:
-            n_contr = 2 + (1 if resto_studenti > 0 else 0)
+    for i, anno in enumerate(years):
+        n_assunti = int(assunti_auto[i])
+        n_contr = int(contratto_auto[i])
 
         # Keys separate per number_input
         key_assunti = f"assunti_{anno}_manual"
@@ -339,14 +519,14 @@ with tab2:
             val_assunti = st.number_input(
                 f"Anno {anno} - Docenti assunti",
                 min_value=0,
-                value=n_assunti,
+                value=int(assunti_salvati[i]),
                 step=1,
                 key=key_assunti
             )
             val_contr = st.number_input(
                 f"Anno {anno} - Docenti a contratto",
                 min_value=0,
-                value=n_contr,
+                value=int(contratto_salvati[i]),
                 step=1,
                 key=key_contr
             )
@@ -358,31 +538,69 @@ with tab2:
         docenti_assunti.append(val_assunti)
         docenti_contratto.append(val_contr)
 
-    # Calcolo costi personale
-    results_personale = []
-    for i, anno in enumerate(years):
-        costo_assunti = docenti_assunti[i] * costo_docente_assunto
-        costo_contr = docenti_contratto[i] * costo_docente_contratto
-        totale_personale = costo_assunti + costo_contr + personale_direttivo
-        
-        results_personale.append({
-            "Anno": anno,
-            "Studenti totali": int(df_students.at[i, "Studenti totali"]),
-            "Docenti assunti": docenti_assunti[i],
-            "Costo annuo docenti assunti (€)": costo_assunti,
-            "Docenti a contratto": docenti_contratto[i],
-            "Costo docenti a contratto (€)": costo_contr,
-            "Personale direttivo (€)": personale_direttivo,
-            "Totale costi personale (€)": totale_personale
-        })
+    parametri["docenti_assunti"] = docenti_assunti if manual_override else None
+    parametri["docenti_contratto"] = docenti_contratto if manual_override else None
+
+    piano = piano_corrente()
+
+    # --- Curricolo e docenti equivalenti ---
+    with st.expander("📖 Curricolo: ore settimanali per classe e materia", expanded=False):
+        curricolo = matrice_curricolo(parametri["ore_curricolo"], len(classes))
+        df_curricolo = st.data_editor(
+            pd.DataFrame(curricolo, index=pd.Index(classes, name="Classe"), columns=list(MATERIE)),
+            key="curricolo",
+            use_container_width=True,
+            column_config={
+                materia: st.column_config.NumberColumn(min_value=0, step=1) for materia in MATERIE
+            }
+        )
+        curricolo_modificato = df_curricolo.fillna(0).to_numpy(dtype=float)
+        parametri["ore_curricolo"] = (
+            None if np.array_equal(curricolo_modificato, matrice_curricolo(None, len(classes)))
+            else curricolo_modificato.tolist()
+        )
 
-    df_personale = pd.DataFrame(results_personale)
-    st.dataframe(df_personale, use_container_width=True)
+        ore = ore_piano(piano)
+        ore_totali = ore.sum(axis=-1)
+        ore_coperte = (
+            piano.docenti_assunti * parametri["ore_cattedra"]
+            + piano.docenti_contratto * parametri["ore_contratto"]
+            + parametri["ore_direttivo"]
+        )
+        st.markdown("**Ore di lezione e docenti equivalenti a tempo pieno (FTE) per anno**")
+        st.dataframe(
+            pd.DataFrame({
+                "Anno": years,
+                "Ore settimanali": ore_totali,
+                "FTE richiesti": docenti_equivalenti(ore_totali, parametri["ore_cattedra"]).round(1),
+                "Docenti assunti": piano.docenti_assunti,
+                "Docenti a contratto": piano.docenti_contratto,
+                "FTE disponibili": docenti_equivalenti(
+                    ore_coperte, parametri["ore_cattedra"]
+                ).round(1),
+                "Copertura ore (%)": np.where(
+                    ore_totali > 0, 100 * ore_coperte / np.maximum(ore_totali, 1), 100
+                ).round(0),
+            }),
+            use_container_width=True,
+            hide_index=True
+        )
+        st.markdown("**FTE richiesti per materia**")
+        st.dataframe(
+            pd.DataFrame(
+                docenti_equivalenti(ore, parametri["ore_cattedra"]).round(1),
+                index=pd.Index(years, name="Anno"), columns=list(MATERIE),
+            ),
+            use_container_width=True
+        )
 
+    st.dataframe(tabelle.df_personale(piano), use_container_width=True)
 
 
 # ================= TAB 3: COSTI STRUTTURA FISICA ================= #
-with tab3:
+@st.fragment
+@profilata("Struttura")
+def scheda_struttura():
     st.subheader("Costi preventivi di struttura")
     st.markdown( 
         "### Variabili da definire:\n"
@@ -411,170 +629,251 @@ with tab3:
         "- 2 blocchi WC x 20 mq = 40 mq\n"
         "- altre superfici = 200 mq (hall, reception, disimpegni, locali tecnici, ecc.)\n"
         "- **Totale: circa 500 mq**\n\n"
-        "_La superficie è modificabile nel box sotto. Tutti i costi sono calcolati in base alla superficie specificata per ciascun anno._"
+        "_La superficie è modificabile nel box sotto, oppure si ricava dal piano degli spazi. "
+        "Tutti i costi sono calcolati in base alla superficie di ciascun anno._"
     )
 
 
     # --- Superficie totale per anno ---
-    st.subheader("Superficie totale per anno (m², modificabile)")
-    
-    superfici = []
-    for i, anno in enumerate(years):
-        superficie = st.number_input(
-            f"Anno {anno} - superficie totale (m²)", 
-            min_value=50, 
-            value=default_areas[i], 
-            step=1,
-            key=f"superficie_{anno}"
+    st.subheader("Superficie totale per anno (m²)")
+    parametri["spazi_automatici"] = st.radio(
+        "Superfici",
+        [0, 1],
+        format_func=lambda v: "Dal piano degli spazi" if v else "Indicate per anno",
+        index=int(parametri["spazi_automatici"]),
+        horizontal=True,
+        key="spazi_automatici"
+    )
+    parametri["costo_ampliamento"] = st.number_input(
+        "Costo di ogni ampliamento della sede (€: trasloco, allestimento, nuovo contratto)",
+        min_value=0.0, value=float(parametri["costo_ampliamento"]), step=1000.0,
+        key="costo_ampliamento"
+    )
+
+    if parametri["spazi_automatici"]:
+        st.markdown(
+            "Aule, uffici e blocchi WC necessari ogni anno dagli studenti per classe "
+            "(un'aula per sezione); la sede cresce a moduli in locazione e non si riduce. "
+            "Gli ampliamenti vengono anticipati quando il loro costo supera quello degli "
+            "spazi inutilizzati nel frattempo."
+        )
+        col1, col2, col3, col4 = st.columns(4)
+        for col, nome, etichetta, passo in [
+            (col1, "mq_aula", "m² per aula", 1),
+            (col2, "mq_ufficio", "m² per ufficio", 1),
+            (col3, "mq_wc", "m² per blocco WC", 1),
+            (col4, "modulo_superficie", "Modulo in locazione (m²)", 10),
+            (col1, "studenti_per_ufficio", "Studenti per ufficio aggiuntivo", 1),
+            (col2, "studenti_per_wc", "Studenti per blocco WC", 1),
+            (col3, "alunni_per_sezione", "Alunni massimi per sezione", 1),
+        ]:
+            parametri[nome] = col.number_input(
+                etichetta, min_value=1, value=int(parametri[nome]), step=passo, key=nome
+            )
+        parametri["quota_altre"] = col4.number_input(
+            "Altre superfici (% di aule, uffici e WC)", min_value=0.0,
+            value=float(parametri["quota_altre"]) * 100, step=5.0, key="quota_altre"
+        ) / 100
+
+        piano = piano_corrente()
+        spazi = fabbisogno_spazi(
+            piano.studenti[None], np.atleast_1d(float(parametri["alunni_per_sezione"])),
+            {nome: np.atleast_1d(float(parametri[nome])) for nome in PARAMETRI_SPAZI},
         )
-        superfici.append(superficie)
+        df_spazi = pd.DataFrame({"Anno": years})
+        for voce, etichetta in VOCI_SPAZI.items():
+            df_spazi[etichetta] = spazi[voce][0].round(0)
+        df_spazi["Superficie in locazione (m²)"] = piano.superfici
+        df_spazi["Ampliamento (€)"] = piano.costi_struttura[:, -1]
+        st.dataframe(df_spazi, use_container_width=True, hide_index=True)
+    else:
+        superfici = []
+        for i, anno in enumerate(years):
+            superficie = st.number_input(
+                f"Anno {anno} - superficie totale (m²)", 
+                min_value=50, 
+                value=int(parametri["superfici"][i]), 
+                step=1,
+                key=f"superficie_{anno}"
+            )
+            superfici.append(superficie)
+        parametri["superfici"] = superfici
 
     # --- Parametri costi struttura ---
     with st.expander("⚙️ Parametri costi struttura (€/m²/anno)", expanded=False):
-        cost_manufab = st.number_input("Manutenzione fabbricati", value=2.60)
-        cost_manimpi = st.number_input("Manutenzione impianti", value=11.96)
-        cost_energia = st.number_input("Energia elettrica", value=11.52)
-        cost_gas = st.number_input("Fornitura gas", value=7.05)
-        cost_acqua = st.number_input("Acqua", value=3.78)
-        cost_pulizie = st.number_input("Pulizie", value=38.43)
-        ammort_arredi = st.number_input("Ammortamenti arredi", value=10.0)
-        base_amm_att = st.number_input("Ammort. attrezzature primo anno", value=8.5)
-        incremento_amm_att = st.number_input("Incremento annuo amm. attrezzature", value=8.5)
-        reception_first_two = st.number_input("Reception / servizi primi 2 anni", value=230.58)
-        reception_other = st.number_input("Reception / servizi anni 3-5", value=184.46)
-
-    # --- Ricalcolo costi struttura con i nuovi parametri ---
-    results_costs = []
-    for i, anno in enumerate(years):
-        superficie = float(superfici[i])
-        amm_att_anno = base_amm_att + i * incremento_amm_att
-        reception_m2 = reception_first_two if anno <= 2 else reception_other
-
-        t_manufab = superficie * cost_manufab
-        t_manimpi = superficie * cost_manimpi
-        t_energia = superficie * cost_energia
-        t_gas = superficie * cost_gas
-        t_acqua = superficie * cost_acqua
-        t_pulizie = superficie * cost_pulizie
-        t_amm_arredi = superficie * ammort_arredi
-        t_amm_att = superficie * amm_att_anno
-        t_reception = superficie * reception_m2
-        
-        totale_struttura = sum([ 
-            t_manufab, t_manimpi, t_energia, t_gas, t_acqua, t_pulizie, 
-            t_amm_arredi, t_amm_att, t_reception 
-        ])
-        
-        results_costs.append({
-            "Anno": anno,
-            "Studenti totali": int(df_students.at[i, "Studenti totali"]),
-            "Superficie (m²)": superficie,
-            "Manutenzione fabbricati (€/anno)": t_manufab,
-            "Manutenzione impianti (€/anno)": t_manimpi,
-            "Energia elettrica (€/anno)": t_energia,
-            "Fornitura gas (€/anno)": t_gas,
-            "Acqua (€/anno)": t_acqua,
-            "Pulizie (€/anno)": t_pulizie,
-            "Ammortamenti arredi (€/anno)": t_amm_arredi,
-            "Ammort. attrezzature (€/anno)": t_amm_att,
-            "Reception / servizi (€/anno)": t_reception,
-            "Totale Costi Struttura (€/anno)": totale_struttura
-        })
-    df_costs = pd.DataFrame(results_costs)
+        for nome, etichetta in [
+            ("cost_manufab", "Manutenzione fabbricati"),
+            ("cost_manimpi", "Manutenzione impianti"),
+            ("cost_energia", "Energia elettrica"),
+            ("cost_gas", "Fornitura gas"),
+            ("cost_acqua", "Acqua"),
+            ("cost_pulizie", "Pulizie"),
+            ("ammort_arredi", "Ammortamenti arredi"),
+            ("base_amm_att", "Ammort. attrezzature primo anno"),
+            ("incremento_amm_att", "Incremento annuo amm. attrezzature"),
+            ("reception_first_two", "Reception / servizi primi 2 anni"),
+            ("reception_other", "Reception / servizi dal terzo anno"),
+        ]:
+            parametri[nome] = st.number_input(etichetta, value=float(parametri[nome]), key=nome)
+
+    df_costs = tabelle.df_costs(piano_corrente())
 
     st.subheader("🏢 Dettaglio costi struttura per anno")
     st.dataframe(df_costs, use_container_width=True)
     
     
-    fig = px.bar(
-    df_costs,
-    x="Anno",
-    y="Totale Costi Struttura (€/anno)",
-    text_auto=True  # opzionale: mostra il valore sopra le barre
-    )
+    def grafico_costi():
+        fig = px.bar(
+        df_costs,
+        x="Anno",
+        y="Totale Costi Struttura (€/anno)",
+        text_auto=True  # opzionale: mostra il valore sopra le barre
+        )
 
-    fig.update_layout(
-        yaxis_title="€",
-        yaxis_tickprefix="€",
-        yaxis_tickformat="."
-    )
+        fig.update_layout(
+            yaxis_title="€",
+            yaxis_tickprefix="€",
+            yaxis_tickformat="."
+        )
 
-    # 👉 Forza asse Y a partire da 0
-    fig.update_yaxes(rangemode="tozero")
+        # 👉 Forza asse Y a partire da 0
+        fig.update_yaxes(rangemode="tozero")
 
-    # 👉 Asse X solo valori interi
-    fig.update_xaxes(tickmode="linear", dtick=1)
+        # 👉 Asse X solo valori interi
+        fig.update_xaxes(tickmode="linear", dtick=1)
+        return fig
 
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(figura("costi_struttura", grafico_costi), use_container_width=True)
+    profilo.traguardo("Grafico costi")
 
+    # --- Rischio prezzi delle utenze ---
+    with st.expander("⚡ Rischio prezzi delle utenze (cost-at-risk)", expanded=False):
+        st.markdown(
+            "I prezzi di energia elettrica, gas e acqua seguono percorsi casuali correlati "
+            "attorno a quelli del piano e tendono a tornarvi (riversione verso la media). "
+            "Il **cost-at-risk** di un anno è di quanto i costi di struttura possono superare "
+            "quelli del piano al livello di confidenza scelto."
+        )
+        col_vol = st.columns(len(UTENZE) + 1)
+        volatilita = tuple(
+            col.number_input(f"Volatilità {etichetta} (%/anno)", min_value=0.0, max_value=200.0,
+                             value=100 * v, step=1.0, key=f"car_volatilita_{nome}") / 100
+            for col, (nome, etichetta), v in zip(col_vol, UTENZE.items(), ModelloUtenze.volatilita)
+        )
+        riversione = col_vol[-1].number_input(
+            "Riversione annua (%)", min_value=0.0, max_value=100.0,
+            value=100 * ModelloUtenze.riversione, step=5.0, key="car_riversione",
+            help="Quota dello scostamento dal prezzo del piano riassorbita ogni anno."
+        ) / 100
+
+        st.markdown("**Correlazione fra le utenze**")
+        df_correlazione = st.data_editor(
+            pd.DataFrame(ModelloUtenze.correlazione, index=list(UTENZE.values()),
+                         columns=list(UTENZE.values())),
+            key="car_correlazione",
+            use_container_width=True,
+            column_config={
+                etichetta: st.column_config.NumberColumn(min_value=-1.0, max_value=1.0, step=0.05)
+                for etichetta in UTENZE.values()
+            }
+        )
 
+        col_n, col_livello, col_seed = st.columns(3)
+        n_percorsi = col_n.number_input("Numero di percorsi", min_value=100, max_value=200_000,
+                                        value=10_000, step=1000, key="car_percorsi")
+        livello = col_livello.selectbox("Livello di confidenza", [0.90, 0.95, 0.99], index=1,
+                                        format_func=lambda v: f"{v:.0%}", key="car_livello")
+        seed = col_seed.number_input("Seme casuale", min_value=0, value=42, step=1, key="car_seed")
+
+        modello = ModelloUtenze(
+            volatilita=volatilita,
+            riversione=riversione,
+            correlazione=tuple(map(tuple, df_correlazione.fillna(0).to_numpy().tolist())),
+        )
+        try:
+            rischio = costi_a_rischio(piano_corrente(), modello, int(n_percorsi), int(seed))
+        except ValueError as e:
+            st.error(f"Parametri non validi: {e}")
+        else:
+            df_rischio = rischio.sintesi(livello)
+            st.dataframe(df_rischio.round(0), use_container_width=True, hide_index=True)
+
+            basso, mediana, alto = np.quantile(rischio.totale, [0.05, 0.5, livello], axis=0)
+            fig_rischio = go.Figure()
+            fig_rischio.add_trace(go.Scatter(
+                x=years, y=alto, mode="lines", line=dict(width=0),
+                showlegend=False, hoverinfo="skip"
+            ))
+            fig_rischio.add_trace(go.Scatter(
+                x=years, y=basso, mode="lines", line=dict(width=0), fill="tonexty",
+                fillcolor="rgba(214, 39, 40, 0.2)", name=f"5° - {livello:.0%} percentile"
+            ))
+            fig_rischio.add_trace(go.Scatter(
+                x=years, y=mediana, mode="lines", line=dict(color="rgb(214, 39, 40)"),
+                name="Mediana"
+            ))
+            fig_rischio.add_trace(go.Scatter(
+                x=years, y=rischio.piano, mode="lines+markers",
+                line=dict(color="black", dash="dash"), name="Piano"
+            ))
+            fig_rischio.update_layout(
+                title="Costi di struttura con prezzi delle utenze incerti",
+                yaxis_title="€", yaxis_tickprefix="€", hovermode="x unified"
+            )
+            fig_rischio.update_xaxes(tickmode="linear", dtick=1)
+            st.plotly_chart(fig_rischio, use_container_width=True)
+        profilo.traguardo("Cost-at-risk utenze")
 
 
 # ================= TAB 7: INDICI DI VALUTAZIONE ================= #
-with tab7:
-    st.subheader("Indici di valutazione")
+@st.fragment
+@profilata("Indici")
+def scheda_indici():
+    piano = piano_corrente()
+    df_summary = tabelle.df_summary(piano)
 
-    # ================= RIEPILOGO DATI ================= #
-    df_summary = pd.DataFrame({
-        "Anno": years,
-        "Ricavi (€)": df_ricavi["Totale ricavi (€)"],
-        "Costi struttura (€)": df_costs["Totale Costi Struttura (€/anno)"],
-        "Costi personale (€)": df_personale["Totale costi personale (€)"]
-    })
-
-    # Calcolo costi totali
-    df_summary["Costi totali (€)"] = (
-        df_summary["Costi struttura (€)"] +
-        df_summary["Costi personale (€)"]
-    )
-
-    # Calcolo risultato netto (EBIT)
-    df_summary["Risultato netto (€)"] = (
-        df_summary["Ricavi (€)"] -
-        df_summary["Costi totali (€)"]
-    )
+    st.subheader("Indici di valutazione")
 
     # ================= BREAK EVEN ================= #
-    breakeven_year = None
-    for _, row in df_summary.iterrows():
-        if row["Ricavi (€)"] >= row["Costi totali (€)"]:
-            breakeven_year = int(row["Anno"])
-            break
+    breakeven_year = int(anno_break_even(piano))
 
     if breakeven_year:
         st.metric("Break-even raggiunto nell'anno", breakeven_year)
     else:
-        st.info("Break-even non raggiunto nei 5 anni considerati.")
+        st.info(f"Break-even non raggiunto nei {len(years)} anni considerati.")
 
     # ================= GRAFICO RICAVI VS COSTI ================= #
     st.subheader("Andamento Ricavi vs Costi")
 
-    fig_summary = px.line(
-        df_summary,
-        x="Anno",
-        y=["Ricavi (€)", "Costi totali (€)"],
-        markers=True,
-        color_discrete_map={
-            "Ricavi (€)": "green",
-            "Costi totali (€)": "red"
-        },
-        labels={
-            "value": "€",
-            "variable": ""
-        }
-    )
+    def grafico_ricavi_costi():
+        fig_summary = px.line(
+            df_summary,
+            x="Anno",
+            y=["Ricavi (€)", "Costi totali (€)"],
+            markers=True,
+            color_discrete_map={
+                "Ricavi (€)": "green",
+                "Costi totali (€)": "red"
+            },
+            labels={
+                "value": "€",
+                "variable": ""
+            }
+        )
 
-    fig_summary.update_layout(
-        yaxis_title="€",
-        yaxis_tickprefix="€",
-        yaxis_tickformat=",",
-        legend_title_text=""
-    )
+        fig_summary.update_layout(
+            yaxis_title="€",
+            yaxis_tickprefix="€",
+            yaxis_tickformat=",",
+            legend_title_text=""
+        )
 
-    fig_summary.update_yaxes(rangemode="tozero")
-    fig_summary.update_xaxes(tickmode="linear", dtick=1)
+        fig_summary.update_yaxes(rangemode="tozero")
+        fig_summary.update_xaxes(tickmode="linear", dtick=1)
+        return fig_summary
 
-    st.plotly_chart(fig_summary, use_container_width=True)
+    st.plotly_chart(figura("ricavi_costi", grafico_ricavi_costi), use_container_width=True)
+    profilo.traguardo("Grafico ricavi vs costi")
 
     # ================= TABELLA DETTAGLIO ================= #
     st.subheader("Dettaglio costi e ricavi per anno")
@@ -583,225 +882,444 @@ with tab7:
     # ================= GRAFICO EBIT ================= #
     st.subheader("EBIT per anno (Ricavi - Costi)")
 
-    df_summary["Segno"] = df_summary["Risultato netto (€)"].apply(
-        lambda x: "Positivo" if x >= 0 else "Negativo"
+    def grafico_risultato():
+        df_risultato = df_summary.assign(Segno=df_summary["Risultato netto (€)"].apply(
+            lambda x: "Positivo" if x >= 0 else "Negativo"
+        ))
+
+        fig_risultato = px.bar(
+            df_risultato,
+            x="Anno",
+            y="Risultato netto (€)",
+            color="Segno",
+            color_discrete_map={
+                "Positivo": "green",
+                "Negativo": "red"
+            },
+            text="Risultato netto (€)"
+        )
+
+        fig_risultato.update_layout(
+            yaxis_title="€",
+            yaxis_tickprefix="€",
+            yaxis_tickformat=",",
+            showlegend=False
+        )
+
+        fig_risultato.update_yaxes(rangemode="tozero")
+        return fig_risultato
+
+    st.plotly_chart(figura("risultato", grafico_risultato), use_container_width=True)
+    profilo.traguardo("Tabella e grafico EBIT")
+
+    # ================= RICERCA OBIETTIVO ================= #
+    st.markdown("---")
+    st.subheader("Ricerca obiettivo")
+    st.markdown(
+        "Valori minimi calcolati direttamente dal modello, a parità di tutti gli altri parametri."
     )
 
-    fig_risultato = px.bar(
-        df_summary,
-        x="Anno",
-        y="Risultato netto (€)",
-        color="Segno",
-        color_discrete_map={
-            "Positivo": "green",
-            "Negativo": "red"
-        },
-        text="Risultato netto (€)"
+    anno_obiettivo = st.number_input(
+        "Break-even entro l'anno", min_value=1, max_value=len(years), value=len(years), step=1,
+        key="anno_obiettivo"
     )
+    params = parametri_correnti()
 
-    fig_risultato.update_layout(
-        yaxis_title="€",
-        yaxis_tickprefix="€",
-        yaxis_tickformat=",",
-        showlegend=False
+    col_retta, col_prime = st.columns(2)
+    retta_min = float(retta_minima(params, anno_obiettivo))
+    if np.isfinite(retta_min):
+        col_retta.metric("Retta minima", euro(np.ceil(retta_min)))
+    else:
+        col_retta.info("Nessuna retta è sufficiente senza studenti iscritti.")
+
+    prime_min = iscrizioni_minime(params, anno_obiettivo)
+    if prime_min is not None:
+        col_prime.metric("Nuove prime minime (costanti ogni anno)", prime_min)
+    else:
+        col_prime.info(f"Break-even non raggiungibile con meno di {ISCRIZIONI_MASSIME} nuove prime annue.")
+
+    st.markdown("**Conferimenti minimi al fondo di dotazione** (liquidità mai negativa)")
+    fondo_min = fondo_minimo(params)
+    st.dataframe(
+        pd.DataFrame({
+            "Anno": years,
+            "Fondo attuale (€)": parametri["fondo_progressivo"],
+            "Fondo minimo (€)": np.ceil(fondo_min).astype(int),
+        }),
+        use_container_width=True,
+        hide_index=True
+    )
+
+    profilo.traguardo("Ricerca obiettivo")
+
+    # ================= SIMULAZIONE MONTE CARLO ================= #
+    st.markdown("---")
+    st.subheader("Simulazione Monte Carlo")
+    st.markdown(
+        "Le nuove classi prime, la retta, i costi di struttura al m² e, se richiesto, "
+        "i tassi di indicizzazione vengono estratti casualmente attorno ai valori inseriti, per stimare la distribuzione della "
+        "liquidità e dell'anno di break-even."
     )
 
-    fig_risultato.update_yaxes(rangemode="tozero")
+    if st.checkbox("Attiva simulazione", value=False, key="mc_attiva"):
+        col_n, col_seed = st.columns(2)
+        n_scenari = col_n.number_input(
+            "Numero di scenari", min_value=100, max_value=1_000_000, value=10_000, step=1000
+        )
+        seed = col_seed.number_input("Seme casuale", min_value=0, value=42, step=1)
+
+        col_stud, col_retta, col_costi, col_infl = st.columns(4)
+        var_studenti = col_stud.slider("Variabilità nuove prime (%)", 0, 50, 15)
+        var_retta = col_retta.slider("Variabilità retta (%)", 0, 50, 5)
+        var_costi = col_costi.slider("Variabilità costi al m² (%)", 0, 50, 10)
+        vol_inflazione = col_infl.slider(
+            "Volatilità indicizzazione (punti %)", 0.0, 5.0, 0.0, step=0.1,
+            help="Deviazione standard dei tassi annui di crescita di rette, retribuzioni e costi."
+        )
+
+        incertezza = Incertezza(
+            variazione_studenti=var_studenti / 100,
+            variazione_retta=var_retta / 100,
+            variazione_costi_m2=var_costi / 100,
+            volatilita_inflazione=vol_inflazione / 100,
+        )
+        sim = simula(parametri_correnti(), incertezza, n_scenari=int(n_scenari), seed=int(seed))
+
+        def fan_chart(serie, titolo):
+            """Grafico a ventaglio: mediana e bande 5-95% e 25-75%."""
+            p5, p25, p50, p75, p95 = sim.percentili(serie)
+            anni_sim = list(sim.anni)
+            fig_fan = go.Figure()
+            for basso, alto, colore, nome in [
+                (p5, p95, "rgba(31, 119, 180, 0.15)", "5° - 95° percentile"),
+                (p25, p75, "rgba(31, 119, 180, 0.35)", "25° - 75° percentile"),
+            ]:
+                fig_fan.add_trace(go.Scatter(
+                    x=anni_sim, y=alto, mode="lines", line=dict(width=0),
+                    showlegend=False, hoverinfo="skip"
+                ))
+                fig_fan.add_trace(go.Scatter(
+                    x=anni_sim, y=basso, mode="lines", line=dict(width=0),
+                    fill="tonexty", fillcolor=colore, name=nome
+                ))
+            fig_fan.add_trace(go.Scatter(
+                x=anni_sim, y=p50, mode="lines+markers",
+                line=dict(color="rgb(31, 119, 180)"), name="Mediana"
+            ))
+            fig_fan.update_layout(
+                title=titolo,
+                yaxis_title="€",
+                yaxis_tickprefix="€",
+                yaxis_tickformat=",",
+                hovermode="x unified"
+            )
+            fig_fan.update_xaxes(tickmode="linear", dtick=1)
+            return fig_fan
+
+        st.plotly_chart(fan_chart("liquidita", "Disponibilità liquide"), use_container_width=True)
+        st.plotly_chart(fan_chart("risultato_netto", "EBIT per anno"), use_container_width=True)
+
+        # --- Tabelle percentili ---
+        etichette = [f"{q}° percentile" for q in PERCENTILI]
+        for serie, titolo in [("liquidita", "Disponibilità liquide (€)"),
+                              ("risultato_netto", "EBIT (€)")]:
+            st.markdown(f"**{titolo}**")
+            df_perc = pd.DataFrame(
+                sim.percentili(serie).T, columns=etichette, index=sim.anni
+            ).rename_axis("Anno")
+            st.dataframe(df_perc.round(0), use_container_width=True)
+
+        # --- Distribuzione anno di break-even ---
+        st.markdown("**Anno di break-even**")
+        frequenze = sim.frequenze_break_even()
+        df_be = pd.DataFrame({
+            "Anno di break-even": ["Non raggiunto"] + [f"Anno {a}" for a in sim.anni],
+            "Probabilità (%)": (frequenze * 100).round(1),
+        })
+        st.dataframe(df_be, use_container_width=True, hide_index=True)
 
-    st.plotly_chart(fig_risultato, use_container_width=True)
+    profilo.traguardo("Monte Carlo")
 
-    
+    # ================= ANALISI DI SENSITIVITÀ ================= #
+    st.markdown("---")
+    st.subheader("Analisi di sensitività")
+    st.markdown(
+        "Effetto sui risultati dell'ultimo anno di una variazione dei costi di struttura, "
+        "dei costi del personale e della retta. Se il break-even non viene raggiunto "
+        "l'anno conta come il primo dopo l'orizzonte del piano."
+    )
+
+    if st.checkbox("Attiva analisi di sensitività", value=False, key="sens_attiva"):
+        col_var, col_metrica = st.columns(2)
+        variazione = col_var.slider("Variazione dei parametri (± %)", 1, 50, 10, key="sens_variazione")
+        metrica = col_metrica.selectbox("Indicatore", list(METRICHE), key="sens_metrica")
+
+        params = parametri_correnti()
+        analisi = tornado(params, variazione / 100)
+        ordine = analisi.ordine(metrica)[::-1]  # il più influente in alto
+        nomi = [ETICHETTE[analisi.parametri[i]] for i in ordine]
+        base = analisi.base[metrica]
+
+        # --- Grafico a tornado ---
+        fig_tornado = go.Figure()
+        for esiti, nome, colore in [
+            (analisi.bassa[metrica], f"Parametro -{variazione}%", "red"),
+            (analisi.alta[metrica], f"Parametro +{variazione}%", "green"),
+        ]:
+            fig_tornado.add_trace(go.Bar(
+                y=nomi, x=esiti[ordine] - base, base=base, orientation="h",
+                name=nome, marker_color=colore
+            ))
+        fig_tornado.add_vline(x=base, line_dash="dash", line_color="grey")
+        fig_tornado.update_layout(
+            barmode="overlay",
+            title=f"{metrica}: valore base {base:,.0f}",
+            height=max(400, 30 * len(nomi)),
+            legend_title_text=""
+        )
+        st.plotly_chart(fig_tornado, use_container_width=True)
+
+        # --- Elasticità ordinate ---
+        st.markdown("**Elasticità** (variazione % dell'indicatore per 1% di variazione del parametro)")
+        df_elasticita = pd.DataFrame(
+            {m: analisi.elasticita(m) for m in METRICHE},
+            index=[ETICHETTE[nome] for nome in analisi.parametri]
+        ).rename_axis("Parametro")
+        df_elasticita = df_elasticita.iloc[analisi.ordine(metrica)]
+        st.dataframe(df_elasticita.round(3), use_container_width=True)
+
+        # --- Indici di Sobol ---
+        if st.checkbox("Analisi globale (indici di Sobol)", value=False, key="sens_sobol"):
+            col_n, col_seed = st.columns(2)
+            n_campioni = col_n.number_input(
+                "Campioni", min_value=256, max_value=20_000, value=2048, step=256
+            )
+            seed = col_seed.number_input("Seme casuale", min_value=0, value=42, step=1, key="sens_seed")
+            indici = sobol(params, variazione / 100, n_campioni=int(n_campioni), seed=int(seed))
+            st.markdown(
+                "Tutti i parametri variano insieme in modo uniforme entro ±"
+                f"{variazione}%. L'indice del primo ordine misura la quota di varianza "
+                "dovuta al solo parametro, quello totale include le interazioni."
+            )
+            df_sobol = pd.DataFrame({
+                "Primo ordine": indici.primo_ordine[metrica],
+                "Totale": indici.totale[metrica],
+            }, index=[ETICHETTE[nome] for nome in indici.parametri]).rename_axis("Parametro")
+            st.dataframe(
+                df_sobol.sort_values("Totale", ascending=False).round(3),
+                use_container_width=True
+            )
+
+    profilo.traguardo("Sensitività")
+
+    # ================= ESPLORAZIONE A GRIGLIA ================= #
+    st.markdown("---")
+    st.subheader("Esplorazione a griglia")
+    st.markdown(
+        "Valuta tutte le combinazioni di retta, crescita annua delle nuove prime, "
+        "piano delle superfici (in percentuale di quello attuale) e studenti per docente; "
+        "le griglie grandi vengono suddivise tra i core del processore."
+    )
+
+    if st.checkbox("Attiva esplorazione a griglia", value=False, key="griglia_attiva"):
+        retta_corrente = int(parametri["retta_unica"])
+        col_min, col_max, col_passo = st.columns(3)
+        retta_da = col_min.number_input("Retta da (€)", min_value=0, value=max(retta_corrente - 3000, 0), step=100)
+        retta_a = col_max.number_input("Retta a (€)", min_value=0, value=retta_corrente + 3000, step=100)
+        retta_passo = col_passo.number_input("Passo retta (€)", min_value=1, value=250, step=50)
+
+        col_min, col_max, col_passo = st.columns(3)
+        crescita_da = col_min.number_input("Crescita nuove prime da (%)", value=0, step=1)
+        crescita_a = col_max.number_input("Crescita nuove prime a (%)", value=30, step=1)
+        crescita_passo = col_passo.number_input("Passo crescita (%)", min_value=1, value=1, step=1)
+
+        col_sup, col_rapp = st.columns(2)
+        quote_superfici = col_sup.multiselect(
+            "Piano superfici (% di quello attuale)", [60, 80, 100, 120, 150, 200], default=[80, 100, 120]
+        )
+        rapporti = col_rapp.multiselect(
+            "Studenti per docente assunto", list(range(4, 21)), default=[6, 8, 10, 12]
+        )
+        if parametri["spazi_automatici"]:
+            col_sup.caption("Superfici calcolate dagli iscritti: il piano superfici "
+                            "della griglia non ha effetto.")
+        if parametri["organico_ottimizzato"]:
+            col_rapp.caption("Organico ottimizzato dal curricolo: gli studenti per docente "
+                             "della griglia non hanno effetto.")
+
+        griglia = Griglia(
+            rette=tuple(np.arange(retta_da, retta_a + 1, retta_passo, dtype=float)),
+            crescite_iscrizioni=tuple(np.arange(crescita_da, crescita_a + 1, crescita_passo) / 100),
+            piani_superficie=tuple(
+                tuple(np.asarray(parametri["superfici"], dtype=float) * q / 100) for q in quote_superfici
+            ),
+            rapporti_docenti=tuple(float(r) for r in rapporti),
+        )
+        n_griglia = (len(griglia.rette) * len(griglia.crescite_iscrizioni)
+                     * len(griglia.piani_superficie) * len(griglia.rapporti_docenti))
+        st.write(f"Scenari nella griglia: {n_griglia:,}".replace(",", "."))
+
+        if n_griglia and st.button("Esegui esplorazione", key="griglia_esegui"):
+            barra = st.progress(0.0, text="Esplorazione in corso...")
+            st.session_state["esiti_griglia"] = (
+                esplora(
+                    parametri_correnti(), griglia,
+                    progresso=lambda fatti, totale: barra.progress(
+                        fatti / totale, text=f"Scenari valutati: {fatti:,} di {totale:,}".replace(",", ".")
+                    ),
+                ),
+                quote_superfici,
+            )
+            barra.empty()
+
+        if "esiti_griglia" in st.session_state:
+            esiti, quote = st.session_state["esiti_griglia"]
+            col_be, col_liq = st.columns(2)
+            be_entro = col_be.number_input(
+                "Break-even entro l'anno (0 = nessun vincolo)",
+                min_value=0, max_value=len(esiti.anni), value=0, step=1, key="griglia_be"
+            )
+            liq_min = col_liq.number_input(
+                "Liquidità minima di almeno (€)", value=0, step=10000, key="griglia_liq"
+            )
+            ids = esiti.filtra(break_even_entro=be_entro or None, liquidita_minima=liq_min)
+            st.write(
+                f"Scenari che rispettano i vincoli: {len(ids):,} su {esiti.n_scenari:,}".replace(",", ".")
+            )
 
+            # Migliori scenari per EBIT dell'ultimo anno (la tabella completa può avere milioni di righe)
+            migliori = ids[np.argsort(-esiti.risultato_netto[ids, -1], kind="stable")[:1000]]
+            df_griglia = esiti.tabella(migliori)
+            df_griglia["Piano superfici"] = [f"{quote[i]}%" for i in df_griglia["Piano superfici"]]
+            df_griglia["Crescita iscrizioni"] = (df_griglia["Crescita iscrizioni"] * 100).round(1)
+            df_griglia = df_griglia.round({c: 0 for c in df_griglia.columns if "€" in c})
+            st.dataframe(
+                df_griglia.rename(columns={"Crescita iscrizioni": "Crescita iscrizioni (%)"}),
+                use_container_width=True,
+                hide_index=True
+            )
+
+    profilo.traguardo("Esplorazione a griglia")
+
+    # ================= CONFRONTO FRA SCENARI ================= #
+    st.markdown("---")
+    st.subheader("Confronto fra scenari")
+    st.markdown(
+        "Scenari salvati (vedi la sidebar) valutati insieme al piano corrente in un unico "
+        "calcolo, con le differenze rispetto a uno scenario di riferimento."
+    )
+
+    if st.checkbox("Attiva confronto", value=False, key="cfr_attivo"):
+        salvati = archivio().elenco(limite=500)
+        etichette = {i: f"{nome} #{i}" for i, nome in zip(salvati["id"], salvati["nome"])}
+        col_scelti, col_corrente = st.columns([3, 1])
+        scelti = col_scelti.multiselect(
+            "Scenari salvati", list(etichette), format_func=etichette.get, key="cfr_scenari"
+        )
+        con_corrente = col_corrente.checkbox("Includi il piano corrente", value=True, key="cfr_corrente")
+
+        scenari = [(etichette[i], params) for i, (_, params) in zip(scelti, archivio().parametri(scelti))]
+        if con_corrente:
+            scenari.insert(0, ("Piano corrente", parametri_correnti()))
+
+        if len(scenari) < 2:
+            st.info("Seleziona gli scenari da confrontare (almeno due, compreso il piano corrente).")
+        else:
+            confronto = confronta(scenari)
+            nomi = confronto.nomi
+            col_base, col_serie = st.columns(2)
+            base = col_base.selectbox(
+                "Scenario di riferimento", range(len(nomi)), format_func=nomi.__getitem__, key="cfr_base"
+            )
+            serie = col_serie.selectbox("Serie", list(SERIE), key="cfr_serie")
+
+            st.dataframe(
+                confronto.sintesi(base).round(0),
+                use_container_width=True,
+                hide_index=True
+            )
+
+            df_serie = confronto.tabella(serie)
+            fig_confronto = px.line(
+                df_serie.reset_index().melt(id_vars="Anno", var_name="Scenario", value_name="€"),
+                x="Anno",
+                y="€",
+                color="Scenario",
+                markers=True,
+                title=f"{serie} per anno"
+            )
+            fig_confronto.update_layout(
+                yaxis_tickprefix="€",
+                yaxis_tickformat=",",
+                legend_title_text=""
+            )
+            fig_confronto.update_xaxes(tickmode="linear", dtick=1)
+            st.plotly_chart(fig_confronto, use_container_width=True)
+
+            col_valori, col_delta = st.columns(2)
+            col_valori.markdown(f"**{serie} per anno (€)**")
+            col_valori.dataframe(df_serie.round(0), use_container_width=True)
+            col_delta.markdown(f"**Differenze rispetto a {nomi[base]} (€)**")
+            col_delta.dataframe(confronto.tabella(serie, base).round(0), use_container_width=True)
 
+    profilo.traguardo("Confronto fra scenari")
 
-# ================= TAB 5: CONTO ECONOMICO ================= #
 
-with tab4:
+# ================= TAB 4: CONTO ECONOMICO ================= #
+@st.fragment
+@profilata("Conto economico")
+def scheda_conto_economico():
+    piano = piano_corrente()
+    df_summary = tabelle.df_summary(piano)
+
     st.subheader("Conto economico previsionale")
 
     # --- Selezione anni disponibili ---
     anni_disponibili = sorted(df_summary["Anno"].unique())
-    anni_limite = anni_disponibili[:5]  # max anni 5
 
     st.markdown("### Seleziona gli anni da visualizzare")
     anni_attivi = []
 
-    for a in anni_limite:
-        if st.checkbox(f"Mostra Anno {a}", value=True, key=f"show_{a}"):
+    # Anni nascosti conservati in session_state (la scheda può essere chiusa)
+    anni_nascosti = st.session_state.setdefault("anni_nascosti", set())
+    colonne_anni = st.columns(min(len(anni_disponibili), 10))
+    for j, a in enumerate(anni_disponibili):
+        if colonne_anni[j % len(colonne_anni)].checkbox(
+            f"Mostra Anno {a}", value=a not in anni_nascosti, key=f"show_{a}"
+        ):
             anni_attivi.append(a)
+            anni_nascosti.discard(a)
+        else:
+            anni_nascosti.add(a)
 
     if len(anni_attivi) == 0:
         st.warning("Seleziona almeno un anno per visualizzare il Conto Economico.")
-        st.stop()
-
-    # Funzione euro
-    def euro(valore):
-        return f"-€ {abs(valore):,.0f}".replace(",", ".") if valore < 0 else f"€ {valore:,.0f}".replace(",", ".")
-
-    # Funzione percentuale
-    def percentuale(valore, totale):
-        if totale == 0:
-            return "0%"
-        return f"{(valore / totale * 100):.1f}%"
+        return
 
     # ==============================================
     # COSTRUZIONE DINAMICA DEI VALORI PER OGNI ANNO
     # ==============================================
-    valori = {}
-
-    for a in anni_attivi:
-
-        df_row = df_summary[df_summary["Anno"] == a].iloc[0]
-        df_cost_row = df_costs[df_costs["Anno"] == a].iloc[0]
-
-        ricavi = df_row.get("Ricavi (€)", 0) + altri_contributi
-        struttura = df_row.get("Costi struttura (€)", 0)
-        personale = df_row.get("Costi personale (€)", 0)
-
-        amm = df_cost_row.get("Ammort. attrezzature (€/anno)", 0) + \
-              df_cost_row.get("Ammortamenti arredi (€/anno)", 0)
-
-        per_servizi = struttura - amm
-        materie_prime = 0
-        godimento_beni = 0
-
-        costi_tot = personale + materie_prime + godimento_beni + per_servizi + amm
-        diff = ricavi - costi_tot
-        utile_netto = diff
-
-        valori[a] = {
-            "ricavi_puri": df_row.get("Ricavi (€)", 0),
-            "altri_contributi": altri_contributi,
-            "altri_ricavi": 0,
-            "ricavi_tot": ricavi,
-            "personale": personale,
-            "primo_margine": ricavi - personale,
-            "materie_prime": materie_prime,
-            "godimento_beni": godimento_beni,
-            "per_servizi": per_servizi,
-            "ammortamenti": amm,
-            "costi_tot": costi_tot,
-            "risultato_operativo": diff,
-            "proventi_partecipazioni": 0,
-            "altri_proventi_fin": 0,
-            "interessi_oneri": 0,
-            "risultato_prima_imposte": diff,
-            "imposte": 0,
-            "utile_netto": utile_netto,
-        }
-
-    # ==========================================================
-    #                       TABELLA HTML
-    # ==========================================================
-
-    def col_header():
-        h = "<tr><th>Conto economico</th>"
-        for a in anni_attivi:
-            h += f"<th colspan='2' style='text-align:center;'>Anno {a}</th>"
-        h += "</tr>"
-
-        h += "<tr><th></th>"
-        for a in anni_attivi:
-            h += "<th>Valore</th><th>%</th>"
-        h += "</tr>"
-        return h
-
-    def riga(label, key, bold=False, sub=False, base="ricavi", show_perc=True):
-        """
-        show_perc=True  → mostra % (solo fino al B)
-        show_perc=False → quella riga NON mostra la % (celle vuote)
-        """
-        style = " class='sub'" if sub else ""
-        if bold:
-            label = f"<b>{label}</b>"
-
-        totale_ref = "ricavi_tot" if base == "ricavi" else "costi_tot"
-
-        celle = ""
-        for a in anni_attivi:
-            v = valori[a][key]
-            tot = valori[a][totale_ref]
-            perc = percentuale(v, tot) if show_perc else ""
-            celle += f"<td class='value'>{euro(v)}</td><td class='perc'>{perc}</td>"
-
-        return f"<tr{style}><td class='label'>{label}</td>{celle}</tr>"
-
-    html = f"""
-    <style>
-    table.conto {{
-        width: 100%; border-collapse: collapse; font-size: 14px; margin-top: 20px;
-    }}
-    table.conto th {{
-        background-color: #e1e8f7; text-align: center; padding: 6px 10px; font-weight: bold;
-    }}
-    table.conto td {{ padding: 6px 10px; border-bottom: 1px solid #ddd; }}
-    tr.section td {{
-        background-color: #f2f5fc; font-weight: bold; border-top: 2px solid #ccc;
-    }}
-    tr.sub td {{ padding-left: 20px; }}
-    td.label {{ text-align: left; }}
-    td.value {{ text-align: right; white-space: nowrap; }}
-    td.perc {{ text-align: right; color: #555; font-size: 12px; }}
-    </style>
-
-    <table class="conto">
-
-        {col_header()}
-
-        <!-- A) VALORE DELLA PRODUZIONE -->
-        <tr class="section"><td colspan="{1 + 2*len(anni_attivi)}">A) Valore della produzione</td></tr>
-
-        {riga("1) Ricavi delle vendite e delle prestazioni", "ricavi_puri", sub=True, base="ricavi")}
-        {riga("2) Altri contributi", "altri_contributi", sub=True, base="ricavi")}
-        {riga("5) Altri ricavi e proventi", "altri_ricavi", sub=True, base="ricavi")}
-        {riga("Totale valore della produzione (A)", "ricavi_tot", bold=True, base="ricavi")}
-
-        <!-- B) COSTI DELLA PRODUZIONE -->
-        <tr class="section"><td colspan="{1 + 2*len(anni_attivi)}">B) Costi della produzione</td></tr>
-
-        {riga("6) Totale costi per il personale", "personale", sub=True, base="costi")}
-
-        <!-- PRIMO MARGINE OPERATIVO: NESSUNA % -->
-        {riga("Primo margine operativo", "primo_margine", bold=True, base="ricavi", show_perc=False)}
-
-        {riga("7) Materie prime, sussidiarie, merci", "materie_prime", sub=True, base="costi")}
-        {riga("8) Per godimento di beni di terzi", "godimento_beni", sub=True, base="costi")}
-        {riga("9) Per servizi", "per_servizi", sub=True, base="costi")}
-        {riga("10) Ammortamenti e svalutazioni", "ammortamenti", sub=True, base="costi")}
-
-        {riga("Totale costi della produzione (B)", "costi_tot", bold=True, base="costi")}
-
-        <!-- RISULTATO OPERATIVO: NESSUNA % -->
-        {riga("Risultato operativo (A - B)", "risultato_operativo", bold=True, base="ricavi", show_perc=False)}
-
-        <!-- C) PROVENTI E ONERI FINANZIARI – SENZA % -->
-        <tr class="section"><td colspan="{1 + 2*len(anni_attivi)}">C) Proventi e oneri finanziari</td></tr>
-
-        {riga("15) Proventi da partecipazioni", "proventi_partecipazioni", sub=True, base="ricavi", show_perc=False)}
-        {riga("16) Altri proventi finanziari", "altri_proventi_fin", sub=True, base="ricavi", show_perc=False)}
-        {riga("17) Interessi e altri oneri finanziari", "interessi_oneri", sub=True, base="ricavi", show_perc=False)}
-
-        {riga("Totale proventi e oneri finanziari", "materie_prime", bold=True, base="ricavi", show_perc=False)}
-
-        {riga("Risultato prima delle imposte", "risultato_prima_imposte", bold=True, base="ricavi", show_perc=False)}
-        {riga("20) Imposte", "imposte", base="ricavi", show_perc=False)}
-        {riga("Risultato dell'esercizio", "utile_netto", bold=True, base="ricavi", show_perc=False)}
-
-    </table>
-    """
-
+    valori = {
+        a: {voce: float(serie[a - 1]) for voce, serie in piano.ce.items()}
+        for a in anni_attivi
+    }
+
+    # --- Tabella HTML (memoizzata su valori e anni visibili) ---
+    html = prospetti.html_prospetto(prospetti.CONTO_ECONOMICO, piano.ce, anni_attivi)
+    profilo.traguardo("HTML prospetto")
     components.html(html, height=900, scrolling=True)
+    profilo.traguardo("Invio iframe")
 
     st.session_state["valori"] = valori
 
 
-
 ##############################################
 #              STATO PATRIMONIALE           #
 ##############################################
 
-with tab5:
-
+@st.fragment
+@profilata("Stato patrimoniale")
+def scheda_stato_patrimoniale():
     st.subheader("Stato Patrimoniale previsionale")
 
     anni = years
@@ -809,416 +1327,456 @@ with tab5:
     # -------------------------------
     # FONDO DI DOTAZIONE PROGRESSIVO
     # -------------------------------
-    fondo_progressivo = [200000, 120000, 90000, 60000, 30000]
-    fondo_cumulato = np.cumsum(fondo_progressivo)
-
-    risultati = df_summary["Risultato netto (€)"].values
-
-    # Perdite / utili cumulati
-    cumulato = []
-    somma = 0
-    for r in risultati:
-        somma += r
-        cumulato.append(somma)
+    with st.expander("🏦 Conferimenti annui al fondo di dotazione (€)", expanded=False):
+        fondo_progressivo = []
+        for i, anno in enumerate(anni):
+            fondo_progressivo.append(st.number_input(
+                f"Anno {anno} - conferimento",
+                min_value=0,
+                value=int(parametri["fondo_progressivo"][i]),
+                step=1000,
+                key=f"fondo_{anno}"
+            ))
+        parametri["fondo_progressivo"] = fondo_progressivo
 
     # -------------------------------
-    # COSTRUZIONE VALORI PER ANNO
+    # FINANZIAMENTI
     # -------------------------------
+    with st.expander("🏦 Finanziamenti: prestiti e linea revolving", expanded=False):
+        st.markdown(
+            "Prestiti erogati a inizio anno, con rimborso a **quote capitale costanti** "
+            "(ammortamento) o in un'unica soluzione alla scadenza (**bullet**). "
+            "La **linea revolving** viene utilizzata automaticamente, fino al fido, "
+            "quando la liquidità di fine anno sarebbe negativa."
+        )
+        # Il data editor conserva le proprie modifiche (righe aggiunte e tolte)
+        # rispetto ai dati iniziali: questi restano fissi per tutta la sessione
+        if "prestiti_iniziali" not in st.session_state:
+            st.session_state["prestiti_iniziali"] = pd.DataFrame({
+                "Importo (€)": parametri["prestiti_importo"],
+                "Tasso (%)": [100 * t for t in parametri["prestiti_tasso"]],
+                "Durata (anni)": parametri["prestiti_durata"],
+                "Anno di erogazione": parametri["prestiti_anno"],
+                "Tipo": [TIPI_PRESTITO[int(t)] for t in parametri["prestiti_tipo"]],
+            }).astype({"Importo (€)": float, "Tasso (%)": float, "Durata (anni)": int,
+                       "Anno di erogazione": int, "Tipo": str})
+        df_prestiti = st.data_editor(
+            st.session_state["prestiti_iniziali"],
+            key="prestiti",
+            num_rows="dynamic",
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "Importo (€)": st.column_config.NumberColumn(min_value=0, step=1000, default=0),
+                "Tasso (%)": st.column_config.NumberColumn(min_value=0, max_value=100, step=0.1,
+                                                           default=0),
+                "Durata (anni)": st.column_config.NumberColumn(min_value=1, step=1, default=1),
+                "Anno di erogazione": st.column_config.NumberColumn(
+                    min_value=1, max_value=len(anni), step=1, default=1
+                ),
+                "Tipo": st.column_config.SelectboxColumn(
+                    options=list(TIPI_PRESTITO.values()), default=TIPI_PRESTITO[0]
+                ),
+            }
+        )
+        tipi = {etichetta: tipo for tipo, etichetta in TIPI_PRESTITO.items()}
+        parametri["prestiti_importo"] = df_prestiti["Importo (€)"].fillna(0).tolist()
+        parametri["prestiti_tasso"] = (df_prestiti["Tasso (%)"].fillna(0) / 100).tolist()
+        parametri["prestiti_durata"] = df_prestiti["Durata (anni)"].fillna(1).tolist()
+        parametri["prestiti_anno"] = df_prestiti["Anno di erogazione"].fillna(1).tolist()
+        parametri["prestiti_tipo"] = df_prestiti["Tipo"].map(tipi).fillna(0).tolist()
+
+        col1, col2 = st.columns(2)
+        with col1:
+            parametri["fido_revolving"] = st.number_input(
+                "Fido della linea revolving (€)",
+                min_value=0, value=int(parametri["fido_revolving"]), step=10000,
+                key="fido_revolving"
+            )
+        with col2:
+            parametri["tasso_revolving"] = st.number_input(
+                "Tasso della linea revolving (%)",
+                min_value=0.0, max_value=100.0, value=100 * float(parametri["tasso_revolving"]),
+                step=0.1, key="tasso_revolving"
+            ) / 100
+
+        fin = piano_corrente().fin
+        st.markdown("**Piano dei finanziamenti (€)**")
+        st.dataframe(
+            pd.DataFrame({
+                "Anno": anni,
+                "Interessi prestiti": fin["interessi_prestiti"].round(0),
+                "Interessi revolving": fin["interessi_revolving"].round(0),
+                "Debito residuo prestiti": fin["debito_prestiti"].round(0),
+                "Utilizzo revolving": fin["utilizzo_revolving"].round(0),
+            }),
+            use_container_width=True,
+            hide_index=True
+        )
 
-    sp = {}
-
-    for i, anno in enumerate(anni):
-
-        # ATTIVO
-        imm_immateriali = max(30000 - i*5000, 10000)
-        imm_materiali = df_costs.at[i, "Ammortamenti arredi (€/anno)"] * 5
-        imm_fin = 10000
-
-        tot_imm = imm_immateriali + imm_materiali + imm_fin
-
-        rimanenze = 2000 + i*1000
-        crediti = df_summary.at[i, "Ricavi (€)"] * 0.2
-        att_fin_non_imm = 0
-
-        liquidita = fondo_cumulato[i] + cumulato[i] - tot_imm - rimanenze - crediti
-
-        tot_circ = rimanenze + crediti + att_fin_non_imm + liquidita
-        totale_attivo = tot_imm + tot_circ
-
-        # PASSIVO
-        fondo = fondo_cumulato[i]
-        risultato_es = risultati[i]
-        utili_portati = cumulato[i] - risultato_es
-
-        patrimonio_netto = fondo + utili_portati + risultato_es
-
-        fondi_rischi = 5000 + i*1000
-        tfr = df_personale.at[i, "Totale costi personale (€)"] * 0.07
-
-        debiti = totale_attivo - patrimonio_netto - fondi_rischi - tfr
-
-        sp[anno] = {
-            # ATTIVO
-            "imm_immateriali": imm_immateriali,
-            "imm_materiali": imm_materiali,
-            "imm_fin": imm_fin,
-            "tot_imm": tot_imm,
-            "rimanenze": rimanenze,
-            "crediti": crediti,
-            "att_fin_non_imm": att_fin_non_imm,
-            "liquidita": liquidita,
-            "tot_circ": tot_circ,
-            "tot_attivo": totale_attivo,
-            # PASSIVO
-            "fondo": fondo,
-            "fin_invest": 0,
-            "riserve_vinc": 0,
-            "altre_riserve": 0,
-            "contrib_rip": 0,
-            "utili_portati": utili_portati,
-            "risultato_es": risultato_es,
-            "tot_pn": patrimonio_netto,
-            "fondi_rischi": fondi_rischi,
-            "tfr": tfr,
-            "debiti": debiti
-        }
-
-    # -------------------------------
-    # FUNZIONE FORMATTA EURO
-    # -------------------------------
-    def euro(x):
-        if x < 0:
-            return f"-€ {abs(x):,.0f}".replace(",", ".")
-        return f"€ {x:,.0f}".replace(",", ".")
+    piano = piano_corrente()
 
     # -------------------------------
-    # COSTRUZIONE HTML
+    # TABELLA HTML (memoizzata su valori e anni)
     # -------------------------------
-
-    def header():
-        h = "<tr><th>VOCI</th>"
-        for a in anni:
-            h += f"<th>ANNO {a}</th>"
-        h += "</tr>"
-        return h
-
-    def riga(label, key, bold=False):
-        if bold:
-            label = f"<b>{label}</b>"
-        row = f"<tr><td>{label}</td>"
-        for a in anni:
-            row += f"<td style='text-align:right'>{euro(sp[a][key])}</td>"
-        row += "</tr>"
-        return row
-
-    html = f"""
-    <style>
-    table.sp {{
-        width: 100%;
-        border-collapse: collapse;
-        font-size: 14px;
-        margin-bottom: 40px;
-    }}
-    table.sp th {{
-        background-color: #e1e8f7;
-        padding: 6px;
-        text-align: center;
-    }}
-    table.sp td {{
-        padding: 6px;
-        border-bottom: 1px solid #ddd;
-    }}
-    .section {{
-        background-color: #f2f5fc;
-        font-weight: bold;
-    }}
-    </style>
-
-    <h3>STATO PATRIMONIALE ATTIVO</h3>
-    <table class="sp">
-    {header()}
-    <tr class="section"><td colspan="{1+len(anni)}">A) IMMOBILIZZAZIONI</td></tr>
-    {riga("I Immobilizzazioni immateriali", "imm_immateriali")}
-    {riga("II Immobilizzazioni materiali", "imm_materiali")}
-    {riga("III Immobilizzazioni finanziarie", "imm_fin")}
-    {riga("Totale A) Immobilizzazioni", "tot_imm", True)}
-
-    <tr class="section"><td colspan="{1+len(anni)}">B) ATTIVO CIRCOLANTE</td></tr>
-    {riga("I Rimanenze", "rimanenze")}
-    {riga("II Crediti", "crediti")}
-    {riga("III Attività finanziarie non immobilizzate", "att_fin_non_imm")}
-    {riga("IV Disponibilità liquide", "liquidita")}
-    {riga("Totale B) Attivo circolante", "tot_circ", True)}
-
-    {riga("TOTALE ATTIVO (A+B)", "tot_attivo", True)}
-    </table>
-
-    <h3>STATO PATRIMONIALE PASSIVO</h3>
-    <table class="sp">
-    {header()}
-    <tr class="section"><td colspan="{1+len(anni)}">A) PATRIMONIO NETTO</td></tr>
-    {riga("I Fondo di dotazione", "fondo")}
-    {riga("II Finanziamenti per investimenti", "fin_invest")}
-    {riga("III Riserve vincolate", "riserve_vinc")}
-    {riga("IV Altre riserve", "altre_riserve")}
-    {riga("V Contributi ripiano perdite", "contrib_rip")}
-    {riga("VI Utili (perdite) portati a nuovo", "utili_portati")}
-    {riga("VII Risultato esercizio", "risultato_es")}
-    {riga("Totale A) Patrimonio netto", "tot_pn", True)}
-
-    {riga("B) FONDI PER RISCHI E ONERI", "fondi_rischi")}
-    {riga("C) TRATTAMENTO FINE RAPPORTO", "tfr")}
-    {riga("D) DEBITI", "debiti")}
-
-    {riga("TOTALE PASSIVO", "tot_attivo", True)}
-    </table>
-    """
-
+    html = prospetti.html_prospetto(prospetti.STATO_PATRIMONIALE, piano.sp, anni)
+    profilo.traguardo("HTML prospetto")
     components.html(html, height=1200, scrolling=True)
-
-
+    profilo.traguardo("Invio iframe")
+
+    scarto_totali, scarto_liquidita, scarto_risultato = squadrature(piano.ce, piano.sp, piano.rf)
+    st.caption(
+        "Stato patrimoniale e rendiconto finanziario derivano dagli stessi saldi: "
+        f"scarto attivo − passivo {scarto_totali:.2f} €, "
+        f"scarto liquidità rispetto al rendiconto {scarto_liquidita:.2f} €, "
+        f"scarto utile rispetto al conto economico {scarto_risultato:.2f} €."
+    )
 
 
 #------------------------------------------#
 ####------RENDICONTO FINANZIARIO
 #------------------------------------------#
 
+@st.fragment
+@profilata("Rendiconto")
+def scheda_rendiconto():
+    piano = piano_corrente()
 
-with tab6:
 
     st.subheader("Rendiconto Finanziario")
 
     anni = years
-    fondo_progressivo = [200000, 120000, 90000, 60000, 30000]
-
-    risultati = df_summary["Risultato netto (€)"].values
-
-    rf = {}
-    liquidita_precedente = 0
-
-    for i, anno in enumerate(anni):
-
-        # ===============================
-        # 1) GESTIONE CARATTERISTICA
-        # ===============================
 
-        risultato_operativo = risultati[i]
-
-        ammortamenti = (
-            df_costs.at[i, "Ammortamenti arredi (€/anno)"] +
-            df_costs.at[i, "Ammort. attrezzature (€/anno)"]
-        )
-
-        flusso_gestione_caratt = risultato_operativo + ammortamenti
-
-        # ===============================
-        # 2) GESTIONI NON OPERATIVE
-        # ===============================
-
-        gestione_finanziaria = 0
-        gestione_straordinaria = 0
-        gestione_fiscale = 0
+    # ===============================
+    # TABELLA HTML (memoizzata su valori e anni)
+    # ===============================
+    html = prospetti.html_prospetto(prospetti.RENDICONTO_FINANZIARIO, piano.rf, anni)
+    profilo.traguardo("HTML prospetto")
+    components.html(html, height=1300, scrolling=True)
+    profilo.traguardo("Invio iframe")
 
-        flusso_potenziale_ccn = (
-            flusso_gestione_caratt +
-            gestione_finanziaria +
-            gestione_straordinaria +
-            gestione_fiscale
+    # ===============================
+    # LIQUIDITÀ INFRA-ANNUALE
+    # ===============================
+    st.subheader("Liquidità infra-annuale")
+    st.markdown(
+        "I flussi annui vengono ripartiti sui mesi dell'anno scolastico (da settembre) secondo "
+        "il calendario di incassi e pagamenti; la liquidità di fine anno coincide con il rendiconto."
+    )
+    periodi = st.selectbox(
+        "Periodicità", list(PERIODI), format_func=PERIODI.get, key="cassa_periodi"
+    )
+    with st.expander("📅 Calendario di incassi e pagamenti (pesi mensili)", expanded=False):
+        st.markdown(
+            "Pesi relativi per mese (es. 2 = doppio della media): rette a rate, "
+            "tredicesima e quattordicesima del personale, conferimenti a inizio anno."
         )
-
-        # ===============================
-        # 3) VARIAZIONI CCN
-        # ===============================
-
-        rimanenze = 2000 + i * 1000
-        crediti = df_summary.at[i, "Ricavi (€)"] * 0.2
-
-        if i == 0:
-            var_rimanenze = -rimanenze
-            var_crediti = -crediti
-        else:
-            rimanenze_prev = 2000 + (i - 1) * 1000
-            crediti_prev = df_summary.at[i - 1, "Ricavi (€)"] * 0.2
-
-            var_rimanenze = -(rimanenze - rimanenze_prev)
-            var_crediti = -(crediti - crediti_prev)
-
-        var_altri_crediti = 0
-        var_att_fin = 0
-        var_ratei_att = 0
-
-        var_debiti_commerciali = 0
-        var_debiti_diversi = 0
-        var_ratei_passivi = 0
-
-        flusso_gestione_reddituale = (
-            flusso_potenziale_ccn +
-            var_rimanenze +
-            var_crediti +
-            var_altri_crediti +
-            var_att_fin +
-            var_ratei_att +
-            var_debiti_commerciali +
-            var_debiti_diversi +
-            var_ratei_passivi
+        predefiniti = Calendari()
+        df_calendario = st.data_editor(
+            pd.DataFrame({
+                "Mese": MESI,
+                **{VOCI_CASSA[f.name]: getattr(predefiniti, f.name) for f in fields(Calendari)},
+            }),
+            key="cassa_calendario",
+            hide_index=True,
+            disabled=["Mese"],
+            use_container_width=True,
+            column_config={
+                VOCI_CASSA[f.name]: st.column_config.NumberColumn(min_value=0.0, step=0.1)
+                for f in fields(Calendari)
+            }
         )
 
-        # ===============================
-        # 4) INVESTIMENTI
-        # ===============================
-
-        var_imm_immateriali = -5000 if i > 0 else -30000
-        var_imm_materiali = -df_costs.at[i, "Ammortamenti arredi (€/anno)"] * 5
-        var_imm_finanziarie = 0
-
-        flusso_investimenti = (
-            var_imm_immateriali +
-            var_imm_materiali +
-            var_imm_finanziarie
+    try:
+        cassa = cassa_periodica(
+            piano,
+            Calendari(**{
+                f.name: tuple(df_calendario[VOCI_CASSA[f.name]].fillna(0).astype(float))
+                for f in fields(Calendari)
+            }),
+            periodi,
         )
+    except ValueError as e:
+        st.error(f"Calendario non valido: {e}")
+        return
+    etichette = etichette_periodi(periodi)
+
+    st.dataframe(
+        pd.DataFrame({
+            "Anno": anni,
+            "Liquidità minima (€)": cassa.minimo_annuo.round(0),
+            "Periodo del minimo": [etichette[i] for i in cassa.periodo_minimo],
+            "Liquidità di fine anno (€)": cassa.liquidita[:, -1].round(0),
+        }),
+        use_container_width=True,
+        hide_index=True
+    )
 
-        # ===============================
-        # 5) FINANZIAMENTI
-        # ===============================
-
-        var_debiti_fin = 0
-
-        tfr = df_personale.at[i, "Totale costi personale (€)"] * 0.07
-        if i == 0:
-            var_tfr = tfr
-        else:
-            tfr_prev = df_personale.at[i - 1, "Totale costi personale (€)"] * 0.07
-            var_tfr = tfr - tfr_prev
-
-        var_debiti_lp = 0
-        var_debiti_div = 0
-        var_fondo_rischi = 1000
-        var_patrimonio_netto = fondo_progressivo[i]
-
-        flusso_finanziamenti = (
-            var_debiti_fin +
-            var_tfr +
-            var_debiti_lp +
-            var_debiti_div +
-            var_fondo_rischi +
-            var_patrimonio_netto
-        )
+    fig_cassa = px.line(
+        pd.DataFrame({
+            "Periodo": [f"Anno {a} · {e}" for a in anni for e in etichette],
+            "Liquidità (€)": cassa.liquidita.reshape(-1),
+        }),
+        x="Periodo",
+        y="Liquidità (€)",
+        markers=periodi <= 4,
+        title="Liquidità a fine periodo"
+    )
+    fig_cassa.add_hline(y=0, line_color="red", line_dash="dot")
+    fig_cassa.update_layout(yaxis_tickprefix="€", yaxis_tickformat=",", xaxis_title="")
+    st.plotly_chart(fig_cassa, use_container_width=True)
+    profilo.traguardo("Liquidità infra-annuale")
 
-        # ===============================
-        # 6) FLUSSO NETTO
-        # ===============================
 
-        flusso_netto = (
-            flusso_gestione_reddituale +
-            flusso_investimenti +
-            flusso_finanziamenti
-        )
+# ================= TAB 8: PORTAFOGLIO CAMPUS ================= #
+@st.fragment
+@profilata("Portafoglio")
+def scheda_portafoglio():
+    st.subheader("Portafoglio di campus")
+    st.markdown(
+        "Ogni campus è uno scenario salvato (vedi la sidebar), con il proprio anno di apertura "
+        "nel piano di gruppo. I campus vengono calcolati insieme e i prospetti sommati nel consolidato."
+    )
 
-        liquidita_finale = liquidita_precedente + flusso_netto
-
-        rf[anno] = {
-            "risultato_operativo": risultato_operativo,
-            "ammortamenti": ammortamenti,
-            "flusso_gestione_caratt": flusso_gestione_caratt,
-            "gestione_fin": gestione_finanziaria,
-            "gestione_str": gestione_straordinaria,
-            "gestione_fisc": gestione_fiscale,
-            "flusso_pot_ccn": flusso_potenziale_ccn,
-            "var_rimanenze": var_rimanenze,
-            "var_crediti": var_crediti,
-            "flusso_gestione_redd": flusso_gestione_reddituale,
-            "var_imm_imm": var_imm_immateriali,
-            "var_imm_mat": var_imm_materiali,
-            "var_imm_fin": var_imm_finanziarie,
-            "var_tfr": var_tfr,
-            "var_pn": var_patrimonio_netto,
-            "flusso_netto": flusso_netto,
-            "liq_inizio": liquidita_precedente,
-            "liq_fine": liquidita_finale
+    salvati = archivio().elenco(limite=500)
+    etichette = {i: f"{nome} #{i}" for i, nome in zip(salvati["id"], salvati["nome"])}
+    col_scelti, col_corrente = st.columns([3, 1])
+    scelti = col_scelti.multiselect(
+        "Campus (scenari salvati)", list(etichette), format_func=etichette.get, key="pf_campus"
+    )
+    con_corrente = col_corrente.checkbox("Includi il piano corrente", value=True, key="pf_corrente")
+
+    campus = [(etichette[i], params) for i, (_, params) in zip(scelti, archivio().parametri(scelti))]
+    if con_corrente:
+        campus.insert(0, ("Piano corrente", parametri_correnti()))
+    if not campus:
+        st.info("Seleziona almeno un campus.")
+        return
+
+    n_anni_gruppo = st.number_input(
+        "Anni del piano di gruppo", min_value=1, max_value=ORIZZONTE_MASSIMO,
+        value=max(len(p.new_first_students) for _, p in campus), step=1, key="pf_anni"
+    )
+    df_aperture = st.data_editor(
+        pd.DataFrame({"Campus": [nome for nome, _ in campus], "Anno di apertura": 1}),
+        key="pf_aperture",
+        hide_index=True,
+        disabled=["Campus"],
+        use_container_width=True,
+        column_config={
+            "Anno di apertura": st.column_config.NumberColumn(
+                min_value=1, max_value=int(n_anni_gruppo), step=1
+            ),
         }
+    )
+    aperture = df_aperture["Anno di apertura"].fillna(1).astype(int).clip(1, n_anni_gruppo)
 
-        liquidita_precedente = liquidita_finale
+    portafoglio = consolida(
+        [Campus(nome, params, int(a)) for (nome, params), a in zip(campus, aperture)],
+        n_anni=int(n_anni_gruppo),
+    )
+    profilo.traguardo("Consolidamento")
 
-    # ===============================
-    # FUNZIONE EURO
-    # ===============================
+    st.markdown("**Sintesi per campus**")
+    st.dataframe(portafoglio.sintesi().round(0), use_container_width=True, hide_index=True)
 
-    def euro(x):
-        if x < 0:
-            return f"-€ {abs(x):,.0f}".replace(",", ".")
-        return f"€ {x:,.0f}".replace(",", ".")
+    fig_campus = px.bar(
+        pd.DataFrame({
+            "Anno": np.tile(portafoglio.anni, portafoglio.n_campus),
+            "Campus": np.repeat(portafoglio.nomi, len(portafoglio.anni)),
+            "Risultato netto (€)": portafoglio.serie["risultato_netto"].reshape(-1),
+        }),
+        x="Anno",
+        y="Risultato netto (€)",
+        color="Campus",
+        title="EBIT per anno e per campus"
+    )
+    fig_campus.update_layout(
+        barmode="relative",
+        yaxis_title="€",
+        yaxis_tickprefix="€",
+        yaxis_tickformat=",",
+        legend_title_text=""
+    )
+    fig_campus.update_xaxes(tickmode="linear", dtick=1)
+    st.plotly_chart(fig_campus, use_container_width=True)
+    profilo.traguardo("Grafico campus")
+
+    col_prospetto, col_campus = st.columns(2)
+    nome_prospetto = col_prospetto.radio(
+        "Prospetto",
+        ["Conto economico", "Stato patrimoniale", "Rendiconto finanziario"],
+        horizontal=True,
+        key="pf_prospetto"
+    )
+    indice_campus = col_campus.selectbox(
+        "Di",
+        [None, *range(portafoglio.n_campus)],
+        format_func=lambda k: "Consolidato" if k is None else portafoglio.nomi[k],
+        key="pf_di"
+    )
+    prospetto, voci, altezza = {
+        "Conto economico": (prospetti.CONTO_ECONOMICO, "ce", 900),
+        "Stato patrimoniale": (prospetti.STATO_PATRIMONIALE, "sp", 1200),
+        "Rendiconto finanziario": (prospetti.RENDICONTO_FINANZIARIO, "rf", 1300),
+    }[nome_prospetto]
+    html = prospetti.html_prospetto(
+        prospetto, portafoglio.prospetto(voci, indice_campus), portafoglio.anni
+    )
+    profilo.traguardo("HTML prospetto")
+    components.html(html, height=altezza, scrolling=True)
+    profilo.traguardo("Invio iframe")
 
-    # ===============================
-    # COSTRUZIONE TABELLA HTML
-    # ===============================
 
-    def header():
-        h = "<tr><th>VOCI</th>"
-        for a in anni:
-            h += f"<th>ANNO {a}</th>"
-        h += "</tr>"
-        return h
-
-    def riga(label, key, bold=False):
-        if bold:
-            label = f"<b>{label}</b>"
-        row = f"<tr><td>{label}</td>"
-        for a in anni:
-            row += f"<td style='text-align:right'>{euro(rf[a][key])}</td>"
-        row += "</tr>"
-        return row
-
-    html = f"""
-    <style>
-    table.rf {{
-        width: 100%;
-        border-collapse: collapse;
-        font-size: 14px;
-    }}
-    table.rf th {{
-        background-color: #e1e8f7;
-        padding: 6px;
-        text-align: center;
-    }}
-    table.rf td {{
-        padding: 6px;
-        border-bottom: 1px solid #ddd;
-    }}
-    .section {{
-        background-color: #f2f5fc;
-        font-weight: bold;
-    }}
-    </style>
-
-    <table class="rf">
-    {header()}
-
-    <tr class="section"><td colspan="{1+len(anni)}">GESTIONE CARATTERISTICA</td></tr>
-    {riga("Risultato operativo", "risultato_operativo")}
-    {riga("Ammortamenti e accantonamenti", "ammortamenti")}
-    {riga("FLUSSO DI CASSA DELLA GESTIONE CARATTERISTICA", "flusso_gestione_caratt", True)}
-
-    <tr class="section"><td colspan="{1+len(anni)}">GESTIONE REDDITUALE</td></tr>
-    {riga("FLUSSO POTENZIALE DI CCN", "flusso_pot_ccn", True)}
-    {riga("Variazione Rimanenze", "var_rimanenze")}
-    {riga("Variazione Crediti commerciali", "var_crediti")}
-    {riga("FLUSSO DI CASSA DELLA GESTIONE REDDITUALE", "flusso_gestione_redd", True)}
-
-    <tr class="section"><td colspan="{1+len(anni)}">INVESTIMENTI</td></tr>
-    {riga("Variazione Immobilizzazioni immateriali", "var_imm_imm")}
-    {riga("Variazione Immobilizzazioni materiali", "var_imm_mat")}
-    {riga("Variazione Immobilizzazioni finanziarie", "var_imm_fin")}
-
-    <tr class="section"><td colspan="{1+len(anni)}">FINANZIAMENTI</td></tr>
-    {riga("Variazione Fondo TFR", "var_tfr")}
-    {riga("Variazione Patrimonio Netto", "var_pn")}
-
-    <tr class="section"><td colspan="{1+len(anni)}">SINTESI</td></tr>
-    {riga("FLUSSO DI CASSA NETTO AZIENDALE", "flusso_netto", True)}
-    {riga("Liquidità netta di inizio anno", "liq_inizio")}
-    {riga("LIQUIDITA' NETTA DI FINE ANNO", "liq_fine", True)}
-
-    </table>
-    """
+# ============================= TABS ============================= #
+# Con on_change="rerun" viene eseguita solo la scheda aperta.
+tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8 = st.tabs([
+    "Ricavi preventivi",
+    "Costi preventivi del personale", 
+    "Costi preventivi di struttura", 
+    "Conto economico",
+    "Stato patrimoniale",
+    "Rendiconto finanziario",
+    "Indici di valutazione",
+    "Portafoglio campus"
+], key="scheda", on_change="rerun")
+
+for scheda, disegna in [
+    (tab1, scheda_ricavi),
+    (tab2, scheda_personale),
+    (tab3, scheda_struttura),
+    (tab4, scheda_conto_economico),
+    (tab5, scheda_stato_patrimoniale),
+    (tab6, scheda_rendiconto),
+    (tab7, scheda_indici),
+    (tab8, scheda_portafoglio),
+]:
+    with scheda:
+        if scheda.open:
+            disegna()
+
+
+# ================= PANNELLO ARCHIVIO ================= #
+# In fondo alla sidebar: si salva il piano con i valori aggiornati da tutte le schede
+st.sidebar.markdown("---")
+st.sidebar.header("💾 Scenari salvati")
+if "archivio_caricato" in st.session_state:
+    st.sidebar.success(f"Caricato: {st.session_state.pop('archivio_caricato')}")
+
+nome_scenario = st.sidebar.text_input("Nome dello scenario", key="archivio_nome")
+if st.sidebar.button("Salva scenario", key="archivio_salva", disabled=not nome_scenario.strip()):
+    try:
+        archivio().salva(nome_scenario.strip(), parametri_correnti(), piano_corrente())
+    except (OSError, sqlite3.Error) as e:
+        st.sidebar.error(f"Impossibile salvare lo scenario: {e}")
+    else:
+        st.sidebar.success(f"Salvato: {nome_scenario.strip()}")
+
+cerca = st.sidebar.text_input("Cerca per nome", key="archivio_cerca")
+ordina = st.sidebar.selectbox(
+    "Ordina per",
+    ["creato", "nome", "ebit_ultimo", "liquidita_minima", "break_even"],
+    format_func={
+        "creato": "Data di salvataggio",
+        "nome": "Nome",
+        "ebit_ultimo": "EBIT ultimo anno",
+        "liquidita_minima": "Liquidità minima",
+        "break_even": "Anno di break-even",
+    }.get,
+    key="archivio_ordina"
+)
+salvati = archivio().elenco(nome=cerca.strip(), ordina=ordina, decrescente=ordina != "nome",
+                            limite=500)
+if salvati.empty:
+    st.sidebar.caption("Nessuno scenario salvato.")
+else:
+    righe_salvate = salvati.set_index("id")
+    id_scelto = st.sidebar.selectbox(
+        f"Scenario ({len(salvati)})",
+        righe_salvate.index,
+        format_func=lambda i: (
+            f"{righe_salvate.at[i, 'nome']} · "
+            f"{time.strftime('%d/%m/%Y %H:%M', time.localtime(righe_salvate.at[i, 'creato']))}"
+        ),
+        key="archivio_scelto"
+    )
+    scelto = righe_salvate.loc[id_scelto]
+    st.sidebar.caption(
+        f"{scelto['n_anni']} anni · EBIT ultimo anno {euro(scelto['ebit_ultimo'])} · "
+        f"liquidità minima {euro(scelto['liquidita_minima'])} · "
+        + (f"break-even anno {scelto['break_even']}" if scelto["break_even"] else "break-even non raggiunto")
+    )
+    col_carica, col_elimina = st.sidebar.columns(2)
+    col_carica.button("Carica", key="archivio_carica", on_click=carica_scenario, args=(int(id_scelto),))
+    if col_elimina.button("Elimina", key="archivio_elimina"):
+        archivio().elimina(int(id_scelto))
+        st.rerun()
 
-    components.html(html, height=1300, scrolling=True)
+
+# ================= PANNELLO DI PROFILAZIONE ================= #
+st.sidebar.markdown("---")
+st.sidebar.header("🔧 Profilazione")
+if st.sidebar.checkbox("Misura i tempi di calcolo e disegno", value=False, key="profilazione"):
+    st.sidebar.checkbox("Includi cProfile", value=False, key="profilazione_cprofile")
+    # Chiude l'esecuzione corrente, così da poterla mostrare
+    profilo.termina()
+    profilatore = st.session_state.get("profilatore")
+    if profilatore is None or not profilatore.esecuzioni:
+        st.sidebar.caption("I tempi vengono raccolti a partire dalla prossima esecuzione.")
+    else:
+        esecuzioni = list(reversed(profilatore.esecuzioni))
+        indice = st.sidebar.selectbox(
+            "Esecuzione",
+            range(len(esecuzioni)),
+            format_func=lambda i: (
+                f"{time.strftime('%H:%M:%S', time.localtime(esecuzioni[i]['ora']))} · "
+                f"{esecuzioni[i]['tipo']} · {esecuzioni[i]['totale'] * 1000:.0f} ms"
+            ),
+            key="profilazione_esecuzione"
+        )
+        st.sidebar.dataframe(
+            pd.DataFrame([
+                {
+                    "Fase": "\u2003" * (livello - 1) + nome.split(profilo.SEPARATORE)[-1],
+                    "Chiamate": chiamate,
+                    "ms": round(secondi * 1000, 2),
+                }
+                for livello, nome, chiamate, secondi in profilatore.riepilogo(-1 - indice)
+            ]),
+            use_container_width=True,
+            hide_index=True
+        )
+        file_profilo = st.sidebar.text_input(
+            "File dei tempi (JSON)", value="profilo/tempi.json", key="profilazione_file"
+        )
+        if st.sidebar.button("Salva su file", key="profilazione_salva"):
+            try:
+                salvati = profilatore.salva(file_profilo)
+            except OSError as e:
+                st.sidebar.error(f"Impossibile salvare i tempi: {e}")
+            else:
+                st.sidebar.success("Salvato: " + ", ".join(str(p) for p in salvati))
+
+    # Cache condivise fra le sessioni: successi e mancati dall'avvio del processo
+    cache_condivise = {
+        **{f"Stadio {stadio}": c for stadio, c in CACHE_STADI.statistiche().items()},
+        "Prospetti HTML": prospetti.CACHE_HTML.statistiche(),
+        "Figure": cache_figure().statistiche(),
+    }
+    st.sidebar.markdown("**Cache condivise**")
+    st.sidebar.dataframe(
+        pd.DataFrame([
+            {
+                "Cache": nome,
+                "Successi": c["successi"],
+                "Mancati": c["mancati"],
+                "Voci": c["voci"],
+                "Eliminate": c["eliminati"] + c["scaduti"],
+            }
+            for nome, c in cache_condivise.items()
+        ]),
+        use_container_width=True,
+        hide_index=True
+    )
+else:
+    profilo.termina()